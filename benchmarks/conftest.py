@@ -0,0 +1,31 @@
+"""
+Performance benchmarks of the tracing hot paths
+
+Benchmarks use pytest-benchmark and run on CPU only. They are not part of the
+default test run, use scripts/run_benchmarks.sh to run them and save results
+as JSON, or to compare against previously saved results.
+"""
+
+import pytest
+import typing
+import torch
+
+
+# Total number of rays in a batch
+RAY_COUNTS = [1_000, 10_000, 100_000]
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+@pytest.fixture(params=RAY_COUNTS, ids=[f"N={n}" for n in RAY_COUNTS])
+def num_rays(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+@pytest.fixture(autouse=True)
+def deterministic() -> None:
+    torch.manual_seed(0)
+
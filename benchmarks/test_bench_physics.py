@@ -0,0 +1,69 @@
+import pytest
+import torch
+from torch.nn.functional import normalize
+
+import torchlensmaker as tlm
+from torchlensmaker.testing.physics_reference import (
+    reference_reflection,
+    reference_refraction,
+)
+
+from typing import Any
+
+
+def make_rays_normals(N: int, dim: int) -> tuple[torch.Tensor, torch.Tensor]:
+    "Random unit incident rays, and unit normals facing against them"
+
+    rays = normalize(torch.rand((N, dim), dtype=torch.float64) + 0.5, dim=1)
+    normals = -normalize(
+        rays + 0.3 * torch.randn((N, dim), dtype=torch.float64), dim=1
+    )
+    return rays, normals
+
+
+@pytest.mark.parametrize("critical_angle", ["nan", "clamp", "drop", "reflect"])
+def test_refraction(
+    benchmark: Any, critical_angle: str, dim: int, num_rays: int
+) -> None:
+    rays, normals = make_rays_normals(num_rays, dim)
+    benchmark(tlm.refraction, rays, normals, 1.5, 1.0, critical_angle=critical_angle)
+
+
+def test_reflection(benchmark: Any, dim: int, num_rays: int) -> None:
+    rays, normals = make_rays_normals(num_rays, dim)
+    benchmark(tlm.reflection, rays, normals)
+
+
+# Library kernels against the reference tensor expressions, forward and
+# backward on one million rays
+
+LARGE = 1_000_000
+
+
+def forward_backward(function: Any, rays: torch.Tensor, normals: torch.Tensor) -> None:
+    rays = rays.detach().requires_grad_(True)
+    normals = normals.detach().requires_grad_(True)
+    function(rays, normals).sum().backward()
+
+
+@pytest.mark.parametrize("implementation", ["library", "reference"])
+@pytest.mark.parametrize("critical_angle", ["clamp", "drop", "reflect"])
+def test_refraction_large(
+    benchmark: Any, implementation: str, critical_angle: str, dim: int
+) -> None:
+    rays, normals = make_rays_normals(LARGE, dim)
+    refraction = (
+        tlm.refraction if implementation == "library" else reference_refraction
+    )
+
+    def function(r: torch.Tensor, n: torch.Tensor) -> torch.Tensor:
+        return refraction(r, n, 1.5, 1.0, critical_angle=critical_angle)
+
+    benchmark(forward_backward, function, rays, normals)
+
+
+@pytest.mark.parametrize("implementation", ["library", "reference"])
+def test_reflection_large(benchmark: Any, implementation: str, dim: int) -> None:
+    rays, normals = make_rays_normals(LARGE, dim)
+    reflection = tlm.reflection if implementation == "library" else reference_reflection
+    benchmark(forward_backward, reflection, rays, normals)
@@ -0,0 +1,38 @@
+import json
+import pytest
+import torch
+
+import torchlensmaker as tlm
+from torchlensmaker.testing.benchmarks import stacks, base_sampling
+
+from typing import Any
+
+
+@pytest.mark.parametrize("name", list(stacks.keys()))
+def test_forward_backward(benchmark: Any, name: str, dim: int, num_rays: int) -> None:
+    optics = stacks[name]()
+    sampling = {
+        "dim": dim,
+        "dtype": torch.float64,
+        "base": base_sampling(num_rays, dim),
+    }
+    inputs = tlm.default_input(sampling)
+
+    def step() -> None:
+        optics.zero_grad()
+        outputs = optics(inputs)
+        outputs.loss.backward()
+
+    benchmark(step)
+
+
+@pytest.mark.parametrize("name", list(stacks.keys()))
+def test_render_sequence(benchmark: Any, name: str, dim: int) -> None:
+    optics = stacks[name]()
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 10}
+
+    def render() -> str:
+        scene = tlm.viewer.render_sequence(optics, sampling, end=10)
+        return json.dumps(scene, allow_nan=False)
+
+    benchmark(render)
@@ -0,0 +1,40 @@
+import pytest
+import torch
+
+import torchlensmaker as tlm
+from torchlensmaker.surfaces import intersect_newton
+from torchlensmaker.testing.basic_transform import basic_transform
+from torchlensmaker.testing.benchmarks import make_rays
+
+from typing import Any
+
+
+surfaces = {
+    "sphere": lambda: tlm.Sphere(30.0, 20.0),
+    "parabola": lambda: tlm.Parabola(30.0, 0.02),
+    "plane": lambda: tlm.CircularPlane(30.0),
+}
+
+
+@pytest.mark.parametrize("name", ["sphere", "parabola"])
+def test_intersect_newton(benchmark: Any, name: str, dim: int, num_rays: int) -> None:
+    surface = surfaces[name]()
+    P, V = make_rays(num_rays, dim, 15.0)
+    init_t = -P[:, 0] / V[:, 0]
+
+    benchmark(intersect_newton, surface, P, V, init_t)
+
+
+@pytest.mark.parametrize("name", ["sphere", "parabola", "plane"])
+def test_intersect(benchmark: Any, name: str, dim: int, num_rays: int) -> None:
+    surface = surfaces[name]()
+    P, V = make_rays(num_rays, dim, 15.0)
+
+    if dim == 2:
+        transform = basic_transform(1.0, "origin", 0.0, [0.0, 0.0])(surface)
+    else:
+        transform = basic_transform(1.0, "origin", [0.0, 0.0, 0.0], [0.0, 0.0, 0.0])(
+            surface
+        )
+
+    benchmark(tlm.intersect, surface, P, V, transform)
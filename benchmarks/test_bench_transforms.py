@@ -0,0 +1,38 @@
+import pytest
+import torch
+
+import torchlensmaker as tlm
+from torchlensmaker.transforms import ComposeTransform
+from torchlensmaker.testing.basic_transform import basic_transform
+
+from typing import Any
+
+
+def make_transform(dim: int) -> ComposeTransform:
+    "A chain of anchor, scale, rotation and translation transforms"
+
+    surface = tlm.Sphere(35.0, 35 / 2)
+    if dim == 2:
+        B_1 = basic_transform(1.0, "extent", 0.1, [20.0, 30.0])(surface)
+        B_2 = basic_transform(-1.0, "origin", -0.2, [-20.0, 30.0])(surface)
+    else:
+        B_1 = basic_transform(1.0, "extent", [0.1, 0.2, 0.3], [10.0, 20.0, 30.0])(
+            surface
+        )
+        B_2 = basic_transform(-1.0, "origin", [0.1, 0.2, 0.3], [-10.0, -20.0, 30.0])(
+            surface
+        )
+
+    return ComposeTransform([B_1, B_2])
+
+
+@pytest.mark.parametrize(
+    "function", ["direct_points", "direct_vectors", "inverse_points", "inverse_vectors"]
+)
+def test_compose_transform(
+    benchmark: Any, function: str, dim: int, num_rays: int
+) -> None:
+    transform = make_transform(dim)
+    points = torch.rand((num_rays, dim), dtype=torch.float64)
+
+    benchmark(getattr(transform, function), points)
@@ -0,0 +1,11 @@
+#!/usr/bin/env bash
+
+# Run the benchmark suite and save results to .benchmarks/ as JSON.
+# Extra arguments are passed to pytest, for example to fail on regressions
+# against the latest saved run:
+#
+#   ./scripts/run_benchmarks.sh --benchmark-compare --benchmark-compare-fail=mean:10%
+
+set -euo pipefail
+
+CUDA_VISIBLE_DEVICES="" pytest benchmarks --benchmark-autosave --benchmark-json=bench_output.json "$@"
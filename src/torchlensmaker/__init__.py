@@ -2,25 +2,65 @@
 from torchlensmaker.physics import *
 from torchlensmaker.outline import *
 from torchlensmaker.surfaces import *
+from torchlensmaker.splines import *
 from torchlensmaker.transforms import *
 from torchlensmaker.intersect import *
 
 # Optics
 from torchlensmaker.optics import *
 from torchlensmaker.lenses import *
+from torchlensmaker.ray_aiming import *
+from torchlensmaker.nonsequential import *
 
 # Optimization
 from torchlensmaker.parameter import parameter
 from torchlensmaker.full_forward import *
 from torchlensmaker.optimize import optimize
 
-# Viewer
-import torchlensmaker.viewer as viewer
-from torchlensmaker.viewer import ipython_show as show
+# Persistence
+from torchlensmaker.persistence import *
 
+# Profiling
+from torchlensmaker.profiling import profile
+from torchlensmaker.diagnostics import newton_diagnostics, NewtonDiagnostics
+
+import importlib
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import torchlensmaker.viewer as viewer
+    import torchlensmaker.export_build123d as export
+    from torchlensmaker.viewer import ipython_show as show
+
+
+# Submodules with heavy optional dependencies (matplotlib, IPython, build123d)
+# are loaded lazily on first attribute access, so that importing the core
+# library stays fast.
+# Maps attribute name to (module, attribute in that module or None)
+_lazy_attributes: dict[str, tuple[str, str | None]] = {
+    "viewer": ("torchlensmaker.viewer", None),
+    "show": ("torchlensmaker.viewer", "ipython_show"),
+    "export": ("torchlensmaker.export_build123d", None),
+}
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module_name, attr = _lazy_attributes[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(module_name)
+    value = module if attr is None else getattr(module, attr)
+
+    # Cache it, so that __getattr__ is only called once per attribute
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals().keys()) + list(_lazy_attributes.keys()))
 
-# Export build123d
-import torchlensmaker.export_build123d as export
 
 __all__ = [
     "viewer",
@@ -0,0 +1,162 @@
+import torch
+
+import math
+from typing import Any, Optional
+
+
+Tensor = torch.Tensor
+
+
+class NewtonDiagnostics:
+    """
+    Statistics of Newton's method surface intersections
+
+    Statistics are accumulated in tensors, without host synchronization, and
+    are only converted to Python values by summary(). Use as a context
+    manager to collect statistics of all intersections computed within it:
+
+        > with tlm.newton_diagnostics() as diag:
+        >     optics(inputs)
+        > print(diag.summary())
+
+    Collected statistics:
+        * iterations: histogram of the number of iterations each ray needed
+          until the Newton step became negligible
+        * residuals: histogram of log10 |F| at the final collision points
+        * failed: number of rays whose final point is not on the surface
+          (non convergence, or no intersection with the surface)
+        * missed: number of rays that converged to a point on the surface,
+          but outside of the surface outline
+    """
+
+    def __init__(
+        self,
+        residual_range: tuple[float, float] = (-16.0, 2.0),
+        residual_bins: int = 18,
+        step_rtol: Optional[float] = None,
+    ):
+        """
+        Args:
+            residual_range: range of the log10 residual histogram, values
+                outside the range are counted in the first or last bin
+            residual_bins: number of bins of the residual histogram
+            step_rtol: relative Newton step size under which a ray is
+                considered converged. Default is 16 times the machine
+                epsilon of the rays dtype.
+        """
+
+        self.residual_range = residual_range
+        self.residual_bins = residual_bins
+        self.step_rtol = step_rtol
+
+        self.calls = 0
+        self.rays: Tensor = torch.tensor(0)
+        self.iterations: Tensor = torch.zeros(0, dtype=torch.int64)
+        self.residuals: Tensor = torch.zeros(residual_bins)
+        self.failed: Tensor = torch.tensor(0)
+        self.missed: Tensor = torch.tensor(0)
+
+    def __enter__(self) -> "NewtonDiagnostics":
+        global _active_diagnostics
+        if _active_diagnostics is not None:
+            raise RuntimeError("Nested Newton diagnostics are not supported")
+        _active_diagnostics = self
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        global _active_diagnostics
+        _active_diagnostics = None
+
+    def converged(self, t: Tensor, delta: Tensor) -> Tensor:
+        "Mask of rays for which a Newton step is negligible"
+
+        rtol = (
+            self.step_rtol
+            if self.step_rtol is not None
+            else 16 * torch.finfo(t.dtype).eps
+        )
+        return torch.abs(delta) <= rtol * (1 + torch.abs(t))
+
+    def record_iterations(self, iterations: Tensor, num_iter: int) -> None:
+        """
+        Add per ray iteration counts of one call to intersect_newton()
+
+        Args:
+            iterations: per ray counts, at most num_iter
+            num_iter: number of iterations of the call
+        """
+
+        self.calls += 1
+        self.rays = self.rays.to(iterations.device) + iterations.numel()
+
+        # Fixed size histogram: bincount() would sync with the device to size
+        # its output on the max value
+        counts = iterations.flatten()
+        hist = torch.zeros(
+            num_iter + 1, dtype=torch.int64, device=counts.device
+        ).scatter_add_(0, counts, torch.ones_like(counts))
+
+        # Grow the accumulated histogram if needed, sizes are known on the host
+        size = max(hist.numel(), self.iterations.numel())
+        previous = self.iterations.to(hist.device)
+        self.iterations = torch.nn.functional.pad(
+            previous, (0, size - previous.numel())
+        ) + torch.nn.functional.pad(hist, (0, size - hist.numel()))
+
+    def record_collisions(
+        self, residuals: Tensor, on_surface: Tensor, in_outline: Tensor
+    ) -> None:
+        "Add final residuals and validity of one call to local_collide()"
+
+        low, high = self.residual_range
+        log_residuals = torch.log10(residuals.detach().double()).clamp(low, high)
+        self.residuals = self.residuals.to(residuals.device) + torch.histc(
+            log_residuals, bins=self.residual_bins, min=low, max=high
+        ).to(self.residuals.dtype)
+
+        self.failed = self.failed.to(residuals.device) + (~on_surface).sum()
+        self.missed = self.missed.to(residuals.device) + (
+            on_surface & ~in_outline
+        ).sum()
+
+    def summary(self) -> dict[str, Any]:
+        "Statistics as Python values"
+
+        low, high = self.residual_range
+        edges = [
+            low + i * (high - low) / self.residual_bins
+            for i in range(self.residual_bins + 1)
+        ]
+
+        iterations = self.iterations.tolist()
+        total = sum(iterations)
+        mean_iterations = (
+            sum(i * c for i, c in enumerate(iterations)) / total
+            if total > 0
+            else math.nan
+        )
+
+        return {
+            "calls": self.calls,
+            "rays": int(self.rays.item()),
+            "failed": int(self.failed.item()),
+            "missed": int(self.missed.item()),
+            "mean_iterations": mean_iterations,
+            "iterations_histogram": iterations,
+            "residuals_log10_edges": edges,
+            "residuals_histogram": [int(c) for c in self.residuals.tolist()],
+        }
+
+
+# Diagnostics receiving statistics, None when disabled
+_active_diagnostics: Optional[NewtonDiagnostics] = None
+
+
+def active_diagnostics() -> Optional[NewtonDiagnostics]:
+    return _active_diagnostics
+
+
+def newton_diagnostics(**kwargs: Any) -> NewtonDiagnostics:
+    "Context collecting Newton's method statistics, see NewtonDiagnostics"
+
+    return NewtonDiagnostics(**kwargs)
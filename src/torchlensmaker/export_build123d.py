@@ -2,9 +2,16 @@ import torch
 import torch.nn as nn
 import torchlensmaker as tlm
 import build123d as bd
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from os.path import join
 
-from typing import Any
+from typing import Any, Callable, Optional
+
+Tensor = torch.Tensor
 
 
 def tuplelist(arr: Any) -> Any:
@@ -40,14 +47,40 @@ def sketch_sphere(sphere: tlm.Sphere) -> bd.Sketch:
         return bd.RadiusArc((X, -y), (X, y), -R)
 
 
+def sketch_spline(surface: tlm.LocalSurface, N: int = 50) -> bd.Sketch:
+    "Spline through samples of the surface curve, mirrored to negative r"
+
+    samples = surface.samples2D(N).detach()
+    mirrored = samples.flip(0) * torch.tensor([1.0, -1.0], dtype=samples.dtype)
+    points = torch.cat((mirrored, samples[1:]), dim=0)
+    return bd.Spline(*[tuple(p) for p in points.tolist()])
+
+
+def sketch_polyline(surface: tlm.PiecewiseLine) -> bd.Sketch:
+    "Profile of a piecewise line, mirrored to negative r"
+
+    knots = surface.knots().detach()
+    mirrored = knots.flip(0) * torch.tensor([1.0, -1.0], dtype=knots.dtype)
+    points = torch.cat((mirrored, knots[1:]), dim=0)
+    return bd.Polyline(*[tuple(p) for p in points.tolist()])
+
+
+# Sketch function for each surface type
+sketch_functions: dict[type, Callable[[Any], bd.Sketch]] = {
+    tlm.Parabola: sketch_parabola,
+    tlm.CircularPlane: sketch_circular_plane,
+    tlm.Sphere: sketch_sphere,
+    tlm.Asphere: sketch_spline,
+    tlm.PiecewiseLine: sketch_polyline,
+    tlm.BezierSpline: sketch_spline,
+    tlm.TabulatedSag: sketch_spline,
+}
+
+
 def surface_to_sketch(surface: tlm.LocalSurface) -> bd.Sketch:
     try:
-        func = {
-            tlm.Parabola: sketch_parabola,
-            tlm.CircularPlane: sketch_circular_plane,
-            tlm.Sphere: sketch_sphere,
-        }[type(surface)]
-        return func(surface)  # type: ignore
+        func = sketch_functions[type(surface)]
+        return func(surface)
     except KeyError:
         raise RuntimeError(f"Unsupported surface type {type(surface)}")
 
@@ -62,6 +95,12 @@ def lens_to_part(lens: tlm.LensBase) -> bd.Part:
         surface_to_sketch(lens.surface2.surface), (lens.surface2.scale, 1.0, 1.0)
     )
 
+    return curves_to_lens_part(curve1, curve2)
+
+
+def curves_to_lens_part(curve1: bd.Sketch, curve2: bd.Sketch) -> bd.Part:
+    "Lens part from the profile curves of its two surfaces, in the XY plane"
+
     # Find the "top most" point on the curve
     # i.e. extremity with the highest Y value
     # This can be either sides depending on how the surface is parametrized
@@ -85,11 +124,277 @@ def lens_to_part(lens: tlm.LensBase) -> bd.Part:
     return part
 
 
-def export_all_step(optics: nn.Sequential, folder_path: str) -> None:
-    "Export polygons of lenses in the the optical stack"
+def hom_to_location(hom: Tensor) -> bd.Location:
+    "Location from a 3D homogeneous rigid transform matrix"
+
+    R, T = hom[:3, :3], hom[:3, 3]
+    plane = bd.Plane(
+        origin=tuple(T.tolist()),
+        x_dir=tuple(R[:, 0].tolist()),
+        z_dir=tuple(R[:, 2].tolist()),
+    )
+    return bd.Location(plane)
+
+
+def surface_hom_matrix(context: tlm.ModuleEvalContext) -> Tensor:
+    "Absolute homogeneous transform of an optical surface in a 3D forward pass"
+
+    element, inputs = context.module, context.inputs
+    dim, dtype = inputs.transforms[0].dim, inputs.transforms[0].dtype
+    transform = tlm.forward_kinematic(
+        inputs.transforms + element.surface_transform(dim, dtype)
+    )
+    return transform.hom_matrix().detach()
+
+
+def surface_curve_in_frame(
+    context: tlm.ModuleEvalContext, frame_inverse: Tensor
+) -> bd.Sketch:
+    """
+    Profile curve of an optical surface, expressed in another frame
+
+    The relative transform between the surface and the frame must be a
+    uniform scale and a translation, as is the case within a lens.
+    """
+
+    hom = frame_inverse @ surface_hom_matrix(context)
+    linear, translation = hom[:3, :3], hom[:3, 3]
+    scale = linear[0, 0]
+
+    if not torch.allclose(linear, scale * torch.eye(3, dtype=linear.dtype)):
+        raise RuntimeError("Unsupported rotation between surfaces of a lens")
+
+    return bd.Pos(*translation.tolist()) * bd.scale(
+        surface_to_sketch(context.module.surface), (scale.item(), 1.0, 1.0)
+    )
+
+
+def surface_to_face(surface: tlm.LocalSurface, scale: float) -> bd.Face:
+    "Surface of revolution of an optical surface profile"
+
+    # The profile is symmetric around the X axis, so half a turn covers it
+    curve = bd.scale(surface_to_sketch(surface), (scale, 1.0, 1.0))
+    return bd.Face.revolve(curve.edge(), 180, bd.Axis.X)
+
+
+def aperture_to_face(aperture: tlm.Aperture, margin: float) -> bd.Face:
+    "Flat ring around the aperture opening"
+
+    r = aperture.surface.outline.max_radius()
+    return bd.Face.revolve(bd.Line((0, r), (0, r * (1 + margin))), 360, bd.Axis.X)
+
+
+def stack_to_assembly(optics: nn.Module, aperture_margin: float = 0.5) -> bd.Compound:
+    """
+    Positioned 3D model of an optical stack
+
+    The stack is evaluated once with zero rays to compute the kinematic chain,
+    and every lens, mirror and aperture is placed at its absolute position.
+
+    Args:
+        optics: optical stack
+        aperture_margin: width of the ring representing apertures, relative to
+            the aperture radius
+
+    Returns:
+        compound with one labeled child per optical element
+    """
+
+    execute_list, _ = tlm.full_forward(
+        optics, tlm.default_input({"dim": 3, "dtype": torch.float64, "base": 0})
+    )
+
+    # Surfaces that are part of a lens are exported with their lens
+    lens_surfaces = {
+        id(s)
+        for m in optics.modules()
+        if isinstance(m, tlm.LensBase)
+        for s in (m.surface1, m.surface2)
+    }
+
+    # Forward hooks fire after the module forward returns, so a lens is
+    # always visited after its surfaces
+    contexts: dict[int, tlm.ModuleEvalContext] = {}
+    children = []
+    for context in execute_list:
+        element = context.module
+        contexts[id(element)] = context
 
-    for j, element in enumerate(optics):
         if isinstance(element, tlm.LensBase):
-            path = join(folder_path, f"lens{j}.step")
-            part = lens_to_part(element)
-            bd.export_step(part, path)
+            c1 = contexts[id(element.surface1)]
+            c2 = contexts[id(element.surface2)]
+
+            # Lens frame is the first surface joint
+            frame = tlm.forward_kinematic(c1.inputs.transforms).hom_matrix().detach()
+            frame_inverse = torch.linalg.inv(frame)
+
+            part = curves_to_lens_part(
+                surface_curve_in_frame(c1, frame_inverse),
+                surface_curve_in_frame(c2, frame_inverse),
+            )
+            label = "lens"
+
+        elif isinstance(element, tlm.Aperture):
+            frame = surface_hom_matrix(context)
+            part = aperture_to_face(element, aperture_margin)
+            label = "aperture"
+
+        elif (
+            isinstance(element, tlm.OpticalSurface)
+            and id(element) not in lens_surfaces
+        ):
+            # Scale is part of the surface transform, so it's applied to the
+            # profile before placing it with the rigid part of the transform
+            hom = surface_hom_matrix(context)
+            frame = hom.clone()
+            frame[:3, :3] = hom[:3, :3] / element.scale
+            part = surface_to_face(element.surface, element.scale)
+            label = "mirror" if isinstance(element, tlm.ReflectiveSurface) else "surface"
+
+        else:
+            continue
+
+        part = hom_to_location(frame) * part
+        part.label = f"{label}{len(children)}"
+        children.append(part)
+
+    return bd.Compound(children=children)
+
+
+def export_assembly(optics: nn.Module, path: str) -> bd.Compound:
+    "Export a positioned 3D model of an optical stack to a .step or .stl file"
+
+    assembly = stack_to_assembly(optics)
+
+    if path.lower().endswith((".step", ".stp")):
+        bd.export_step(assembly, path)
+    elif path.lower().endswith(".stl"):
+        bd.export_stl(assembly, path)
+    else:
+        raise ValueError(f"Unsupported export format (expected .step or .stl): {path}")
+
+    return assembly
+
+
+def signature_value(value: Any) -> Any:
+    "Convert a surface attribute to a JSON serializable value for hashing"
+
+    if isinstance(value, torch.Tensor):
+        return value.detach().tolist()
+    elif isinstance(value, torch.dtype):
+        return str(value)
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    elif isinstance(value, dict):
+        return {str(k): signature_value(v) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [signature_value(v) for v in value]
+    elif hasattr(value, "__dict__"):
+        return object_signature(value)
+    else:
+        raise TypeError(
+            f"Cannot compute the cache signature of {type(value).__name__} value"
+        )
+
+
+def object_signature(obj: Any) -> list[Any]:
+    """
+    Type name and public attributes of an object, for hashing
+
+    Private attributes hold derived values such as caches, they don't change
+    the geometry and are skipped.
+    """
+
+    attributes = {
+        k: signature_value(v) for k, v in vars(obj).items() if not k.startswith("_")
+    }
+    return [type(obj).__name__, attributes]
+
+
+def lens_cache_key(lens: tlm.LensBase) -> str:
+    """
+    Content hash of a lens geometry
+
+    Two lenses with the same surface types, surface parameter values, scales
+    and inner thickness have the same key, so the STEP export of one can be
+    reused for the other.
+    """
+
+    signature = {
+        "type": type(lens).__name__,
+        "inner_thickness": lens.inner_thickness().detach().item(),
+        "surfaces": [
+            {"scale": s.scale, "surface": object_signature(s.surface)}
+            for s in (lens.surface1, lens.surface2)
+        ],
+    }
+
+    data = json.dumps(signature, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def export_lens_step(lens: tlm.LensBase, path: str) -> str:
+    "Build a lens part and export it to a STEP file"
+
+    part = lens_to_part(lens)
+
+    # Write to a temporary file first, so that a concurrent reader never sees
+    # a partially written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    bd.export_step(part, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def export_all_step(
+    optics: nn.Sequential,
+    folder_path: str,
+    cache_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> None:
+    """
+    Export polygons of lenses in the the optical stack
+
+    Args:
+        optics: optical stack, every top level LensBase element is exported
+        folder_path: output folder, lenses are written to lens{j}.step
+        cache_dir: optional folder of previously exported lenses, indexed by
+            lens_cache_key(). Lenses found in the cache are copied instead of
+            being rebuilt.
+        max_workers: number of worker processes used to build lenses. None
+            uses the number of CPUs, 1 exports sequentially in this process.
+    """
+
+    lenses = [
+        (j, element)
+        for j, element in enumerate(optics)
+        if isinstance(element, tlm.LensBase)
+    ]
+
+    # Without a cache, every lens is built into its own output path
+    # With a cache, each distinct lens is built once into the cache folder
+    build: dict[str, tlm.LensBase] = {}
+    copies: list[tuple[str, str]] = []
+    for j, lens in lenses:
+        path = join(folder_path, f"lens{j}.step")
+        if cache_dir is None:
+            build[path] = lens
+        else:
+            cached_path = join(cache_dir, f"{lens_cache_key(lens)}.step")
+            if not os.path.exists(cached_path):
+                build[cached_path] = lens
+            copies.append((cached_path, path))
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    if max_workers == 1 or len(build) <= 1:
+        for path, lens in build.items():
+            export_lens_step(lens, path)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # list() to propagate exceptions raised in workers
+            list(executor.map(export_lens_step, build.values(), build.keys()))
+
+    for cached_path, path in copies:
+        shutil.copyfile(cached_path, path)
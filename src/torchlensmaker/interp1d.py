@@ -1,26 +1,178 @@
 import torch
 
+from typing import Optional
+
+
+# Enable data dependent checks of inputs, such as bounds checks. They are off
+# by default because they synchronize with the device.
+debug: bool = False
+
+
+class Interp1D:
+    """
+    Linear interpolation of one or more curves sampled at the same X
+
+    Slopes are computed once at construction, so Y is captured at that time.
+    On a uniform grid, the interval of new points is computed arithmetically,
+    otherwise it is found with torch.searchsorted(). New points outside of X
+    are extrapolated from the first or last interval, and bounds are only
+    checked if the module debug flag is set.
+    """
+
+    def __init__(
+        self, X: torch.Tensor, Y: torch.Tensor, uniform: Optional[bool] = None
+    ):
+        """
+        Args:
+            X: sorted sample positions, shape (N,)
+            Y: sample values, shape (..., N) for a batch of curves
+            uniform: whether X is a uniform grid, detected if None
+        """
+
+        assert X.ndim == 1 and X.numel() >= 2
+        assert Y.shape[-1] == X.shape[0]
+
+        N = X.numel()
+        self.X, self.Y = X, Y
+
+        # careful potential div by zero here
+        self.slopes = torch.diff(Y, dim=-1) / torch.diff(X)
+
+        if uniform is None:
+            step = (X[-1] - X[0]) / (N - 1)
+            uniform = bool(torch.allclose(torch.diff(X), step.expand(N - 1)))
+        self.uniform = uniform
+        self.inv_step = (N - 1) / (X[-1] - X[0])
+
+    def indices(self, newX: torch.Tensor) -> torch.Tensor:
+        "Index of the interval of each new point, clamped to the first and last"
+
+        if debug:
+            assert torch.all(newX >= self.X[0]) and torch.all(newX <= self.X[-1])
+
+        if self.uniform:
+            indices = torch.floor((newX - self.X[0]) * self.inv_step).to(torch.int64)
+        else:
+            indices = torch.searchsorted(self.X, newX.contiguous(), right=True) - 1
+
+        return torch.clamp(indices, 0, self.X.numel() - 2)
+
+    def __call__(self, newX: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            newX: new sample positions, any shape
+
+        Returns:
+            interpolated values, shape (..., *newX.shape)
+        """
+
+        i = self.indices(newX)
+        return self.Y[..., i] + self.slopes[..., i] * (newX - self.X[i])
+
 
 def interp1d(X: torch.Tensor, Y: torch.Tensor, newX: torch.Tensor) -> torch.Tensor:
-    "torch version of np.interp"
+    "torch version of np.interp, use Interp1D to interpolate the same data again"
+
+    return Interp1D(X, Y, uniform=False)(newX)
+
+
+def linear_recurrence(a: torch.Tensor, b: torch.Tensor, rate: float) -> torch.Tensor:
+    """
+    Solve x[i] = a[i] x[i-1] + b[i] with x[-1] = 0, with |a| <= rate < 1
+
+    Vectorized scan by recursive doubling of the window of each element. The
+    weight of the terms beyond the window decays as rate^window, so the scan
+    stops when it's below the dtype resolution, after a fixed number of O(N)
+    passes.
+    """
+
+    N = b.shape[0]
+    step = 1
+    while step < N and rate**step > torch.finfo(b.dtype).eps:
+        b = torch.cat((b[:step], b[step:] + a[step:] * b[:-step]))
+        a = torch.cat((a[:step], a[step:] * a[:-step]))
+        step *= 2
+
+    return b
+
+
+def cubic_spline_coefficients(Y: torch.Tensor, h: float) -> torch.Tensor:
+    """
+    Coefficients of the C2 cubic spline through Y on a uniform grid of step h
+
+    The spline has zero slope at the first sample (i.e. the axis of a surface
+    of revolution) and zero second derivative at the last sample.
+
+    Returns:
+        tensor of shape (N-1, 4): polynomial coefficients of each segment in
+        the local coordinate s in [0, 1], from the constant term
+    """
+
+    assert Y.ndim == 1 and Y.numel() >= 2
+    N = Y.numel()
+
+    # Second derivatives M at the samples, from the tridiagonal system
+    #   M[i-1] + 4 M[i] + M[i+1] = 6 (Y[i-1] - 2 Y[i] + Y[i+1]) / h^2
+    # with 2 M[0] + M[1] = 6 (Y[1] - Y[0]) / h^2 for the zero start slope
+    # and M[N-1] = 0 for the natural end
+    b = torch.cat(
+        (
+            (6 * (Y[1] - Y[0]) / h**2).reshape(1),
+            6 * (Y[:-2] - 2 * Y[1:-1] + Y[2:]) / h**2,
+            torch.zeros(1, dtype=Y.dtype),
+        )
+    )
+
+    # Thomas algorithm. The elimination factors only depend on N and converge
+    # to 2 - sqrt(3) after a few rows.
+    factors = [0.5]
+    while len(factors) < N - 1 and 1 / (4 - factors[-1]) != factors[-1]:
+        factors.append(1 / (4 - factors[-1]))
+    c = torch.cat(
+        (
+            torch.tensor(factors[: N - 1], dtype=Y.dtype),
+            torch.full((N - 1 - min(len(factors), N - 1),), factors[-1], dtype=Y.dtype),
+            torch.zeros(1, dtype=Y.dtype),
+        )
+    )
+
+    # Forward elimination and back substitution are both linear recurrences
+    # with factors of at most 1/2
+    g = linear_recurrence(-c, b * c, 0.5)
+    M = linear_recurrence(-c.flip(0), g.flip(0), 0.5).flip(0)
+
+    return torch.stack(
+        (
+            Y[:-1],
+            torch.diff(Y) - h**2 / 6 * (2 * M[:-1] + M[1:]),
+            h**2 / 2 * M[:-1],
+            h**2 / 6 * torch.diff(M),
+        ),
+        dim=1,
+    )
 
-    assert X.ndim == Y.ndim == 1
 
-    # find intervals
-    indices = torch.searchsorted(X, newX)
+def interp_cubic_uniform(
+    x0: float, h: float, coefficients: torch.Tensor, newX: torch.Tensor
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Evaluate a cubic spline on a uniform grid, see cubic_spline_coefficients()
 
-    # special case for newX == X[0]
-    indices = torch.where(newX == X[0], 1, indices)
+    Because the grid is uniform, the segment index is computed directly
+    instead of searched. Values outside of the grid are extrapolated from the
+    first or last segment.
 
-    # -1 here because we want the start of the interval
-    indices = indices - 1
+    Returns:
+        values and derivatives of the spline at newX
+    """
 
-    # make sure all newX are within the X domain
-    assert torch.min(indices) >= 0
-    assert torch.max(indices) <= X.numel() - 1
+    N = coefficients.shape[0]
+    u = (newX - x0) / h
+    indices = torch.clamp(torch.floor(u).to(torch.int64), 0, N - 1)
+    s = u - indices.to(u.dtype)
 
-    # compute slopes
-    # careful potential div by zero here
-    slopes = torch.diff(Y) / torch.diff(X)
+    c = coefficients[indices]
+    value = c[:, 0] + s * (c[:, 1] + s * (c[:, 2] + s * c[:, 3]))
+    derivative = (c[:, 1] + s * (2 * c[:, 2] + 3 * s * c[:, 3])) / h
 
-    return Y[indices] + slopes[indices] * (newX - X[indices])
+    return value, derivative
@@ -1,16 +1,66 @@
 import torch
+import math
+
+from typing import Optional
 
 from torchlensmaker.surfaces import LocalSurface
 from torchlensmaker.transforms import TransformBase
+from torchlensmaker import profiling
 
 Tensor = torch.Tensor
 
 
+def bounding_cylinder(surface: LocalSurface, P: Tensor, V: Tensor) -> Optional[Tensor]:
+    """
+    Conservative test of rays against the bounding volume of a surface
+
+    The volume is the cylinder of radius outline.max_radius() around the X
+    axis, between the planes at the X bounds of the surface (see
+    LocalSurface.bounds_x()). A ray (a full line, as in local_collide()) that
+    misses it cannot collide with the surface.
+
+    Args:
+        P: (N, 2|3) tensor, rays origins in the surface local frame
+        V: (N, 2|3) tensor, rays vectors in the surface local frame
+
+    Returns:
+        bool tensor (N,) of rays that may collide, or None if the surface has
+        no bounds
+    """
+
+    bounds = surface.bounds_x()
+    if bounds is None:
+        return None
+
+    with torch.no_grad():
+        radius = surface.outline.max_radius()
+        tol = 1e-6 * (1.0 + radius)
+        xmin, xmax = bounds.to(P.dtype) + torch.tensor([-tol, tol], dtype=P.dtype)
+
+        # Range of t within the slab between the X bounds
+        Px, Vx, Pr, Vr = P[:, 0], V[:, 0], P[:, 1:], V[:, 1:]
+        parallel = Vx == 0
+        safe_Vx = torch.where(parallel, 1.0, Vx)
+        t1, t2 = (xmin - Px) / safe_Vx, (xmax - Px) / safe_Vx
+        t_enter = torch.where(parallel, -math.inf, torch.minimum(t1, t2))
+        t_exit = torch.where(parallel, math.inf, torch.maximum(t1, t2))
+        in_slab = ~parallel | ((Px >= xmin) & (Px <= xmax))
+
+        # Closest point to the X axis within that range
+        VV = torch.sum(Vr * Vr, dim=1)
+        t_closest = -torch.sum(Pr * Vr, dim=1) / torch.where(VV > 0, VV, 1.0)
+        t = torch.clamp(t_closest, t_enter, t_exit)
+        closest = Pr + t.unsqueeze(1) * Vr
+
+        return in_slab & (torch.sum(closest * closest, dim=1) <= (radius + tol) ** 2)
+
+
 def intersect(
     surface: LocalSurface,
     P: Tensor,
     V: Tensor,
     transform: TransformBase,
+    newton_dtype: Optional[torch.dtype] = None,
 ) -> tuple[Tensor, Tensor, Tensor]:
     """
     Surface-rays collision detection
@@ -23,10 +73,11 @@ def intersect(
         V: (N, 2|3) tensor, rays vectors
         surface: surface to collide with
         transform: transform applied to the surface
+        newton_dtype: optional dtype for the bulk of Newton's method iterations
 
     Returns:
         points: valid collision points
-        normals: valid surface normals at the collision points
+        normals: valid unit surface normals at the collision points
         valid: bool tensor (N,) indicating which rays do collide with the surface
     """
 
@@ -38,8 +89,25 @@ def intersect(
     Ps = transform.inverse_points(P)
     Vs = transform.inverse_vectors(V)
 
-    # Collision detection in the surface local frame
-    t, local_normals, valid = surface.local_collide(Ps, Vs)
+    # Collision detection in the surface local frame, only for rays within the
+    # bounding volume of the surface. Indexing the candidates costs a gather
+    # and a scatter, so it's only done if some rays are actually culled.
+    candidates = bounding_cylinder(surface, Ps, Vs)
+    culled = 0 if candidates is None else int(torch.sum(~candidates).item())
+    if candidates is not None:
+        profiling.count("culled_rays", culled)
+
+    if candidates is None or culled == 0:
+        t, local_normals, valid = surface.local_collide(Ps, Vs, newton_dtype)
+    else:
+        ct, cnormals, cvalid = surface.local_collide(
+            Ps[candidates], Vs[candidates], newton_dtype
+        )
+        t = torch.zeros_like(Ps[:, 0]).masked_scatter(candidates, ct)
+        local_normals = torch.zeros_like(Ps).masked_scatter(
+            candidates.unsqueeze(1).expand_as(Ps), cnormals
+        )
+        valid = torch.zeros_like(candidates).masked_scatter(candidates, cvalid)
 
     # Compute collision points and convert normals to global frame
     points = P + t.unsqueeze(1).expand_as(V) * V
@@ -48,7 +116,10 @@ def intersect(
     # remove non valid (non intersecting) points
     # do this before computing global frame?
     points = points[valid]
-    normals = normals[valid]
+
+    # Surfaces may return non unit normals (e.g. gradients of implicit
+    # functions), but the optical functions expect unit vectors
+    normals = torch.nn.functional.normalize(normals[valid], dim=1)
 
     # A surface always has two opposite normals, so keep the one pointing
     # against the ray, because that's what we need for refraction / reflection
@@ -0,0 +1,527 @@
+import torch
+import torch.nn as nn
+import math
+from dataclasses import dataclass
+
+from typing import Any, Optional, Sequence
+
+from torchlensmaker.transforms import TransformBase, forward_kinematic
+from torchlensmaker.physics import reflection, refraction, fresnel_reflectance
+from torchlensmaker.intersect import intersect
+from torchlensmaker.optics import (
+    OpticalSurface,
+    RefractiveSurface,
+    Aperture,
+    default_input,
+)
+from torchlensmaker.full_forward import full_forward
+
+
+Tensor = torch.Tensor
+
+
+def surface_box(
+    element: OpticalSurface, transform: TransformBase
+) -> tuple[Tensor, Tensor]:
+    """
+    Axis aligned bounding box of a surface in the global frame
+
+    The box contains the bounding cylinder of the surface (see
+    bounding_cylinder()). It's infinite if the surface has no known bounds.
+
+    Returns:
+        lower, upper: tensors of shape (dim,)
+    """
+
+    dim, dtype = transform.dim, transform.dtype
+    bounds = element.surface.bounds_x()
+    if bounds is None:
+        return (
+            torch.full((dim,), -math.inf, dtype=dtype),
+            torch.full((dim,), math.inf, dtype=dtype),
+        )
+
+    with torch.no_grad():
+        radius = element.surface.outline.max_radius()
+        ranges = [bounds.to(dtype)] + [
+            torch.tensor([-radius, radius], dtype=dtype)
+        ] * (dim - 1)
+        corners = transform.direct_points(torch.cartesian_prod(*ranges))
+        lower, upper = corners.min(dim=0).values, corners.max(dim=0).values
+        tol = 1e-6 * (1.0 + torch.max(upper - lower))
+        return lower - tol, upper + tol
+
+
+def ray_box(P: Tensor, V: Tensor, lower: Tensor, upper: Tensor) -> Tensor:
+    """
+    Slab test of half-lines P + tV, t >= 0, against axis aligned boxes
+
+    Args:
+        P, V: rays, tensors of shape (N, dim)
+        lower, upper: boxes, tensors of shape (N, dim)
+
+    Returns:
+        bool tensor of shape (N,)
+    """
+
+    parallel = V == 0
+    safe_V = torch.where(parallel, 1.0, V)
+    t1, t2 = (lower - P) / safe_V, (upper - P) / safe_V
+
+    # Parallel axes don't constrain t, but the origin must be within the slab
+    inside = (P >= lower) & (P <= upper)
+    t_enter = torch.where(parallel, -math.inf, torch.minimum(t1, t2))
+    t_exit = torch.where(parallel, math.inf, torch.maximum(t1, t2))
+
+    t_enter = torch.clamp(t_enter.max(dim=1).values, min=0.0)
+    t_exit = t_exit.min(dim=1).values
+    return torch.all(~parallel | inside, dim=1) & (t_exit >= t_enter)
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over a set of axis aligned boxes
+
+    Built top down by splitting boxes at the median of their centers, along
+    the axis where centers are most spread out. Nodes are stored in flat
+    tensors so that the traversal is batched over rays: each iteration tests
+    all (ray, node) pairs of one tree level at once.
+    """
+
+    def __init__(self, lower: Tensor, upper: Tensor, leaf_size: int = 2):
+        """
+        Args:
+            lower, upper: boxes, tensors of shape (M, dim)
+            leaf_size: maximum number of boxes in a leaf
+        """
+
+        assert lower.shape == upper.shape and lower.dim() == 2
+        assert leaf_size >= 1
+
+        # Centers of infinite boxes are at the origin
+        centers = torch.nan_to_num((lower + upper) / 2, nan=0.0)
+
+        nodes_lower: list[Tensor] = []
+        nodes_upper: list[Tensor] = []
+        children: list[list[int]] = []
+        leaves: list[list[int]] = []
+        order: list[int] = []
+
+        def build(indices: list[int]) -> int:
+            node = len(children)
+            nodes_lower.append(lower[indices].min(dim=0).values)
+            nodes_upper.append(upper[indices].max(dim=0).values)
+            children.append([-1, -1])
+            leaves.append([len(order), 0])
+
+            if len(indices) <= leaf_size:
+                order.extend(indices)
+                leaves[node][1] = len(indices)
+                return node
+
+            c = centers[indices]
+            axis = int(torch.argmax(c.max(dim=0).values - c.min(dim=0).values))
+            indices = sorted(indices, key=lambda i: centers[i, axis].item())
+            half = len(indices) // 2
+            children[node] = [build(indices[:half]), build(indices[half:])]
+            return node
+
+        if lower.shape[0] > 0:
+            build(list(range(lower.shape[0])))
+
+        dim, dtype = lower.shape[1], lower.dtype
+        self.lower = torch.stack(nodes_lower) if nodes_lower else lower
+        self.upper = torch.stack(nodes_upper) if nodes_upper else upper
+        self.children = torch.tensor(children, dtype=torch.int64).reshape(-1, 2)
+        self.leaves = torch.tensor(leaves, dtype=torch.int64).reshape(-1, 2)
+        self.order = torch.tensor(order, dtype=torch.int64)
+        self.box_lower, self.box_upper = lower, upper
+        assert self.lower.shape[1] == dim and self.lower.dtype == dtype
+
+    def candidates(self, P: Tensor, V: Tensor) -> tuple[Tensor, Tensor]:
+        """
+        Pairs of rays and boxes such that the ray (a half-line) hits the box
+
+        Returns:
+            rays, boxes: int64 tensors of shape (K,), indices of the pairs
+        """
+
+        empty = torch.zeros((0,), dtype=torch.int64)
+        if self.children.shape[0] == 0:
+            return empty, empty
+
+        rays = torch.arange(P.shape[0])
+        nodes = torch.zeros_like(rays)
+        out_rays, out_boxes = [empty], [empty]
+
+        while rays.numel() > 0:
+            hit = ray_box(P[rays], V[rays], self.lower[nodes], self.upper[nodes])
+            rays, nodes = rays[hit], nodes[hit]
+
+            # Leaves expand to (ray, box) pairs, each tested against its box
+            leaf = self.children[nodes, 0] < 0
+            start, count = self.leaves[nodes[leaf]].unbind(dim=1)
+            offsets = torch.arange(int(count.sum())) - torch.repeat_interleave(
+                torch.cumsum(count, dim=0) - count, count
+            )
+            leaf_rays = torch.repeat_interleave(rays[leaf], count)
+            leaf_boxes = self.order[torch.repeat_interleave(start, count) + offsets]
+            hit = ray_box(
+                P[leaf_rays],
+                V[leaf_rays],
+                self.box_lower[leaf_boxes],
+                self.box_upper[leaf_boxes],
+            )
+            out_rays.append(leaf_rays[hit])
+            out_boxes.append(leaf_boxes[hit])
+
+            # Internal nodes expand to both children
+            rays, nodes = rays[~leaf], nodes[~leaf]
+            rays = torch.cat((rays, rays))
+            nodes = torch.cat((self.children[nodes, 0], self.children[nodes, 1]))
+
+        return torch.cat(out_rays), torch.cat(out_boxes)
+
+
+@dataclass
+class RaySegment:
+    """
+    Rays of one bounce of a non-sequential trace
+
+    Rays start at P in the direction V, and hit the scene surface with index
+    `surface` at P + tV. Rays that escape the scene have surface -1 and
+    infinite t.
+
+    With Fresnel splitting (see Scene.trace()), each ray carries a fraction
+    of the energy of its source ray, and the number of reflections on
+    refractive surfaces along its path, which is the order of the ghost it
+    belongs to.
+    """
+
+    # Tensors of shape (N, dim)
+    P: Tensor
+    V: Tensor
+
+    # Tensor of shape (N,)
+    t: Tensor
+
+    # Int64 tensors of shape (N,)
+    surface: Tensor
+
+    # Index of the source ray each ray comes from
+    source: Tensor
+
+    # Tensor of shape (N,)
+    # Fraction of the energy of the source ray
+    weight: Tensor
+
+    # Int64 tensor of shape (N,)
+    # Number of reflections on refractive surfaces, 0 on the primary path
+    reflections: Tensor
+
+    def escaped(self) -> Tensor:
+        "Mask of rays that don't hit any surface"
+        return self.surface < 0
+
+
+class Scene:
+    """
+    Set of optical surfaces at fixed positions, for non-sequential ray tracing
+
+    Unlike the sequential model, where rays go through optical elements in a
+    fixed order, each ray of a non-sequential trace bounces on the closest
+    surface it hits, whichever it is. This models folded paths, ghost
+    reflections and stray light.
+
+    Closest hit queries are batched over all rays: a BVH built from the
+    bounding volume of each surface gives candidate (ray, surface) pairs, then
+    intersect() runs once per surface over its candidate rays.
+
+    Refractive surfaces have index n1 on the -X side of their element frame
+    and n2 on the +X side, which is the convention of the sequential model for
+    rays going forward. Rays beyond the critical angle are reflected.
+    """
+
+    def __init__(
+        self,
+        elements: Sequence[OpticalSurface],
+        transforms: Sequence[TransformBase],
+        frames: Optional[Sequence[TransformBase]] = None,
+    ):
+        """
+        Args:
+            elements: optical surfaces of the scene
+            transforms: transform of each surface, from its local frame to the
+                global frame
+            frames: transform of each element frame, which orients the media
+                of refractive surfaces. Defaults to the surface transforms.
+        """
+
+        assert len(elements) == len(transforms)
+        self.elements = list(elements)
+        self.transforms = list(transforms)
+        self.frames = list(transforms if frames is None else frames)
+        assert len(self.frames) == len(self.elements)
+
+        boxes = [surface_box(e, t) for e, t in zip(self.elements, self.transforms)]
+        dim, dtype = self.transforms[0].dim, self.transforms[0].dtype
+        self.bvh = BVH(
+            torch.stack([b[0] for b in boxes])
+            if boxes
+            else torch.zeros((0, dim), dtype=dtype),
+            torch.stack([b[1] for b in boxes])
+            if boxes
+            else torch.zeros((0, dim), dtype=dtype),
+        )
+
+    @classmethod
+    def from_sequential(cls, model: nn.Module, sampling: dict[str, Any]) -> "Scene":
+        """
+        Scene of the optical surfaces of a sequential model, at the positions
+        they have in the model's kinematic chain
+
+        Apertures are not included: their surface is the opening, so they have
+        no non-sequential equivalent.
+        """
+
+        sampling = {**sampling, "base": 0}
+        execute_list, _ = full_forward(model, default_input(sampling))
+        dim, dtype = sampling["dim"], sampling["dtype"]
+
+        elements, transforms, frames = [], [], []
+        for module, inputs, _ in execute_list:
+            if isinstance(module, OpticalSurface) and not isinstance(
+                module, Aperture
+            ):
+                elements.append(module)
+                transforms.append(
+                    forward_kinematic(
+                        inputs.transforms + module.surface_transform(dim, dtype)
+                    )
+                )
+                frames.append(forward_kinematic(inputs.transforms))
+
+        return cls(elements, transforms, frames)
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def closest_hit(
+        self,
+        P: Tensor,
+        V: Tensor,
+        exclude: Optional[Tensor] = None,
+        min_distance: float = 1e-9,
+    ) -> tuple[Tensor, Tensor, Tensor]:
+        """
+        Closest surface hit by each ray P + tV, with t > min_distance
+
+        Args:
+            P, V: rays, tensors of shape (N, dim)
+            exclude: optional int64 tensor of shape (N,), index of a surface
+                that each ray ignores, typically the one it starts from
+
+        Returns:
+            t: tensor of shape (N,), inf for rays that don't hit anything
+            normals: tensor of shape (N, dim), unit normals at the hit points,
+                pointing against the rays. Zero for rays that don't hit.
+            surface: int64 tensor of shape (N,), index of the surface hit, -1
+                for rays that don't hit anything
+        """
+
+        N = P.shape[0]
+        cand_rays, cand_surfaces = self.bvh.candidates(P, V)
+        if exclude is not None:
+            keep = cand_surfaces != exclude[cand_rays]
+            cand_rays, cand_surfaces = cand_rays[keep], cand_surfaces[keep]
+
+        hit_rays, hit_t, hit_normals, hit_surfaces = [], [], [], []
+        for s in torch.unique(cand_surfaces).tolist():
+            rays = cand_rays[cand_surfaces == s]
+            Ps, Vs = P[rays], V[rays]
+            points, normals, valid = intersect(
+                self.elements[s].surface, Ps, Vs, self.transforms[s]
+            )
+            Vv = Vs[valid]
+            t = torch.sum((points - Ps[valid]) * Vv, dim=1) / torch.sum(Vv * Vv, dim=1)
+            forward = t > min_distance
+
+            hit_rays.append(rays[valid][forward])
+            hit_t.append(t[forward])
+            hit_normals.append(normals[forward])
+            hit_surfaces.append(torch.full_like(hit_rays[-1], s))
+
+        t_out = torch.full((N,), math.inf, dtype=P.dtype)
+        normals_out = torch.zeros_like(P)
+        surface_out = torch.full((N,), -1, dtype=torch.int64)
+        if len(hit_rays) == 0:
+            return t_out, normals_out, surface_out
+
+        rays, t = torch.cat(hit_rays), torch.cat(hit_t)
+        normals, surfaces = torch.cat(hit_normals), torch.cat(hit_surfaces)
+
+        # Keep the closest hit of each ray, the first one in case of a tie
+        with torch.no_grad():
+            closest = torch.full((N,), math.inf, dtype=P.dtype)
+            closest = closest.scatter_reduce(0, rays, t, reduce="amin")
+            entries = torch.arange(rays.shape[0])
+            first = torch.full((N,), rays.shape[0], dtype=torch.int64)
+            first = first.scatter_reduce(
+                0, rays, torch.where(t == closest[rays], entries, rays.shape[0]), "amin"
+            )
+            win = first[rays] == entries
+
+        t_out = t_out.index_put((rays[win],), t[win])
+        normals_out = normals_out.index_put((rays[win],), normals[win])
+        surface_out[rays[win]] = surfaces[win]
+        return t_out, normals_out, surface_out
+
+    def scatter(
+        self, V: Tensor, normals: Tensor, surface: Tensor
+    ) -> tuple[Tensor, Tensor]:
+        """
+        Outgoing rays directions at the hit surfaces
+
+        Args:
+            V: incident rays vectors, tensor of shape (N, dim)
+            normals: normals against the rays, tensor of shape (N, dim)
+            surface: index of the surface hit by each ray, shape (N,)
+
+        Returns:
+            vectors: tensor of shape (N, dim)
+            alive: bool tensor of shape (N,), False for rays absorbed by the
+                optical function of their surface
+        """
+
+        vectors = torch.zeros_like(V)
+        alive = torch.ones_like(surface, dtype=torch.bool)
+
+        for s in torch.unique(surface).tolist():
+            mask = surface == s
+            element = self.elements[s]
+            rays, n = V[mask], normals[mask]
+
+            if isinstance(element, RefractiveSurface):
+                n1, n2 = self.media(s, n)
+                out = refraction(rays, n, n1, n2, critical_angle="reflect")
+            else:
+                out, element_alive = element.optical_function(rays, n)
+                if element_alive is not None:
+                    alive[mask] = element_alive
+
+            vectors = vectors.masked_scatter(mask.unsqueeze(1).expand_as(V), out)
+
+        return vectors, alive
+
+    def media(self, s: int, normals: Tensor) -> tuple[Tensor, Tensor]:
+        """
+        Indices of refraction of the incident and refracted media of rays
+        hitting refractive surface s, from the normals against the rays
+        """
+
+        element = self.elements[s]
+        assert isinstance(element, RefractiveSurface)
+
+        # Normals against the ray point to the side the ray comes from
+        forward = self.frames[s].inverse_vectors(normals)[:, 0] < 0
+        n1 = torch.as_tensor(element.n1, dtype=normals.dtype)
+        n2 = torch.as_tensor(element.n2, dtype=normals.dtype)
+        return torch.where(forward, n1, n2), torch.where(forward, n2, n1)
+
+    def reflectance(self, V: Tensor, normals: Tensor, surface: Tensor) -> Tensor:
+        """
+        Fresnel reflectance at the hit surfaces, zero for surfaces that are not
+        refractive
+
+        Args:
+            V: incident rays vectors, tensor of shape (N, dim)
+            normals: normals against the rays, tensor of shape (N, dim)
+            surface: index of the surface hit by each ray, shape (N,)
+
+        Returns:
+            tensor of shape (N,)
+        """
+
+        R = torch.zeros_like(V[:, 0])
+        for s in torch.unique(surface).tolist():
+            if isinstance(self.elements[s], RefractiveSurface):
+                mask = surface == s
+                n1, n2 = self.media(s, normals[mask])
+                R = R.masked_scatter(
+                    mask, fresnel_reflectance(V[mask], normals[mask], n1, n2)
+                )
+        return R
+
+    def trace(
+        self,
+        P: Tensor,
+        V: Tensor,
+        max_bounces: int,
+        split: bool = False,
+        threshold: float = 1e-4,
+    ) -> list[RaySegment]:
+        """
+        Non-sequential ray tracing
+
+        Each bounce is one closest hit query for all rays still in the scene.
+        Rays that escape the scene stop, the others are reflected or
+        refracted by the surface they hit and start from the hit point, for up
+        to max_bounces bounces.
+
+        With split=True, rays hitting a refractive surface split into a
+        transmitted and a reflected ray, weighted by the Fresnel transmittance
+        and reflectance. Rays with a weight up to threshold are pruned. The
+        total weight of rays is at most the number of source rays, so each
+        bounce has at most N / threshold rays.
+
+        Args:
+            P, V: source rays, tensors of shape (N, dim)
+            max_bounces: maximum number of surface interactions of a ray
+            split: split rays at refractive surfaces
+            threshold: minimum weight of split rays
+
+        Returns:
+            list of ray segments, one per closest hit query. Rays that escape
+            the scene are the escaped() rays of all segments. Rays of the last
+            segment that still hit a surface are truncated.
+        """
+
+        source = torch.arange(P.shape[0])
+        exclude = torch.full_like(source, -1)
+        weight = torch.ones_like(P[:, 0])
+        reflections = torch.zeros_like(source)
+        segments: list[RaySegment] = []
+
+        for bounce in range(max_bounces + 1):
+            t, normals, surface = self.closest_hit(P, V, exclude)
+            segments.append(RaySegment(P, V, t, surface, source, weight, reflections))
+
+            hit = surface >= 0
+            if bounce == max_bounces or not torch.any(hit):
+                break
+
+            P = P[hit] + t[hit].unsqueeze(1) * V[hit]
+            V, normals, surface = V[hit], normals[hit], surface[hit]
+            source, weight, reflections = source[hit], weight[hit], reflections[hit]
+
+            vectors, alive = self.scatter(V, normals, surface)
+
+            if split:
+                # Reflected children of rays at refractive surfaces, weighted
+                # by the Fresnel reflectance, then pruning of low energy rays
+                R = self.reflectance(V, normals, surface)
+                f = R > 0
+                vectors = torch.cat((vectors, reflection(V[f], normals[f])))
+                alive = torch.cat((alive, torch.ones_like(alive[f])))
+                weight = torch.cat((weight * (1 - R), weight[f] * R[f]))
+                reflections = torch.cat((reflections, reflections[f] + 1))
+                P = torch.cat((P, P[f]))
+                surface = torch.cat((surface, surface[f]))
+                source = torch.cat((source, source[f]))
+                alive = alive & (weight > threshold)
+
+            P, V, exclude = P[alive], vectors[alive], surface[alive]
+            source, weight = source[alive], weight[alive]
+            reflections = reflections[alive]
+
+        return segments
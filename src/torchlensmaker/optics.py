@@ -16,10 +16,16 @@ from torchlensmaker.surfaces import (
     LocalSurface,
     CircularPlane,
 )
-from torchlensmaker.physics import refraction, reflection
+from torchlensmaker.physics import (
+    refraction,
+    refraction_alive,
+    reflection,
+    RefractionCriticalAngleMode,
+)
 from torchlensmaker.rot2d import rot2d
 from torchlensmaker.rot3d import euler_angles_to_matrix
 from torchlensmaker.intersect import intersect
+from torchlensmaker.sampling import sample_line, sample_disk
 
 
 Tensor = torch.Tensor
@@ -38,6 +44,11 @@ class OpticalData:
     P: Tensor
     V: Tensor
 
+    # Tensor of shape (N, 1|2)
+    # Normalized coordinates in [-1, 1] of the object point that emitted each
+    # ray, the center of the object being at zero
+    coord_object: Tensor
+
     # None or Tensor of shape (N,)
     # Mask array indicating which rays from the previous data in the sequence
     # were blocked by the previous optical element. "blocked" includes hitting
@@ -62,6 +73,7 @@ def default_input(sampling: dict[str, Any]) -> OpticalData:
         transforms=[IdentityTransform(dim, dtype)],
         P=torch.empty((0, dim), dtype=dtype),
         V=torch.empty((0, dim), dtype=dtype),
+        coord_object=torch.empty((0, dim - 1), dtype=dtype),
         blocked=None,
         loss=torch.tensor(0.0, dtype=dtype),
     )
@@ -72,7 +84,7 @@ class FocalPoint(nn.Module):
         super().__init__()
 
     def forward(self, inputs: OpticalData) -> OpticalData:
-        dim = inputs.sampling["dim"]
+        dim, dtype = inputs.sampling["dim"], inputs.sampling["dtype"]
         N = inputs.P.shape[0]
 
         X = inputs.target()
@@ -83,9 +95,9 @@ class FocalPoint(nn.Module):
 
         # If 2D, pad to 3D with zeros
         if dim == 2:
-            X = torch.cat((X, torch.zeros(1)), dim=0)
-            P = torch.cat((P, torch.zeros((N, 1))), dim=1)
-            V = torch.cat((V, torch.zeros((N, 1))), dim=1)
+            X = torch.cat((X, torch.zeros(1, dtype=dtype)), dim=0)
+            P = torch.cat((P, torch.zeros((N, 1), dtype=dtype)), dim=1)
+            V = torch.cat((V, torch.zeros((N, 1), dtype=dtype)), dim=1)
 
         cross = torch.cross(X - P, V, dim=1)
         norm = torch.norm(V, dim=1)
@@ -97,92 +109,420 @@ class FocalPoint(nn.Module):
         return replace(inputs, loss=inputs.loss + loss)
 
 
-class PointSourceAtInfinity(nn.Module):
+class ImagePlane(nn.Module):
     """
-    A simple light source that models a perfect point at infinity.
+    Image of an object on a plane perpendicular to the principal axis
 
-    All rays are parallel with possibly some incidence angle
+    Rays are intersected with the X = 0 plane of the chain target frame, so
+    the plane follows rotations of the kinematic chain, and the loss is
+    the mean squared deviation of their image coordinates from a linear
+    mapping of their object coordinates (see OpticalData.coord_object).
     """
 
-    def __init__(self, beam_diameter: float, angle1: float = 0.0, angle2: float = 0.0):
+    def __init__(self, magnification: Optional[float] = None):
         """
-        beam_diameter: diameter of the beam of parallel light rays
-        angle1: angle of indidence with respect to the principal axis, in degrees
-        angle2: second angle of incidence used in 3D
-
-        samples along the base sampling dimension
+        magnification: image size of a normalized object coordinate, in the
+            plane units. If None, the best fit magnification is used.
         """
 
         super().__init__()
-        self.beam_diameter = torch.as_tensor(beam_diameter, dtype=torch.float64)
-        self.angle1 = torch.deg2rad(torch.as_tensor(angle1, dtype=torch.float64))
-        self.angle2 = torch.deg2rad(torch.as_tensor(angle2, dtype=torch.float64))
+        self.magnification = (
+            None
+            if magnification is None
+            else torch.as_tensor(magnification, dtype=torch.float64)
+        )
 
-    def forward(self, inputs: OpticalData) -> OpticalData:
-        # Create new rays by sampling the beam diameter
-        dim, dtype = inputs.sampling["dim"], inputs.sampling["dtype"]
-        num_rays = inputs.sampling["base"]
-        margin = 0.1  # TODO
+    def image_coordinates(self, inputs: OpticalData) -> Tensor:
+        "Coordinates of rays on the image plane, in the frame of the target"
 
-        # rays origins
-        D = self.beam_diameter
-        RY = torch.linspace(-D / 2 + margin, D / 2 - margin, num_rays)
+        # The plane is X = 0 in the local frame of the chain target
+        transform = forward_kinematic(inputs.transforms)
+        P = transform.inverse_points(inputs.P)
+        V = transform.inverse_vectors(inputs.V)
 
-        if dim == 3:
-            RZ = RY.clone()
+        t = -P[:, 0] / V[:, 0]
+        points = P + t.unsqueeze(1) * V
+        return points[:, 1:]
 
-        if dim == 2:
-            RX = torch.zeros(num_rays)
-            rays_origins = torch.column_stack((RX, RY))
+    def forward(self, inputs: OpticalData) -> OpticalData:
+        dtype = inputs.sampling["dtype"]
+        N = inputs.P.shape[0]
+
+        T = inputs.coord_object
+        Y = self.image_coordinates(inputs)
+
+        if self.magnification is None:
+            # Least squares fit of the magnification
+            den = torch.sum(T**2)
+            mag = torch.sum(T * Y) / torch.where(den > 0, den, 1.0)
         else:
-            RX = torch.zeros(num_rays * num_rays)
-            prod = torch.cartesian_prod(RY, RZ)
-            rays_origins = torch.column_stack((RX, prod[:, 0], prod[:, 1]))
+            mag = self.magnification.to(dtype=dtype)
 
-        # rays vectors
-        if dim == 2:
-            V = torch.tensor([1.0, 0.0], dtype=dtype)
+        residuals = Y - mag * T
+        loss = torch.sum(residuals**2) / N
+
+        return replace(inputs, loss=inputs.loss + loss)
+
+
+def normalized_samples(
+    dim: int, dtype: torch.dtype, base: int, strategy: str
+) -> Tensor:
+    """
+    Samples of the normalized [-1, 1] segment in 2D or unit disk in 3D
+
+    Returns:
+        tensor of shape (M, dim-1)
+    """
 
-            vect = rot2d(V, self.angle1)
+    if dim == 2:
+        return sample_line(strategy, base, dtype).unsqueeze(1)
+    else:
+        return sample_disk(strategy, base, dtype)
+
+
+def field_samples(
+    dim: int, dtype: torch.dtype, num_object: int, strategy: str
+) -> Tensor:
+    "Normalized object field samples, a single field point is the center"
+
+    if num_object == 1:
+        return torch.zeros((1, dim - 1), dtype=dtype)
+    return normalized_samples(dim, dtype, num_object, strategy)
+
+
+def tangent_directions(samples: Tensor, half_angle: Tensor) -> Tensor:
+    """
+    Unit vectors around the X axis, from normalized samples of the tangent plane
+
+    A sample on the edge of the normalized domain makes an angle half_angle
+    with the X axis.
+
+    Args:
+        samples: tensor of shape (M, dim-1)
+        half_angle: tensor of dim 0, in radians
+
+    Returns:
+        tensor of shape (M, dim)
+    """
+
+    ones = torch.ones((samples.shape[0], 1), dtype=samples.dtype)
+    V = torch.cat((ones, torch.tan(half_angle) * samples), dim=1)
+    return V / torch.linalg.vector_norm(V, dim=1, keepdim=True)
+
+
+class LightSourceBase(nn.Module):
+    """
+    Base class of light sources
+
+    Sources add rays to the optical data, together with their normalized
+    coordinate in the object (the source-coordinate column coord_object).
+    Rays are generated for normalized field and pupil samples by samples()
+    and field_rays(), in the source frame.
+
+    Local rays only depend on sampling and on the source attributes, so they
+    are cached per sampling configuration, except for random sampling which
+    must be drawn again every time. The cache is cleared when the source
+    attributes change, and is not used when they require grad. Only the
+    kinematic chain transform is applied at each forward.
+
+    Pupil samples can be remapped per field point by an affine map, to aim
+    rays at the system stop (see RayAiming).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # Cache of local frame rays, indexed by sampling_key(), valid for the
+        # source attribute values in _cache_values
+        self._cache: dict[tuple[Any, ...], tuple[Tensor, Tensor, Tensor]] = {}
+        self._cache_values: tuple[Any, ...] = ()
+
+        # Per field affine maps of normalized pupil coordinates, indexed by
+        # sampling_key(). Values are (center, matrix) tensors of shapes
+        # (F, dim-1) and (F, dim-1, dim-1).
+        self.pupil_maps: dict[tuple[Any, ...], tuple[Tensor, Tensor]] = {}
+
+    def sampling_key(self, sampling: dict[str, Any]) -> tuple[Any, ...]:
+        "Sampling values that local rays depend on, arguments of samples()"
+
+        return (
+            sampling["dim"],
+            sampling["dtype"],
+            sampling["base"],
+            sampling.get("strategy", "grid"),
+        )
+
+    def source_tensors(self) -> list[Tensor]:
+        "Tensor attributes and parameters of the source, in name order"
+
+        tensors = {k: v for k, v in vars(self).items() if isinstance(v, Tensor)}
+        tensors.update(self.named_parameters(recurse=False))
+        return [tensors[k] for k in sorted(tensors)]
+
+    def samples(self, *key: Any) -> tuple[Tensor, Tensor]:
+        """
+        Normalized field and pupil samples
+
+        Returns:
+            field: tensor of shape (F, dim-1)
+            pupil: tensor of shape (M, dim-1)
+        """
+        raise NotImplementedError
+
+    def field_rays(self, field: Tensor, pupil: Tensor) -> tuple[Tensor, Tensor]:
+        """
+        Rays origins and vectors in the source frame
+
+        Args:
+            field: normalized field samples, tensor of shape (F, dim-1)
+            pupil: normalized pupil samples of each field point, tensor of
+                shape (F, M, dim-1)
+
+        Returns:
+            origins and vectors, tensors of shape (F*M, dim) in field major
+            order
+        """
+        raise NotImplementedError
+
+    def local_rays(self, *key: Any) -> tuple[Tensor, Tensor, Tensor]:
+        "Rays origins, vectors and object coordinates in the source frame"
+
+        field, pupil = self.samples(*key)
+        F, M = field.shape[0], pupil.shape[0]
+
+        if key in self.pupil_maps:
+            center, matrix = self.pupil_maps[key]
+            assert center.shape == field.shape, (center.shape, field.shape)
+            pupil_fields = center.unsqueeze(1) + pupil @ matrix.transpose(1, 2)
         else:
-            V = torch.tensor([1.0, 0.0, 0.0], dtype=dtype)
-            M = euler_angles_to_matrix(
-                torch.deg2rad(
-                    torch.as_tensor([0.0, self.angle1, self.angle2], dtype=dtype)
-                ),
-                "ZYX",
-            ).to(
-                dtype=dtype
-            )  # TODO need to support dtype in euler_angles_to_matrix
-            vect = V @ M
+            pupil_fields = pupil.expand(F, M, pupil.shape[1])
 
-        assert vect.dtype == dtype
+        origins, vectors = self.field_rays(field, pupil_fields)
+        return origins, vectors, torch.repeat_interleave(field, M, dim=0)
 
-        if dim == 2:
-            rays_vectors = torch.tile(vect, (num_rays, 1))
+    def forward(self, inputs: OpticalData) -> OpticalData:
+        dim = inputs.sampling["dim"]
+        key = self.sampling_key(inputs.sampling)
+
+        # Aimed rays change with the pupil maps, and rays of a source with
+        # trainable attributes must be part of the graph, so they are not cached
+        tensors = self.source_tensors()
+        if (
+            inputs.sampling.get("strategy", "grid") == "random"
+            or key in self.pupil_maps
+            or any(t.requires_grad for t in tensors)
+        ):
+            rays_origins, rays_vectors, coord_object = self.local_rays(*key)
         else:
-            # use the same base dimension twice here
-            # TODO could define different ones
-            rays_vectors = torch.tile(vect, (num_rays * num_rays, 1))
+            values = tuple(tuple(t.reshape(-1).tolist()) for t in tensors)
+            if values != self._cache_values:
+                self._cache.clear()
+                self._cache_values = values
+
+            if key not in self._cache:
+                self._cache[key] = self.local_rays(*key)
+            rays_origins, rays_vectors, coord_object = self._cache[key]
 
         # transform sources to the chain target
         transform = forward_kinematic(inputs.transforms)
         rays_origins = transform.direct_points(rays_origins)
         rays_vectors = transform.direct_vectors(rays_vectors)
 
-        # normalized coordinate along the base dimension
-        # coord_base = (RY + self.beam_diameter / 2) / self.beam_diameter
-
         assert rays_origins.shape[1] == dim, rays_origins.shape
         assert rays_vectors.shape[1] == dim, rays_vectors.shape
+        assert coord_object.shape == (rays_origins.shape[0], dim - 1)
 
         return replace(
             inputs,
             P=torch.cat((inputs.P, rays_origins), dim=0),
             V=torch.cat((inputs.V, rays_vectors), dim=0),
+            coord_object=torch.cat((inputs.coord_object, coord_object), dim=0),
         )
 
 
+class ObjectAtInfinity(LightSourceBase):
+    """
+    An object at infinity, modeled as a collection of points at infinity
+
+    Each point of the object emits a beam of parallel rays. Field points are
+    sampled along the object's angular size and pupil points along the beam
+    diameter, and all field x pupil rays are generated as one batch.
+    """
+
+    def __init__(
+        self,
+        beam_diameter: float,
+        angular_size: float,
+        angle1: float = 0.0,
+        angle2: float = 0.0,
+    ):
+        """
+        beam_diameter: diameter of the beam of parallel light rays
+        angular_size: apparent angular size of the object, in degrees
+        angle1: angle of incidence of the object's center with respect to the
+            principal axis, in degrees
+        angle2: second angle of incidence used in 3D
+
+        samples field points along the "object" sampling dimension (default 3)
+        and pupil points along the base sampling dimension, with the pattern
+        selected by the "strategy" sampling key (see torchlensmaker.sampling).
+        Field points are sampled on the tangent plane.
+        """
+
+        super().__init__()
+        self.beam_diameter = torch.as_tensor(beam_diameter, dtype=torch.float64)
+        self.angular_size = torch.deg2rad(
+            torch.as_tensor(angular_size, dtype=torch.float64)
+        )
+        self.angle1 = torch.deg2rad(torch.as_tensor(angle1, dtype=torch.float64))
+        self.angle2 = torch.deg2rad(torch.as_tensor(angle2, dtype=torch.float64))
+
+    def sampling_key(self, sampling: dict[str, Any]) -> tuple[Any, ...]:
+        return super().sampling_key(sampling) + (sampling.get("object", 3),)
+
+    def center_direction(self, V: Tensor) -> Tensor:
+        "Rotate vectors V (shape (M, dim)) by the object's angles of incidence"
+
+        dim, dtype = V.shape[1], V.dtype
+        if dim == 2:
+            return rot2d(V, self.angle1.to(dtype=dtype))
+        else:
+            # angles are already stored in radians
+            M = euler_angles_to_matrix(
+                torch.stack(
+                    (torch.zeros_like(self.angle1), self.angle1, self.angle2)
+                ).to(dtype=dtype),
+                "ZYX",
+            )
+            return V @ M
+
+    def samples(
+        self, dim: int, dtype: torch.dtype, base: int, strategy: str, num_object: int
+    ) -> tuple[Tensor, Tensor]:
+        return (
+            field_samples(dim, dtype, num_object, strategy),
+            normalized_samples(dim, dtype, base, strategy),
+        )
+
+    def field_rays(self, field: Tensor, pupil: Tensor) -> tuple[Tensor, Tensor]:
+        F, M, dim = pupil.shape[0], pupil.shape[1], pupil.shape[2] + 1
+        dtype = pupil.dtype
+        margin = 0.1  # TODO
+
+        # rays origins, sampled in the normalized beam and scaled to its radius
+        radius = self.beam_diameter.to(dtype=dtype) / 2 - margin
+        origins = torch.cat(
+            (torch.zeros((F, M, 1), dtype=dtype), radius * pupil), dim=2
+        )
+
+        # one direction per field point
+        half_angle = self.angular_size.to(dtype=dtype) / 2
+        vectors = self.center_direction(tangent_directions(field, half_angle))
+
+        assert vectors.dtype == dtype
+
+        return (
+            origins.reshape(F * M, dim),
+            torch.repeat_interleave(vectors, M, dim=0),
+        )
+
+
+class PointSourceAtInfinity(ObjectAtInfinity):
+    """
+    A simple light source that models a perfect point at infinity.
+
+    All rays are parallel with possibly some incidence angle
+    """
+
+    def __init__(self, beam_diameter: float, angle1: float = 0.0, angle2: float = 0.0):
+        """
+        beam_diameter: diameter of the beam of parallel light rays
+        angle1: angle of indidence with respect to the principal axis, in degrees
+        angle2: second angle of incidence used in 3D
+
+        samples along the base sampling dimension, with the pattern selected
+        by the "strategy" sampling key (see torchlensmaker.sampling)
+        """
+
+        super().__init__(beam_diameter, 0.0, angle1, angle2)
+
+    def sampling_key(self, sampling: dict[str, Any]) -> tuple[Any, ...]:
+        # A single field point, at the object's center
+        return LightSourceBase.sampling_key(self, sampling) + (1,)
+
+
+class Object(LightSourceBase):
+    """
+    An object at a finite distance, modeled as a collection of point sources
+
+    Each point of the object emits a cone of rays around the principal axis.
+    Field points are sampled along the object's diameter and pupil points
+    along the beam angle, and all field x pupil rays are generated as one
+    batch.
+    """
+
+    def __init__(self, beam_angle: float, diameter: float, height: float = 0.0):
+        """
+        beam_angle: total angle of the emitted cone of rays, in degrees
+        diameter: diameter of the object
+        height: position of the object's center above the principal axis
+
+        samples field points along the "object" sampling dimension (default 3)
+        and pupil points along the base sampling dimension, with the pattern
+        selected by the "strategy" sampling key (see torchlensmaker.sampling)
+        """
+
+        super().__init__()
+        self.beam_angle = torch.deg2rad(
+            torch.as_tensor(beam_angle, dtype=torch.float64)
+        )
+        self.diameter = torch.as_tensor(diameter, dtype=torch.float64)
+        self.height = torch.as_tensor(height, dtype=torch.float64)
+
+    def sampling_key(self, sampling: dict[str, Any]) -> tuple[Any, ...]:
+        return super().sampling_key(sampling) + (sampling.get("object", 3),)
+
+    def samples(
+        self, dim: int, dtype: torch.dtype, base: int, strategy: str, num_object: int
+    ) -> tuple[Tensor, Tensor]:
+        return (
+            field_samples(dim, dtype, num_object, strategy),
+            normalized_samples(dim, dtype, base, strategy),
+        )
+
+    def field_rays(self, field: Tensor, pupil: Tensor) -> tuple[Tensor, Tensor]:
+        F, M, dim = pupil.shape[0], pupil.shape[1], pupil.shape[2] + 1
+        dtype = pupil.dtype
+
+        # one origin per field point
+        points = self.diameter.to(dtype=dtype) / 2 * field
+        points[:, 0] = points[:, 0] + self.height.to(dtype=dtype)
+        origins = torch.cat((torch.zeros((F, 1), dtype=dtype), points), dim=1)
+
+        # rays vectors, sampled in the normalized beam cone
+        vectors = tangent_directions(
+            pupil.reshape(F * M, dim - 1), self.beam_angle.to(dtype=dtype) / 2
+        )
+
+        return torch.repeat_interleave(origins, M, dim=0), vectors
+
+
+class PointSource(Object):
+    "A point light source at a finite distance, emitting a cone of rays"
+
+    def __init__(self, beam_angle: float, height: float = 0.0):
+        """
+        beam_angle: total angle of the emitted cone of rays, in degrees
+        height: height of the point source above the principal axis
+        """
+
+        super().__init__(beam_angle, 0.0, height)
+
+    def sampling_key(self, sampling: dict[str, Any]) -> tuple[Any, ...]:
+        # A single field point
+        return LightSourceBase.sampling_key(self, sampling) + (1,)
+
+
 class OpticalSurface(nn.Module):
     def __init__(
         self,
@@ -241,22 +581,34 @@ class OpticalSurface(nn.Module):
             inputs.transforms + self.surface_transform(dim, dtype)
         )
 
+        # Optional mixed precision intersection, see intersect_newton()
+        newton_dtype = inputs.sampling.get("newton_dtype", None)
+
         collision_points, surface_normals, valid = intersect(
-            self.surface, inputs.P, inputs.V, surface_transform
+            self.surface, inputs.P, inputs.V, surface_transform, newton_dtype
         )
 
         # Refract or reflect rays based on the derived class implementation
-        output_rays = self.optical_function(
+        output_rays, alive = self.optical_function(
             inputs.V[valid],
             surface_normals,
         )
 
+        # Fold rays dropped by the optical function (i.e. beyond the critical
+        # angle) into the blocked mask, so that they are removed together
+        # with non colliding rays and blocked stays relative to the inputs
+        if alive is not None:
+            valid = valid.clone().masked_scatter_(valid, alive)
+            collision_points = collision_points[alive]
+            output_rays = output_rays[alive]
+
         chain_transform = self.chain_transform(dim, dtype)
 
         return replace(
             inputs,
             P=collision_points,
             V=output_rays,
+            coord_object=inputs.coord_object[valid],
             transforms=list(inputs.transforms) + list(chain_transform),
             blocked=~valid,
         )
@@ -271,8 +623,10 @@ class ReflectiveSurface(OpticalSurface):
     ):
         super().__init__(surface, scale, anchors)
 
-    def optical_function(self, rays: Tensor, normals: Tensor) -> Tensor:
-        return reflection(rays, normals)
+    def optical_function(
+        self, rays: Tensor, normals: Tensor
+    ) -> tuple[Tensor, Optional[Tensor]]:
+        return reflection(rays, normals), None
 
 
 class RefractiveSurface(OpticalSurface):
@@ -282,21 +636,39 @@ class RefractiveSurface(OpticalSurface):
         n: tuple[float, float],
         scale: float = 1.0,
         anchors: tuple[str, str] = ("origin", "origin"),
+        critical_angle: RefractionCriticalAngleMode = "clamp",
     ):
+        """
+        critical_angle: handling of rays beyond the critical angle, see
+            refraction(). With 'drop', they are blocked by the surface.
+            Default is 'clamp'.
+        """
+
         super().__init__(surface, scale, anchors)
         self.n1, self.n2 = n
+        self.critical_angle = critical_angle
 
-    def optical_function(self, rays: Tensor, normals: Tensor) -> Tensor:
-        return refraction(rays, normals, self.n1, self.n2, critical_angle="clamp")
+    def optical_function(
+        self, rays: Tensor, normals: Tensor
+    ) -> tuple[Tensor, Optional[Tensor]]:
+        if self.critical_angle == "drop":
+            return refraction_alive(rays, normals, self.n1, self.n2)
+
+        refracted = refraction(
+            rays, normals, self.n1, self.n2, critical_angle=self.critical_angle
+        )
+        return refracted, None
 
 
 class Aperture(OpticalSurface):
     def __init__(self, diameter: float):
-        surface = CircularPlane(diameter, dtype=torch.float64)
+        surface = CircularPlane(diameter)
         super().__init__(surface, 1.0, ("origin", "origin"))
 
-    def optical_function(self, rays: Tensor, _normals: Tensor) -> Tensor:
-        return rays
+    def optical_function(
+        self, rays: Tensor, _normals: Tensor
+    ) -> tuple[Tensor, Optional[Tensor]]:
+        return rays, None
 
 
 class Gap(nn.Module):
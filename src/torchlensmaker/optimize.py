@@ -5,8 +5,6 @@ import torch.optim as optim
 import math
 from dataclasses import dataclass
 
-import matplotlib.pyplot as plt
-
 import torchlensmaker as tlm
 
 from typing import Any, Callable, Optional
@@ -40,6 +38,7 @@ def optimize(
     num_iter: int,
     regularization: Optional[RegularizationFunction] = None,
     nshow: int = 20,
+    aiming: Optional[tlm.RayAiming] = None,
 ) -> OptimizationRecord:
 
     # Record values for analysis
@@ -55,6 +54,10 @@ def optimize(
     for i in range(num_iter):
         optimizer.zero_grad()
 
+        # Refine ray aiming for the current parameters
+        if aiming is not None:
+            aiming.update(sampling)
+
         # Evaluate the model
         outputs = optics(default_input)
         loss = outputs.loss
@@ -95,6 +98,8 @@ def optimize(
 
 
 def plot_optimization_record(record: OptimizationRecord) -> None:
+    # Imported here so that importing torchlensmaker doesn't load matplotlib
+    import matplotlib.pyplot as plt
 
     optics = record.optics
     parameters = record.parameters
@@ -0,0 +1,206 @@
+import torch
+import torch.nn as nn
+
+import json
+import os
+from os.path import join
+from dataclasses import dataclass
+
+from typing import Any, Optional
+
+from torchlensmaker.tensorframe import TensorFrame
+from torchlensmaker.full_forward import ModuleEvalContext
+
+
+Tensor = torch.Tensor
+
+# File layout of a saved TensorFrame folder:
+#   manifest.json: columns names, number of rows and dtype
+#   data.bin: raw column major data, one contiguous block per column
+#
+# Because storage is column major, loading memory maps the file and only the
+# pages of the columns that are actually used are read from disk.
+
+
+def dtype_to_str(dtype: torch.dtype) -> str:
+    return str(dtype).removeprefix("torch.")
+
+
+def str_to_dtype(name: str) -> torch.dtype:
+    dtype = getattr(torch, name, None)
+    if not isinstance(dtype, torch.dtype):
+        raise ValueError(f"Unknown dtype in manifest: {name}")
+    return dtype
+
+
+def save_tensor(tensor: Tensor, path: str) -> None:
+    "Write the raw data of a tensor to a file"
+
+    tensor = tensor.detach().cpu().contiguous()
+
+    # from_file() extends the file as needed but never truncates it
+    if os.path.exists(path):
+        os.remove(path)
+
+    if tensor.numel() > 0:
+        mapped = torch.from_file(
+            path, shared=True, size=tensor.numel(), dtype=tensor.dtype
+        )
+        mapped.copy_(tensor.reshape(-1))
+    else:
+        open(path, "wb").close()
+
+
+def load_tensor(path: str, shape: tuple[int, ...], dtype: torch.dtype) -> Tensor:
+    "Memory map a file written by save_tensor(), without reading it"
+
+    size = 1
+    for s in shape:
+        size *= s
+
+    if size == 0:
+        return torch.empty(shape, dtype=dtype)
+
+    # shared=False maps the file copy-on-write: the tensor can be modified
+    # in memory without affecting the file
+    return torch.from_file(path, shared=False, size=size, dtype=dtype).view(shape)
+
+
+def save_tensorframe(tf: TensorFrame, path: str) -> None:
+    "Save a TensorFrame to a folder"
+
+    os.makedirs(path, exist_ok=True)
+
+    buffer = tf.data.T
+    save_tensor(buffer, join(path, "data.bin"))
+
+    manifest = {
+        "columns": tf.columns,
+        "size": tf.shape[0],
+        "dtype": dtype_to_str(buffer.dtype),
+    }
+
+    with open(join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+def load_tensorframe(path: str) -> TensorFrame:
+    "Load a TensorFrame saved with save_tensorframe(), as a memory map"
+
+    with open(join(path, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    columns = manifest["columns"]
+    buffer = load_tensor(
+        join(path, "data.bin"),
+        (len(columns), manifest["size"]),
+        str_to_dtype(manifest["dtype"]),
+    )
+
+    return TensorFrame.from_buffer(buffer, columns)
+
+
+@dataclass
+class TraceStep:
+    "One module evaluation in a saved trace"
+
+    # Module name relative to the traced model ("" for the model itself)
+    name: str
+
+    # Module type name
+    module_type: str
+
+    # Output rays, with columns PX, PY, (PZ), VX, VY, (VZ) and the object
+    # coordinates OY, (OZ), see OpticalData.coord_object
+    rays: TensorFrame
+
+    # None or bool tensor of shape (N,), see OpticalData.blocked
+    blocked: Optional[Tensor]
+
+    # Output loss accumulator value
+    loss: float
+
+
+def rays_columns(dim: int) -> list[str]:
+    axes = ["X", "Y", "Z"][:dim]
+    return (
+        [f"P{a}" for a in axes] + [f"V{a}" for a in axes] + [f"O{a}" for a in axes[1:]]
+    )
+
+
+def save_trace(
+    model: nn.Module, execute_list: list[ModuleEvalContext], path: str
+) -> None:
+    """
+    Save the output rays of every step of a full_forward() evaluation
+
+    Args:
+        model: the module that was evaluated, used to name steps
+        execute_list: evaluation list returned by full_forward()
+        path: output folder
+    """
+
+    names = {id(m): n for n, m in model.named_modules()}
+    os.makedirs(path, exist_ok=True)
+
+    steps: list[dict[str, Any]] = []
+    for i, context in enumerate(execute_list):
+        outputs = context.outputs
+        dim = outputs.P.shape[1]
+
+        step_path = f"step{i}"
+        save_tensorframe(
+            TensorFrame(
+                torch.cat((outputs.P, outputs.V, outputs.coord_object), dim=1),
+                rays_columns(dim),
+            ),
+            join(path, step_path),
+        )
+
+        if outputs.blocked is not None:
+            save_tensor(outputs.blocked, join(path, step_path, "blocked.bin"))
+
+        steps.append(
+            {
+                "name": names.get(id(context.module), ""),
+                "module_type": type(context.module).__name__,
+                "path": step_path,
+                "blocked": (
+                    None if outputs.blocked is None else outputs.blocked.shape[0]
+                ),
+                "loss": outputs.loss.detach().item(),
+            }
+        )
+
+    with open(join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"steps": steps}, f, indent=1)
+
+
+def load_trace(path: str) -> list[TraceStep]:
+    "Load a trace saved with save_trace(), as memory maps"
+
+    with open(join(path, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    steps = []
+    for step in manifest["steps"]:
+        step_path = join(path, step["path"])
+        blocked = (
+            None
+            if step["blocked"] is None
+            else load_tensor(
+                join(step_path, "blocked.bin"), (step["blocked"],), torch.bool
+            )
+        )
+
+        steps.append(
+            TraceStep(
+                name=step["name"],
+                module_type=step["module_type"],
+                rays=load_tensorframe(step_path),
+                blocked=blocked,
+                loss=step["loss"],
+            )
+        )
+
+    return steps
@@ -1,5 +1,4 @@
 import torch
-from torch.nn.functional import normalize
 
 from typing import Literal
 
@@ -7,6 +6,50 @@ Tensor = torch.Tensor
 RefractionCriticalAngleMode = Literal["drop", "nan", "clamp", "reflect"]
 
 
+def dot(a: Tensor, b: Tensor) -> Tensor:
+    return torch.sum(a * b, dim=1, keepdim=True)
+
+
+def refraction_kernel(
+    rays: Tensor, normals: Tensor, eta: Tensor, mode: str
+) -> tuple[Tensor, Tensor]:
+    """
+    Snell's law for one critical angle mode other than 'drop', see refraction()
+
+    Gradients are left to autograd: a custom backward pass was measured no
+    faster than autograd on these few elementwise operations.
+
+    In 'reflect' mode, rays beyond the critical angle are reflected with a
+    torch.where() instead of reflecting the full batch and indexing, so their
+    gradient is also defined.
+
+    Args:
+        eta: ratio of indices n1 / n2, tensor of shape (1, 1) or (N, 1)
+
+    Returns:
+        refracted: unit vectors of the refracted rays, shape (N, 2/3)
+        radicand: radicand of Snell's law, negative beyond the critical angle,
+            shape (N, 1), detached
+    """
+
+    # Cosine of the incident angle, and R_perp = eta * u
+    c = -dot(rays, normals)
+    u = rays + c * normals
+
+    radicand = 1 - eta * eta * dot(u, u)
+    if mode == "nan":
+        s = torch.sqrt(radicand)
+    else:
+        s = torch.sqrt(torch.clamp(radicand, min=0.0))
+
+    R = eta * u - s * normals
+
+    if mode == "reflect":
+        R = torch.where(radicand < 0.0, rays + 2 * c * normals, R)
+
+    return R / torch.linalg.vector_norm(R, dim=1, keepdim=True), radicand.detach()
+
+
 def reflection(rays: Tensor, normals: Tensor) -> Tensor:
     """
     Vector based reflection.
@@ -19,9 +62,8 @@ def reflection(rays: Tensor, normals: Tensor) -> Tensor:
         vectors of the reflected vector with shape (B, 2)
     """
 
-    dot_product = torch.sum(rays * normals, dim=1, keepdim=True)
-    R = rays - 2 * dot_product * normals
-    return torch.div(R, torch.norm(R, dim=1, keepdim=True))
+    R = rays - 2 * dot(rays, normals) * normals
+    return R / torch.linalg.vector_norm(R, dim=1, keepdim=True)
 
 
 def refraction(
@@ -67,54 +109,92 @@ def refraction(
     assert normals.dim() == 2 and normals.shape[1] in {2, 3}
     assert rays.shape[0] == normals.shape[0]
 
-    # Compute dot product for the batch, aka cosine of the incident angle
-    cos_theta_i = torch.sum(rays * -normals, dim=1, keepdim=True)
+    if critical_angle not in ("nan", "clamp", "drop", "reflect"):
+        raise ValueError(
+            "critical_angle must be one of 'nan', 'clamp', 'drop', 'reflect'. "
+            f"Got {repr(critical_angle)}."
+        )
 
-    # Convert n1 and n2 into tensors
-    N = rays.shape[0]
-    n1 = torch.as_tensor(n1).expand((N,))
-    n2 = torch.as_tensor(n2).expand((N,))
+    # Ratio of indices, of shape (1, 1) or (N, 1), broadcasted by the kernel
+    eta = (
+        torch.as_tensor(n1, dtype=rays.dtype) / torch.as_tensor(n2, dtype=rays.dtype)
+    ).reshape(-1, 1)
 
-    # Compute R_perp
-    eta = n1 / n2
-    R_perp = eta.unsqueeze(1) * (rays + cos_theta_i * normals)
+    if critical_angle == "drop":
+        R, alive = refraction_alive(rays, normals, n1, n2)
+        return R[alive]
 
-    # Compute R_para, depending on critical angle option
-    if critical_angle == "nan":
-        R_para = (
-            -torch.sqrt(1 - torch.sum(R_perp * R_perp, dim=1, keepdim=True)) * normals
-        )
+    R, _ = refraction_kernel(rays, normals, eta, critical_angle)
+    return R
 
-        return normalize(R_perp + R_para)
 
-    elif critical_angle == "clamp":
-        radicand = torch.clamp(
-            1 - torch.sum(R_perp * R_perp, dim=1, keepdim=True), min=0.0, max=None
-        )
-        R_para = -torch.sqrt(radicand) * normals
+def refraction_alive(
+    rays: Tensor,
+    normals: Tensor,
+    n1: float | Tensor,
+    n2: float | Tensor,
+) -> tuple[Tensor, Tensor]:
+    """
+    Refraction with rays beyond the critical angle flagged instead of dropped
 
-        return normalize(R_perp + R_para)
+    This is the 'drop' critical angle mode of refraction(), but the returned
+    tensor keeps the shape of the inputs, so that the caller can fold the
+    mask into its own bookkeeping without an additional data dependent shape.
 
-    elif critical_angle == "drop":
-        radicand = 1 - torch.sum(R_perp * R_perp, dim=1, keepdim=True)
-        valid = (radicand >= 0.0).squeeze(1)
-        R_para = -torch.sqrt(radicand[valid, :]) * normals[valid, :]
-        R_perp = R_perp[valid, :]
+    Args:
+        rays: unit vectors of the incident rays, shape (N, 2/3)
+        normals: unit vectors normal to the surface, shape (N, 2/3)
+        n1: index of refraction of the incident medium, float or tensor of shape (N)
+        n2: index of refraction of the refracted medium float or tensor of shape (N)
 
-        return normalize(R_perp + R_para)
+    Returns:
+        refracted: unit vectors of the refracted rays, shape (N, 2/3). Rays
+            beyond the critical angle are clamped (see refraction()).
+        alive: bool tensor of shape (N,), False for rays beyond the critical
+            angle
+    """
 
-    elif critical_angle == "reflect":
-        radicand = 1 - torch.sum(R_perp * R_perp, dim=1, keepdim=True)
-        valid = (radicand >= 0.0).squeeze(1)
-        R_para = (
-            -torch.sqrt(1 - torch.sum(R_perp * R_perp, dim=1, keepdim=True)) * normals
-        )
-        R = R_perp + R_para
+    eta = (
+        torch.as_tensor(n1, dtype=rays.dtype) / torch.as_tensor(n2, dtype=rays.dtype)
+    ).reshape(-1, 1)
 
-        R[~valid] = reflection(rays, normals)[~valid]
-        return normalize(R)
+    R, radicand = refraction_kernel(rays, normals, eta, "clamp")
+    return R, (radicand >= 0.0).squeeze(1)
 
-    else:
-        raise ValueError(
-            f"critical_angle must be one of 'nan', 'clamp', 'drop', 'reflect'. Got {repr(critical_angle)}."
-        )
+
+def fresnel_reflectance(
+    rays: Tensor,
+    normals: Tensor,
+    n1: float | Tensor,
+    n2: float | Tensor,
+) -> Tensor:
+    """
+    Fresnel reflectance of unpolarized light at an interface
+
+    Average of the s and p polarized reflectances. Beyond the critical angle,
+    the reflectance is one (total internal reflection). The transmittance is
+    one minus the reflectance.
+
+    Args:
+        rays: unit vectors of the incident rays, shape (N, 2/3)
+        normals: unit vectors normal to the surface, facing against the rays,
+            shape (N, 2/3)
+        n1: index of refraction of the incident medium, float or tensor of shape (N)
+        n2: index of refraction of the refracted medium float or tensor of shape (N)
+
+    Returns:
+        reflectance in [0, 1], tensor of shape (N,)
+    """
+
+    n1 = torch.as_tensor(n1, dtype=rays.dtype)
+    n2 = torch.as_tensor(n2, dtype=rays.dtype)
+
+    # Cosines of the incident and refracted angles
+    cos_i = torch.clamp(-dot(rays, normals).squeeze(1), min=0.0, max=1.0)
+    sin2_t = (n1 / n2) ** 2 * (1 - cos_i**2)
+    tir = sin2_t >= 1.0
+    cos_t = torch.sqrt(torch.where(tir, 0.5, 1 - sin2_t))
+
+    rs = (n1 * cos_i - n2 * cos_t) / (n1 * cos_i + n2 * cos_t)
+    rp = (n1 * cos_t - n2 * cos_i) / (n1 * cos_t + n2 * cos_i)
+    return torch.where(tir, 1.0, (rs**2 + rp**2) / 2)
@@ -0,0 +1,328 @@
+import torch
+import torch.nn as nn
+
+import json
+import time
+import dataclasses
+from dataclasses import dataclass, field
+
+from typing import Any, Callable, Optional
+
+
+Tensor = torch.Tensor
+
+
+@dataclass
+class ProfileEvent:
+    "Profiling record of one forward evaluation of a module"
+
+    name: str
+    module_type: str
+
+    # Forward wall time, perf_counter_ns() timestamps
+    start: int
+    end: int = 0
+
+    # Backward wall time, None if no gradient flowed through the module
+    # Backward starts when the first gradient of an output is computed, and
+    # ends when the last gradient of an input or parameter is computed
+    backward_start: Optional[int] = None
+    backward_end: Optional[int] = None
+
+    # Number of rays in inputs and outputs
+    rays_in: int = 0
+    rays_out: int = 0
+
+    # Peak allocated tensor memory during forward, in bytes
+    # Only available for CUDA tensors, None otherwise
+    peak_memory: Optional[int] = None
+
+    # Counters reported by library code during forward (see count())
+    counters: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def forward_time(self) -> float:
+        "Forward wall time in seconds"
+        return (self.end - self.start) / 1e9
+
+    @property
+    def backward_time(self) -> Optional[float]:
+        "Backward wall time in seconds"
+        if self.backward_start is None or self.backward_end is None:
+            return None
+        return (self.backward_end - self.backward_start) / 1e9
+
+
+# Profiler receiving counters, None when profiling is disabled
+_active_profiler: Optional["StackProfiler"] = None
+
+
+def count(name: str, value: int | Tensor) -> None:
+    """
+    Add to a counter of the modules currently being evaluated
+
+    This is a no-op unless a StackProfiler is active, so it can be called
+    from hot paths. Tensor values are converted with item(), which syncs.
+    """
+
+    if _active_profiler is not None:
+        _active_profiler.count(name, int(value))
+
+
+class BackwardTimer(torch.autograd.Function):
+    "Identity function that calls a callback when its gradient is computed"
+
+    @staticmethod
+    def forward(ctx: Any, tensor: Tensor, callback: Callable[[], None]) -> Tensor:
+        ctx.callback = callback
+        return tensor.view_as(tensor)
+
+    @staticmethod
+    def backward(ctx: Any, grad: Tensor) -> tuple[Tensor, None]:
+        ctx.callback()
+        return grad, None
+
+
+def time_backward(data: Any, callback: Callable[[], None]) -> Any:
+    "Wrap differentiable tensor fields of a dataclass with BackwardTimer"
+
+    if not dataclasses.is_dataclass(data) or isinstance(data, type):
+        return data
+
+    changes = {
+        f.name: BackwardTimer.apply(getattr(data, f.name), callback)
+        for f in dataclasses.fields(data)
+        if isinstance(getattr(data, f.name), Tensor)
+        and getattr(data, f.name).requires_grad
+    }
+
+    return dataclasses.replace(data, **changes) if changes else data
+
+
+def num_rays(data: Any) -> int:
+    P = getattr(data, "P", None)
+    return P.shape[0] if isinstance(P, Tensor) else 0
+
+
+class StackProfiler:
+    """
+    Per module profiling of an optical stack
+
+    Use as a context manager around forward and backward evaluation:
+
+        > with tlm.profile(optics) as prof:
+        >     outputs = optics(inputs)
+        >     outputs.loss.backward()
+        > print(prof.table())
+        > prof.export_chrome_trace("trace.json")
+
+    Hooks are only registered while the context is active, so there is no
+    overhead outside of it. Module forward calls are also labeled with
+    torch.profiler.record_function(), so they show up in torch.profiler traces.
+    """
+
+    def __init__(self, model: nn.Module):
+        self.model = model
+        self.names = {id(m): n for n, m in model.named_modules()}
+        self.events: list[ProfileEvent] = []
+        self.cuda = torch.cuda.is_available()
+
+        # Events and record_function contexts of modules being evaluated
+        self._stack: list[tuple[ProfileEvent, Any]] = []
+        self._hooks: list[Any] = []
+
+        # Events of the modules using each parameter
+        self._param_events: dict[int, list[ProfileEvent]] = {}
+
+    def __enter__(self) -> "StackProfiler":
+        global _active_profiler
+        if _active_profiler is not None:
+            raise RuntimeError("Nested profiling is not supported")
+
+        for mod in self.model.modules():
+            self._hooks.append(mod.register_forward_pre_hook(self._pre_hook))
+            self._hooks.append(mod.register_forward_hook(self._post_hook))
+
+        for param in self.model.parameters():
+            if param.requires_grad:
+                self._hooks.append(
+                    param.register_post_accumulate_grad_hook(self._param_hook)
+                )
+
+        _active_profiler = self
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        global _active_profiler
+        _active_profiler = None
+
+        for h in self._hooks:
+            h.remove()
+        self._hooks = []
+
+    def count(self, name: str, value: int) -> None:
+        # Counters are inclusive: they add to all modules being evaluated
+        for event, _ in self._stack:
+            event.counters[name] = event.counters.get(name, 0) + value
+
+    def _update_peak_memory(self) -> None:
+        # Fold the current peak into all open events before resetting it,
+        # so that parent modules include the peak of their children
+        if self.cuda:
+            peak = torch.cuda.max_memory_allocated()
+            for event, _ in self._stack:
+                event.peak_memory = max(event.peak_memory or 0, peak)
+            torch.cuda.reset_peak_memory_stats()
+
+    def _param_hook(self, param: Tensor) -> None:
+        t = time.perf_counter_ns()
+        for event in self._param_events.get(id(param), []):
+            event.backward_end = max(event.backward_end or t, t)
+
+    def _pre_hook(self, module: nn.Module, args: tuple[Any, ...]) -> Any:
+        name = self.names.get(id(module), "")
+        event = ProfileEvent(name, type(module).__name__, 0)
+        event.rays_in = num_rays(args[0]) if len(args) > 0 else 0
+
+        self._update_peak_memory()
+
+        record = torch.profiler.record_function(f"{name}:{event.module_type}")
+        record.__enter__()
+        self._stack.append((event, record))
+        self.events.append(event)
+
+        def backward_end() -> None:
+            t = time.perf_counter_ns()
+            event.backward_end = max(event.backward_end or t, t)
+
+        event.start = time.perf_counter_ns()
+
+        if len(args) > 0:
+            return (time_backward(args[0], backward_end),) + args[1:]
+        return None
+
+    def _post_hook(
+        self, module: nn.Module, args: tuple[Any, ...], output: Any
+    ) -> Any:
+        self._update_peak_memory()
+
+        event, record = self._stack.pop()
+        event.end = time.perf_counter_ns()
+        event.rays_out = num_rays(output)
+        record.__exit__(None, None, None)
+
+        for param in module.parameters():
+            self._param_events.setdefault(id(param), []).append(event)
+
+        def backward_start() -> None:
+            t = time.perf_counter_ns()
+            event.backward_start = min(event.backward_start or t, t)
+
+        return time_backward(output, backward_start)
+
+    def summary(self) -> list[dict[str, Any]]:
+        "Events aggregated by module, in order of first evaluation"
+
+        rows: dict[str, dict[str, Any]] = {}
+        for event in self.events:
+            row = rows.setdefault(
+                event.name,
+                {
+                    "name": event.name,
+                    "type": event.module_type,
+                    "calls": 0,
+                    "forward": 0.0,
+                    "backward": 0.0,
+                    "rays_in": 0,
+                    "rays_out": 0,
+                    "peak_memory": None,
+                    "counters": {},
+                },
+            )
+            row["calls"] += 1
+            row["forward"] += event.forward_time
+            row["backward"] += event.backward_time or 0.0
+            row["rays_in"] += event.rays_in
+            row["rays_out"] += event.rays_out
+            if event.peak_memory is not None:
+                row["peak_memory"] = max(row["peak_memory"] or 0, event.peak_memory)
+            for k, v in event.counters.items():
+                row["counters"][k] = row["counters"].get(k, 0) + v
+
+        return list(rows.values())
+
+    def table(self) -> str:
+        "Summary table, times are inclusive of child modules"
+
+        header = (
+            f"{'name':<20} {'type':<20} {'calls':>5} {'forward (ms)':>12} "
+            f"{'backward (ms)':>13} {'rays in':>9} {'rays out':>9} "
+            f"{'peak mem (MB)':>13}  counters"
+        )
+        lines = [header, "-" * len(header)]
+
+        for row in self.summary():
+            peak = (
+                f"{row['peak_memory'] / 2**20:.1f}"
+                if row["peak_memory"] is not None
+                else "-"
+            )
+            counters = ", ".join(f"{k}={v}" for k, v in row["counters"].items())
+            name = row["name"] or "<root>"
+            lines.append(
+                f"{name:<20} {row['type']:<20} {row['calls']:>5} "
+                f"{1e3 * row['forward']:>12.3f} {1e3 * row['backward']:>13.3f} "
+                f"{row['rays_in']:>9} {row['rays_out']:>9} {peak:>13}  {counters}"
+            )
+
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict[str, Any]:
+        "Events in the Chrome trace event format (chrome://tracing, Perfetto)"
+
+        events = []
+        for event in self.events:
+            label = f"{event.name or '<root>'}:{event.module_type}"
+            args = {
+                "rays_in": event.rays_in,
+                "rays_out": event.rays_out,
+                "peak_memory": event.peak_memory,
+                **event.counters,
+            }
+            events.append(
+                {
+                    "name": label,
+                    "cat": "forward",
+                    "ph": "X",
+                    "ts": event.start / 1e3,
+                    "dur": (event.end - event.start) / 1e3,
+                    "pid": 0,
+                    "tid": 0,
+                    "args": args,
+                }
+            )
+            if event.backward_start is not None and event.backward_end is not None:
+                events.append(
+                    {
+                        "name": label,
+                        "cat": "backward",
+                        "ph": "X",
+                        "ts": event.backward_start / 1e3,
+                        "dur": (event.backward_end - event.backward_start) / 1e3,
+                        "pid": 0,
+                        "tid": 1,
+                        "args": args,
+                    }
+                )
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def profile(model: nn.Module) -> StackProfiler:
+    "Profiling context for an optical stack, see StackProfiler"
+
+    return StackProfiler(model)
@@ -0,0 +1,211 @@
+import torch
+import torch.nn as nn
+from dataclasses import replace
+
+from typing import Any
+
+from torchlensmaker.transforms import forward_kinematic
+from torchlensmaker.full_forward import full_forward
+from torchlensmaker.optics import (
+    LightSourceBase,
+    Aperture,
+    OpticalData,
+    default_input,
+)
+
+
+Tensor = torch.Tensor
+
+
+class RayAiming:
+    """
+    Ray aiming: launch rays only into the entrance pupil footprint of each field
+
+    The pupil samples of the light source are remapped, per field point, by an
+    affine map so that the chief ray hits the center of the stop (the first
+    Aperture after the source) and the pupil edge maps to the stop edge:
+
+        > aiming = tlm.RayAiming(optics)
+        > aiming.update(sampling)
+        > outputs = optics(tlm.default_input(sampling))
+
+    The affine maps are solved iteratively with secant Newton steps, tracing a
+    few probe rays per field from the source to the stop. Solutions are kept
+    per sampling configuration and used as the starting point of the next
+    update(), so that during optimization the aiming is refined rather than
+    recomputed from scratch. Pass the RayAiming object to tlm.optimize() to
+    update it at every step.
+
+    The map is a first order model of the footprint, the fill factor keeps
+    aimed rays inside the stop where the system is not exactly linear. Pupil
+    samples outside of the unit disk (the corners of the 3D grid strategy) are
+    scaled into it, so that the whole sample set fits the stop.
+    """
+
+    def __init__(self, optics: nn.Sequential, fill: float = 0.95, iterations: int = 3):
+        """
+        Args:
+            optics: the optical stack, the light source and stop must be
+                direct children of it
+            fill: fraction of the stop radius that aimed rays fill
+            iterations: number of secant iterations per update (doubled for
+                the first update)
+        """
+
+        children = list(optics.children())
+
+        sources = [
+            i for i, m in enumerate(children) if isinstance(m, LightSourceBase)
+        ]
+        if len(sources) == 0:
+            raise ValueError("Ray aiming requires a light source in the stack")
+        self.source_index = sources[0]
+
+        stops = [
+            i
+            for i, m in enumerate(children)
+            if isinstance(m, Aperture) and i > self.source_index
+        ]
+        if len(stops) == 0:
+            raise ValueError("Ray aiming requires an Aperture after the light source")
+        self.stop_index = stops[0]
+
+        self.children = children
+        self.source: LightSourceBase = children[self.source_index]
+        self.stop: Aperture = children[self.stop_index]
+        self.fill = fill
+        self.iterations = iterations
+
+        # Latest solution per sampling key, see LightSourceBase.pupil_maps
+        self.solutions: dict[tuple[Any, ...], tuple[Tensor, Tensor]] = {}
+
+    def stop_coordinates(
+        self, inputs: OpticalData, field: Tensor, pupil: Tensor
+    ) -> Tensor:
+        """
+        Normalized stop coordinates of probe rays
+
+        Args:
+            inputs: optical data at the input of the light source
+            field: normalized field samples, tensor of shape (F, dim-1)
+            pupil: normalized pupil samples, tensor of shape (F, K, dim-1)
+
+        Returns:
+            tensor of shape (F, K, dim-1), in units of the aimed radius, nan for
+            rays blocked before reaching the stop
+        """
+
+        dim, dtype = inputs.sampling["dim"], inputs.sampling["dtype"]
+        F, K = pupil.shape[0], pupil.shape[1]
+
+        origins, vectors = self.source.field_rays(field, pupil)
+        transform = forward_kinematic(inputs.transforms)
+
+        data = replace(
+            inputs,
+            P=transform.direct_points(origins),
+            V=transform.direct_vectors(vectors),
+            coord_object=torch.repeat_interleave(field, K, dim=0),
+        )
+
+        # Index of the probe rays that are still traced, updated with the
+        # blocked mask of elements that remove rays. The blocked mask of a
+        # composite element (e.g. a lens) only describes its last child, so
+        # masks are read from the leaf elements, in execution order.
+        index = torch.arange(F * K)
+
+        for module in self.children[self.source_index + 1 : self.stop_index]:
+            execute_list, data = full_forward(module, data)
+            for context in execute_list:
+                if next(context.module.children(), None) is not None:
+                    continue
+                if context.outputs.P.shape[0] != context.inputs.P.shape[0]:
+                    blocked = context.outputs.blocked
+                    assert blocked is not None
+                    assert blocked.shape == index.shape, (blocked.shape, index.shape)
+                    index = index[~blocked]
+
+        assert index.shape[0] == data.P.shape[0]
+
+        # Intersect with the stop plane, without clipping by its outline
+        stop_transform = forward_kinematic(
+            data.transforms + self.stop.surface_transform(dim, dtype)
+        )
+        P = stop_transform.inverse_points(data.P)
+        V = stop_transform.inverse_vectors(data.V)
+        t = -P[:, 0] / V[:, 0]
+        points = P[:, 1:] + t.unsqueeze(1) * V[:, 1:]
+
+        radius = self.fill * self.stop.surface.outline.max_radius()
+
+        coordinates = torch.full((F * K, dim - 1), torch.nan, dtype=dtype)
+        coordinates[index] = points / radius
+        return coordinates.reshape(F, K, dim - 1)
+
+    def update(self, sampling: dict[str, Any]) -> None:
+        "Refine the aiming solution for this sampling and install it in the source"
+
+        dim, dtype = sampling["dim"], sampling["dtype"]
+        key = self.source.sampling_key(sampling)
+        field, pupil = self.source.samples(*key)
+        F, d = field.shape
+
+        # Largest distance of pupil samples to the center, beyond the unit
+        # probe offsets
+        norms = torch.linalg.vector_norm(pupil, dim=1)
+        reach = max(1.0, norms.max().item()) if norms.numel() > 0 else 1.0
+
+        # Warm start from the previous solution, a cold start from the full
+        # beam needs more iterations
+        if key in self.solutions:
+            center, matrix = self.solutions[key]
+            iterations = self.iterations
+        else:
+            center = torch.zeros((F, d), dtype=dtype)
+            matrix = torch.eye(d, dtype=dtype).expand(F, d, d).clone()
+            iterations = 2 * self.iterations
+
+        # Probe offsets: chief ray and pupil edges along each axis
+        eye = torch.eye(d, dtype=dtype)
+        offsets = torch.cat((torch.zeros((1, d), dtype=dtype), eye, -eye), dim=0)
+
+        with torch.no_grad():
+            inputs = default_input(sampling)
+            for module in self.children[: self.source_index]:
+                inputs = module(inputs)
+
+            for _ in range(iterations):
+                probes = center.unsqueeze(1) + offsets @ matrix.transpose(1, 2)
+                S = self.stop_coordinates(inputs, field, probes)
+
+                # Secant Jacobian of stop coordinates with respect to the
+                # current aimed coordinates, over the full pupil
+                S0 = S[:, 0, :]
+                J = (S[:, 1 : d + 1, :] - S[:, d + 1 :, :]).transpose(1, 2) / 2
+
+                # Fields with blocked probes or a singular Jacobian shrink
+                # their footprint instead, to get probes through the system
+                det = torch.linalg.det(J)
+                ok = torch.isfinite(S).all(dim=2).all(dim=1)
+                ok = ok & (torch.abs(det) > 1e-12)
+                safe_J = torch.where(ok[:, None, None], J, eye)
+                J_inv = torch.linalg.inv(safe_J)
+
+                # Newton step: move the chief ray to the stop center and scale
+                # the pupil edges to the stop edge
+                step = -(J_inv @ torch.nan_to_num(S0).unsqueeze(2)).squeeze(2)
+                new_center = center + (matrix @ step.unsqueeze(2)).squeeze(2)
+                new_matrix = matrix @ J_inv
+
+                center = torch.where(ok[:, None], new_center, center)
+                matrix = torch.where(ok[:, None, None], new_matrix, matrix / 2)
+
+        self.solutions[key] = (center, matrix)
+        self.source.pupil_maps[key] = (center, matrix / reach)
+
+    def clear(self) -> None:
+        "Remove aiming from the source, rays are launched at the full beam"
+
+        for key in self.solutions:
+            self.source.pupil_maps.pop(key, None)
+        self.solutions = {}
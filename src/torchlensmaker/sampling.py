@@ -0,0 +1,163 @@
+import torch
+import math
+
+from typing import Literal, get_args
+
+Tensor = torch.Tensor
+
+SamplingStrategy = Literal["grid", "random", "sobol", "halton", "hexagonal", "polar"]
+
+
+def check_strategy(strategy: str) -> None:
+    if strategy not in get_args(SamplingStrategy):
+        raise ValueError(
+            f"sampling strategy must be one of {get_args(SamplingStrategy)}. "
+            f"Got {repr(strategy)}."
+        )
+
+
+def radical_inverse(indices: Tensor, base: int, dtype: torch.dtype) -> Tensor:
+    "Van der Corput radical inverse of integer indices in the given base"
+
+    num_digits = 1 + int(math.log(max(int(indices.max().item()), 1), base)) + 1
+
+    result = torch.zeros(indices.shape, dtype=dtype)
+    i = indices.clone()
+    f = 1.0 / base
+    for _ in range(num_digits):
+        result = result + f * torch.remainder(i, base).to(dtype)
+        i = torch.div(i, base, rounding_mode="floor")
+        f = f / base
+
+    return result
+
+
+def unit_square(strategy: str, N: int, dim: int, dtype: torch.dtype) -> Tensor:
+    "N samples in [0, 1]^dim using random or low discrepancy sequences"
+
+    if strategy == "random":
+        return torch.rand((N, dim), dtype=dtype)
+    elif strategy == "sobol":
+        engine = torch.quasirandom.SobolEngine(dimension=dim, scramble=False)
+        return engine.draw(N, dtype=dtype)
+    elif strategy == "halton":
+        indices = torch.arange(1, N + 1)
+        return torch.stack(
+            [radical_inverse(indices, base, dtype) for base in [2, 3][:dim]], dim=1
+        )
+    else:
+        raise ValueError(f"{strategy} is not a unit square sampling strategy")
+
+
+def concentric_disk(uv: Tensor) -> Tensor:
+    """
+    Area preserving map from the unit square to the unit disk (Shirley-Chiu)
+    Preserves the low discrepancy of the input points.
+    """
+
+    a, b = 2 * uv[:, 0] - 1, 2 * uv[:, 1] - 1
+
+    # avoid division by zero, the values are discarded by torch.where()
+    safe_a = torch.where(a == 0, 1.0, a)
+    safe_b = torch.where(b == 0, 1.0, b)
+
+    first = torch.abs(a) > torch.abs(b)
+    r = torch.where(first, a, b)
+    phi = torch.where(
+        first,
+        (math.pi / 4) * (b / safe_a),
+        math.pi / 2 - (math.pi / 4) * (a / safe_b),
+    )
+
+    return torch.stack((r * torch.cos(phi), r * torch.sin(phi)), dim=1)
+
+
+def sample_line(strategy: str, N: int, dtype: torch.dtype) -> Tensor:
+    """
+    N samples of the [-1, 1] segment
+
+    The hexagonal and polar strategies reduce to the uniform grid in 1D.
+
+    Returns:
+        tensor of shape (N,)
+    """
+
+    check_strategy(strategy)
+
+    if N == 0:
+        return torch.zeros((0,), dtype=dtype)
+    elif strategy in ("grid", "hexagonal", "polar"):
+        return torch.linspace(-1.0, 1.0, N, dtype=dtype)
+    else:
+        return 2 * unit_square(strategy, N, 1, dtype)[:, 0] - 1
+
+
+def sample_disk(strategy: str, base: int, dtype: torch.dtype) -> Tensor:
+    """
+    Samples of the unit disk with a density of about base samples along a
+    diameter.
+
+    The "grid" strategy samples the full [-1, 1]^2 square with base^2 samples
+    (including the corners outside the disk). All other strategies generate
+    samples only inside the disk, about pi/4 * base^2 of them.
+
+    Returns:
+        tensor of shape (M, 2)
+    """
+
+    check_strategy(strategy)
+
+    if base == 0:
+        return torch.zeros((0, 2), dtype=dtype)
+    elif strategy == "grid":
+        R = torch.linspace(-1.0, 1.0, base, dtype=dtype)
+        return torch.cartesian_prod(R, R).reshape(-1, 2)
+
+    N = round(math.pi / 4 * base**2)
+
+    if strategy == "random":
+        # Sample radius with the square root for uniform density
+        uv = torch.rand((N, 2), dtype=dtype)
+        r, theta = torch.sqrt(uv[:, 0]), 2 * math.pi * uv[:, 1]
+        return torch.stack((r * torch.cos(theta), r * torch.sin(theta)), dim=1)
+
+    elif strategy in ("sobol", "halton"):
+        return concentric_disk(unit_square(strategy, N, 2, dtype))
+
+    elif strategy == "hexagonal":
+        # Hexagonal lattice with the grid spacing, every other row shifted
+        spacing = 2.0 / max(base - 1, 1)
+        row_height = spacing * math.sqrt(3) / 2
+        num_rows = int(1 / row_height)
+        num_cols = int(1 / spacing) + 1
+
+        rows = torch.arange(-num_rows, num_rows + 1)
+        cols = torch.arange(-num_cols, num_cols + 1)
+        grid = torch.cartesian_prod(rows, cols).reshape(-1, 2)
+
+        X = spacing * (grid[:, 1].to(dtype) + 0.5 * torch.remainder(grid[:, 0], 2))
+        Y = row_height * grid[:, 0].to(dtype)
+        points = torch.stack((X, Y), dim=1)
+
+        return points[torch.hypot(X, Y) <= 1.0 + 1e-9]
+
+    else:  # polar
+        # Concentric rings of equal width, with a number of samples
+        # proportional to their circumference
+        num_rings = max(base // 2, 1)
+        ring_index = torch.arange(num_rings, dtype=dtype)
+        radii = (ring_index + 0.5) / num_rings
+        counts = torch.clamp(torch.round(2 * math.pi * (ring_index + 0.5)), min=1)
+        counts = counts.to(torch.int64)
+
+        r = torch.repeat_interleave(radii, counts)
+
+        # position of each sample within its ring, with a different angular
+        # offset for each ring to avoid radial alignments
+        starts = torch.cumsum(counts, 0) - counts
+        k = torch.arange(r.shape[0]) - torch.repeat_interleave(starts, counts)
+        n = torch.repeat_interleave(counts, counts).to(dtype)
+        offset = torch.repeat_interleave(0.5 * ring_index, counts)
+        theta = 2 * math.pi * (k.to(dtype) + offset) / n
+
+        return torch.stack((r * torch.cos(theta), r * torch.sin(theta)), dim=1)
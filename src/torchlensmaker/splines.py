@@ -0,0 +1,404 @@
+import torch
+import torch.nn as nn
+import math
+
+from torchlensmaker.outline import Outline, CircularOutline
+from torchlensmaker.surfaces import LocalSurface
+
+from typing import Optional, Sequence
+
+Tensor = torch.Tensor
+
+
+def bernstein(degree: int, u: Tensor) -> tuple[Tensor, Tensor]:
+    """
+    Bernstein basis polynomials of the given degree and their derivatives
+
+    Args:
+        u: tensor of shape (N,)
+
+    Returns:
+        basis, derivative: tensors of shape (N, degree+1)
+    """
+
+    v = 1 - u
+    basis = [
+        math.comb(degree, i) * u**i * v ** (degree - i) for i in range(degree + 1)
+    ]
+
+    # d/du B_i^d = d (B_{i-1}^{d-1} - B_i^{d-1})
+    lower = [
+        math.comb(degree - 1, i) * u**i * v ** (degree - 1 - i) for i in range(degree)
+    ]
+    zero = torch.zeros_like(u)
+    lower = [zero] + lower + [zero]
+    derivative = [degree * (lower[i] - lower[i + 1]) for i in range(degree + 1)]
+
+    return torch.stack(basis, dim=1), torch.stack(derivative, dim=1)
+
+
+class RevolvedProfile(LocalSurface):
+    """
+    Surface of revolution of a piecewise polynomial profile curve in the (X, r)
+    half plane, where r >= 0 is the distance to the X axis
+
+    Derived classes define the profile as M segments of Bezier control points,
+    with knots sorted by increasing r. Collision detection is vectorized over
+    rays and does not loop over segments:
+
+        * Segment lookup: torch.searchsorted() of the current estimate of the
+          collision radius in the knots radii, iterated a few times.
+
+        * Per segment root: the closed form intersection of rays with the chord
+          of their segment. Revolved, the chord is a cone and the intersection
+          is a quadratic equation. This is exact for line segments, and the
+          initial value of a few Newton iterations in the segment parameter for
+          curved segments.
+
+    As with ImplicitSurface, the last step is a single differentiable Newton
+    iteration, so that gradients flow to rays and profile parameters.
+    """
+
+    # Maximum radial distance between the collision point and the profile
+    collide_tol: float = 1e-3
+
+    # Number of segment lookup iterations
+    lookup_iterations: int = 3
+
+    # Number of per segment Newton iterations, for non linear segments
+    newton_iterations: int = 3
+
+    # Tolerance on the segment parameter for a collision to be in the segment
+    segment_tol: float = 1e-6
+
+    def __init__(self, outline: Outline, dtype: torch.dtype):
+        super().__init__(outline, dtype)
+
+    def segments(self) -> Tensor:
+        """
+        Bezier control points of the profile segments
+
+        Returns:
+            tensor of shape (M, degree+1, 2), where the last dimension is (X, r)
+        """
+        raise NotImplementedError
+
+    def knots(self) -> Tensor:
+        "Profile points at segment boundaries, tensor of shape (M+1, 2)"
+        segments = self.segments()
+        return torch.cat((segments[:, 0, :], segments[-1:, -1, :]), dim=0)
+
+    def samples2D(self, N: int) -> Tensor:
+        segments = self.segments()
+        M, degree = segments.shape[0], segments.shape[1] - 1
+
+        # Knots are enough for line segments
+        per_segment = 2 if degree == 1 else max(2, math.ceil(N / M) + 1)
+        u = torch.linspace(0.0, 1.0, per_segment, dtype=self.dtype)
+
+        basis, _ = bernstein(degree, u)
+        points = torch.einsum("ud,mdc->muc", basis, segments)
+
+        # Drop duplicate points at knots
+        return torch.cat((points[:, :-1, :].reshape(-1, 2), points[-1:, -1, :]))
+
+    def extent_x(self) -> Tensor:
+        return self.segments()[-1, -1, 0]
+
+    def bounds_x(self) -> Optional[Tensor]:
+        # Bezier curves are within the convex hull of their control points
+        X = self.segments().detach()[:, :, 0]
+        return torch.stack((X.min(), X.max()))
+
+    def segment_index(self, knots_r: Tensor, r: Tensor) -> Tensor:
+        "Index of the segment containing each radius, clamped to the profile"
+        M = knots_r.shape[0] - 1
+        index = torch.searchsorted(knots_r, r.contiguous(), right=True) - 1
+        return torch.clamp(index, 0, M - 1)
+
+    def residual(
+        self, P: Tensor, V: Tensor, point: Tensor, tangent: Tensor
+    ) -> tuple[Tensor, Tensor]:
+        """
+        Residual of the ray - profile point equation and its derivative with
+        respect to the segment parameter
+
+        For a profile point (x, r), the ray reaches X = x at t = (x - Px) / Vx,
+        at a distance to the axis that must equal r. Multiplied by Vx^2:
+
+            H = Vx^2 r^2 - |W + x Vr|^2, with W = Vx Pr - Px Vr
+
+        which is polynomial in the segment parameter.
+        """
+
+        Vx, Pr, Vr = V[:, 0], P[:, 1:], V[:, 1:]
+        W = Vx.unsqueeze(1) * Pr - P[:, :1] * Vr
+        x, r = point[:, 0], point[:, 1]
+        dx, dr = tangent[:, 0], tangent[:, 1]
+
+        A = W + x.unsqueeze(1) * Vr
+        H = Vx**2 * r**2 - torch.sum(A * A, dim=1)
+        dH = 2 * Vx**2 * r * dr - 2 * dx * torch.sum(A * Vr, dim=1)
+        return H, dH
+
+    def chord_root(self, P: Tensor, V: Tensor, ctrl: Tensor) -> Tensor:
+        """
+        Parameter u of the intersection of rays with the revolved chord of
+        their segment, nan if there is none
+
+        With the chord (x0 + u dx, r0 + u dr), the residual H is the quadratic
+        a u^2 + 2b u + c. Of its two roots, keep the closest to the [0, 1]
+        segment, or the first along the ray if both are in it.
+        """
+
+        Vx, Pr, Vr = V[:, 0], P[:, 1:], V[:, 1:]
+        W = Vx.unsqueeze(1) * Pr - P[:, :1] * Vr
+        WV = torch.sum(W * Vr, dim=1)
+        VV = torch.sum(Vr * Vr, dim=1)
+        WW = torch.sum(W * W, dim=1)
+
+        x0, r0 = ctrl[:, 0, 0], ctrl[:, 0, 1]
+        dx, dr = ctrl[:, -1, 0] - x0, ctrl[:, -1, 1] - r0
+
+        a = Vx**2 * dr**2 - dx**2 * VV
+        b = Vx**2 * r0 * dr - dx * (WV + x0 * VV)
+        c = Vx**2 * r0**2 - (WW + 2 * x0 * WV + x0**2 * VV)
+
+        # Numerically stable roots q/a and c/q, inf where a or q is zero
+        disc = b**2 - a * c
+        sign = torch.where(b >= 0, 1.0, -1.0)
+        q = -(b + sign * torch.sqrt(torch.clamp(disc, min=0.0)))
+        inf = torch.full_like(q, math.inf)
+        u1 = torch.where(a != 0, q / torch.where(a != 0, a, 1.0), inf)
+        u2 = torch.where(q != 0, c / torch.where(q != 0, q, 1.0), inf)
+
+        def distance(u: Tensor) -> Tensor:
+            return torch.clamp(-u, min=0.0) + torch.clamp(u - 1, min=0.0)
+
+        # t is increasing with x if Vx > 0
+        first = (u1 - u2) * dx * Vx < 0
+        d1, d2 = distance(u1), distance(u2)
+        u = torch.where((d1 < d2) | ((d1 == d2) & first), u1, u2)
+
+        return torch.where(disc >= 0, u, math.nan)
+
+    def segment_root(self, P: Tensor, V: Tensor, ctrl: Tensor) -> Tensor:
+        "Parameter u of the intersection of rays with their segment"
+
+        u = self.chord_root(P, V, ctrl)
+        degree = ctrl.shape[1] - 1
+
+        if degree > 1:
+            for _ in range(self.newton_iterations):
+                point, tangent = self.evaluate(ctrl, u)
+                H, dH = self.residual(P, V, point, tangent)
+                u = u - H / dH
+
+        return u
+
+    def evaluate(self, ctrl: Tensor, u: Tensor) -> tuple[Tensor, Tensor]:
+        """
+        Points and tangents of segments
+
+        Args:
+            ctrl: control points of each ray's segment, shape (N, degree+1, 2)
+            u: segment parameter, shape (N,)
+
+        Returns:
+            points, tangents: tensors of shape (N, 2)
+        """
+
+        basis, derivative = bernstein(ctrl.shape[1] - 1, u)
+        point = torch.sum(basis.unsqueeze(2) * ctrl, dim=1)
+        tangent = torch.sum(derivative.unsqueeze(2) * ctrl, dim=1)
+        return point, tangent
+
+    def local_collide(
+        self, P: Tensor, V: Tensor, newton_dtype: Optional[torch.dtype] = None
+    ) -> tuple[Tensor, Tensor, Tensor]:
+
+        segments = self.segments().to(P.dtype)
+        knots_r = torch.cat((segments[:, 0, 1], segments[-1:, -1, 1])).detach()
+
+        # Rays parallel to the X=0 plane are not supported
+        Vx = V[:, 0]
+        parallel = Vx == 0
+        safe_V = torch.where(
+            parallel.unsqueeze(1), torch.ones_like(V) / math.sqrt(V.shape[1]), V
+        )
+
+        with torch.no_grad():
+            Pd, Vd, seg = P.detach(), safe_V.detach(), segments.detach()
+
+            # Start from the intersection with the X=0 plane
+            t0 = -Pd[:, 0] / Vd[:, 0]
+            r0 = torch.linalg.vector_norm(
+                Pd[:, 1:] + t0.unsqueeze(1) * Vd[:, 1:], dim=1
+            )
+            index = self.segment_index(knots_r, r0)
+
+            for _ in range(self.lookup_iterations):
+                u = self.segment_root(Pd, Vd, seg[index])
+                point, _ = self.evaluate(seg[index], u)
+                r = torch.abs(point[:, 1])
+                lookup = self.segment_index(knots_r, r)
+                index = torch.where(torch.isfinite(r), lookup, index)
+
+            u = self.segment_root(Pd, Vd, seg[index])
+            found = torch.isfinite(u)
+            u = torch.where(found, u, 0.5)
+
+        # One differentiable Newton iteration
+        ctrl = segments[index]
+        point, tangent = self.evaluate(ctrl, u)
+        H, dH = self.residual(P, safe_V, point, tangent)
+        safe_dH = torch.where(dH != 0, dH, 1.0)
+        u = u - torch.where(dH != 0, H / safe_dH, 0.0)
+
+        point, tangent = self.evaluate(ctrl, u)
+        t = (point[:, 0] - P[:, 0]) / safe_V[:, 0]
+        local_points = P + t.unsqueeze(1) * V
+
+        # Normal of the profile, rotated around the X axis
+        rho = torch.linalg.vector_norm(local_points[:, 1:], dim=1, keepdim=True)
+        radial = local_points[:, 1:] / torch.where(rho > 0, rho, 1.0)
+        normals = torch.nn.functional.normalize(
+            torch.cat(
+                (-tangent[:, 1:2], tangent[:, 0:1] * radial),
+                dim=1,
+            ),
+            dim=1,
+        )
+
+        in_segment = (u >= -self.segment_tol) & (u <= 1 + self.segment_tol)
+        distance = torch.abs(rho.squeeze(1) - torch.abs(point[:, 1]))
+        on_surface = distance < self.collide_tol
+        valid = (
+            found
+            & ~parallel
+            & in_segment
+            & on_surface
+            & self.outline.contains(local_points)
+        )
+
+        return t, normals, valid
+
+
+class PiecewiseLine(RevolvedProfile):
+    """
+    Surface of revolution of a piecewise linear profile
+
+    The first knot is the vertex at (0, 0), and knots are evenly spaced in r up
+    to the edge of the surface. X gives the X coordinate of the other knots.
+    """
+
+    def __init__(
+        self,
+        diameter: float,
+        X: Sequence[float] | Tensor | nn.Parameter,
+        dtype: torch.dtype = torch.float64,
+    ):
+        super().__init__(CircularOutline(diameter), dtype)
+        self.diameter = diameter
+
+        self.X: Tensor
+        if isinstance(X, nn.Parameter):
+            self.X = X
+        else:
+            self.X = torch.as_tensor(X, dtype=dtype)
+
+        assert self.X.dim() == 1 and self.X.shape[0] > 0
+
+    def parameters(self) -> dict[str, nn.Parameter]:
+        if isinstance(self.X, nn.Parameter):
+            return {"X": self.X}
+        else:
+            return {}
+
+    def segments(self) -> Tensor:
+        M = self.X.shape[0]
+        X = torch.cat((torch.zeros(1, dtype=self.dtype), self.X.to(self.dtype)))
+        R = torch.linspace(0.0, self.diameter / 2, M + 1, dtype=self.dtype)
+        knots = torch.stack((X, R), dim=-1)
+        return torch.stack((knots[:-1], knots[1:]), dim=1)
+
+
+class BezierSpline(RevolvedProfile):
+    """
+    Surface of revolution of a C1 continuous cubic Bezier spline profile
+
+        * The first knot is the vertex at (0, 0), and knots are evenly spaced
+          in r up to the edge of the surface
+        * The first control point is on the X=0 line, so the profile is
+          perpendicular to the X axis at the vertex
+        * Control points are mirrored around knots, for C1 continuity
+
+    X gives the X coordinate of knots after the vertex, CX the X coordinate of
+    control points after the first one, and CY the r coordinate of all control
+    points. The profile should stay a function of r within each segment.
+    """
+
+    def __init__(
+        self,
+        diameter: float,
+        X: Sequence[float] | Tensor | nn.Parameter,
+        CX: Sequence[float] | Tensor | nn.Parameter,
+        CY: Sequence[float] | Tensor | nn.Parameter,
+        dtype: torch.dtype = torch.float64,
+    ):
+        super().__init__(CircularOutline(diameter), dtype)
+        self.diameter = diameter
+
+        def init(value: Sequence[float] | Tensor | nn.Parameter) -> Tensor:
+            if isinstance(value, nn.Parameter):
+                return value
+            else:
+                return torch.as_tensor(value, dtype=dtype)
+
+        self.X, self.CX, self.CY = init(X), init(CX), init(CY)
+
+        assert self.X.dim() == 1 and self.X.shape[0] > 0
+        assert self.X.shape[0] == self.CX.shape[0] == self.CY.shape[0] - 1
+
+    @classmethod
+    def from_parabola(
+        cls,
+        diameter: float,
+        a: float,
+        num_segments: int,
+        dtype: torch.dtype = torch.float64,
+    ) -> "BezierSpline":
+        "Spline exactly equal to the parabola X = a r^2"
+
+        h = diameter / 2 / num_segments
+        r = torch.arange(num_segments + 2, dtype=dtype) * h
+
+        # Cubic degree elevation of the quadratic Bezier form of the parabola,
+        # the control point of knot k is at one third of segment k
+        X = a * r[1:-1] ** 2
+        CX = a * (r[:-1] ** 2 + 2 * r[:-1] * r[1:]) / 3
+        CY = r[:-1] + h / 3
+
+        return cls(diameter, X, CX[1:], CY, dtype)
+
+    def parameters(self) -> dict[str, nn.Parameter]:
+        params = {"X": self.X, "CX": self.CX, "CY": self.CY}
+        return {n: p for n, p in params.items() if isinstance(p, nn.Parameter)}
+
+    def segments(self) -> Tensor:
+        M = self.X.shape[0]
+        zero = torch.zeros(1, dtype=self.dtype)
+
+        X = torch.cat((zero, self.X.to(self.dtype)))
+        R = torch.linspace(0.0, self.diameter / 2, M + 1, dtype=self.dtype)
+        CX = torch.cat((zero, self.CX.to(self.dtype)))
+        CY = self.CY.to(self.dtype)
+
+        knots = torch.stack((X, R), dim=-1)
+        controls = torch.stack((CX, CY), dim=-1)
+
+        # Third point of each segment: next control point mirrored around
+        # the next knot
+        mirrored = 2 * knots[1:] - controls[1:]
+
+        return torch.stack((knots[:-1], controls[:-1], mirrored, knots[1:]), dim=1)
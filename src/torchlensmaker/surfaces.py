@@ -7,12 +7,30 @@ from torchlensmaker.outline import (
     CircularOutline,
 )
 
-from typing import Iterable
+from torchlensmaker.zernike import ZernikeBasis, noll_to_nm
+from torchlensmaker.interp1d import cubic_spline_coefficients, interp_cubic_uniform
+from torchlensmaker import profiling
+from torchlensmaker.diagnostics import active_diagnostics
+
+from typing import Iterable, Optional, Sequence
 
 # shorter for type annotations
 Tensor = torch.Tensor
 
 
+def safe_sqrt(radicand: Tensor) -> tuple[Tensor, Tensor]:
+    """
+    Square root for surfaces with a restricted domain, such as spheres
+
+    Returns sqrt(radicand) where radicand > 0, and 0 elsewhere with a zero
+    gradient instead of nan, together with the mask of positive values.
+    """
+
+    inside = radicand > 0
+    root = torch.sqrt(torch.where(inside, radicand, 1.0))
+    return torch.where(inside, root, 0.0), inside
+
+
 class LocalSurface:
     """
     Defines a surface in a local reference frame
@@ -25,11 +43,19 @@ class LocalSurface:
     def parameters(self) -> dict[str, nn.Parameter]:
         raise NotImplementedError
 
-    def local_collide(self, P: Tensor, V: Tensor) -> tuple[Tensor, Tensor, Tensor]:
+    def local_collide(
+        self, P: Tensor, V: Tensor, newton_dtype: Optional[torch.dtype] = None
+    ) -> tuple[Tensor, Tensor, Tensor]:
         """
         Find collision points and surface normals of ray-surface intersection
         for parametric rays P+tV expressed in the surface local frame.
 
+        Args:
+            P: rays origins
+            V: rays vectors
+            newton_dtype: dtype of the bulk of Newton's method iterations, for
+                surfaces that use it (see intersect_newton)
+
         Returns:
             t: Value of parameter t such that P + tV is on the surface
             normals: Normal vectors to the surface at the collision points
@@ -44,10 +70,21 @@ class LocalSurface:
         """
         raise NotImplementedError
 
+    def bounds_x(self) -> Optional[Tensor]:
+        """
+        Range of X coordinates of the surface, tensor [xmin, xmax], used to
+        cull rays before collision detection (see intersect()). Must be
+        conservative. None if unknown, then rays are not culled.
+        """
+        return None
+
     def extent(self, dim: int, dtype: torch.dtype) -> Tensor:
         "N-dimensional extent point"
         return torch.cat(
-            (self.extent_x().unsqueeze(0), torch.zeros(dim - 1, dtype=dtype)),
+            (
+                self.extent_x().to(dtype=dtype).unsqueeze(0),
+                torch.zeros(dim - 1, dtype=dtype),
+            ),
             dim=0,
         )
 
@@ -69,17 +106,19 @@ class Plane(LocalSurface):
         return {}
 
     def samples2D(self, N: int) -> Tensor:
-        r = torch.linspace(0, self.outline.max_radius(), N)
-        return torch.stack((torch.zeros(N), r), dim=-1)
+        r = torch.linspace(0, self.outline.max_radius(), N, dtype=self.dtype)
+        return torch.stack((torch.zeros(N, dtype=self.dtype), r), dim=-1)
 
-    def local_collide(self, P: Tensor, V: Tensor) -> tuple[Tensor, Tensor, Tensor]:
+    def local_collide(
+        self, P: Tensor, V: Tensor, newton_dtype: Optional[torch.dtype] = None
+    ) -> tuple[Tensor, Tensor, Tensor]:
         dim = P.shape[1]
         t = -P[:, 0] / V[:, 0]
         local_points = P + t.unsqueeze(1).expand_as(V) * V
         normal = (
-            torch.tensor([-1.0, 0.0], dtype=self.dtype)
+            torch.tensor([-1.0, 0.0], dtype=P.dtype)
             if dim == 2
-            else torch.tensor([-1.0, 0.0, 0.0], dtype=self.dtype)
+            else torch.tensor([-1.0, 0.0, 0.0], dtype=P.dtype)
         )
         local_normals = torch.tile(normal, (P.shape[0], 1))
         valid = self.outline.contains(local_points)
@@ -88,6 +127,9 @@ class Plane(LocalSurface):
     def extent_x(self) -> Tensor:
         return torch.as_tensor(0.0, dtype=self.dtype)
 
+    def bounds_x(self) -> Optional[Tensor]:
+        return torch.zeros(2, dtype=self.dtype)
+
     def contains(self, points: Tensor, tol: float = 1e-6) -> Tensor:
         return torch.logical_and(
             self.outline.contains(points), torch.abs(points[:, 0]) < tol
@@ -111,6 +153,12 @@ class ImplicitSurface(LocalSurface):
     Surface3D defined in implicit form: F(x,y,z) = 0
     """
 
+    # Maximum |F| at the collision point for a ray to be considered colliding
+    collide_tol: float = 1e-3
+
+    # Number of non differentiable Newton iterations, see intersect_newton()
+    newton_iterations: int = 20
+
     def __init__(self, outline: Outline, dtype: torch.dtype):
         super().__init__(outline, dtype)
 
@@ -123,13 +171,12 @@ class ImplicitSurface(LocalSurface):
             self.outline.contains(points), torch.abs(F(points)) < tol
         )
 
-    def local_collide(self, P: Tensor, V: Tensor) -> tuple[Tensor, Tensor, Tensor]:
+    def local_collide(
+        self, P: Tensor, V: Tensor, newton_dtype: Optional[torch.dtype] = None
+    ) -> tuple[Tensor, Tensor, Tensor]:
 
         dim = P.shape[1]
-        # Initial guess is the intersection of rays with the X=0 plane
-        init_t = -P[:, 0] / V[:, 0]
-
-        t = intersect_newton(self, P, V, init_t)
+        t = self.solve(P, V, newton_dtype)
 
         local_points = P + t.unsqueeze(1).expand_as(V) * V
 
@@ -143,10 +190,53 @@ class ImplicitSurface(LocalSurface):
         # So verify intersection here and filter points
         # that aren't on the surface
         # TODO test Newton method, and support tolerance configuration based on sampling dtype?
-        valid = self.contains(local_points, tol=1e-3)
+        F = self.F if dim == 3 else self.f
+        residuals = torch.abs(F(local_points))
+        # Points outside of the domain are on the continuation of the implicit
+        # function, not on the surface
+        on_surface = (residuals < self.collide_tol) & self.in_domain(local_points)
+        in_outline = self.outline.contains(local_points)
+        valid = in_outline & on_surface
+
+        diagnostics = active_diagnostics()
+        if diagnostics is not None:
+            diagnostics.record_collisions(residuals, on_surface, in_outline)
 
         return t, local_normals, valid
 
+    def solve(
+        self, P: Tensor, V: Tensor, newton_dtype: Optional[torch.dtype] = None
+    ) -> Tensor:
+        "Solve for t such that P + tV is on the surface, see intersect_newton()"
+
+        return intersect_newton(
+            self,
+            P,
+            V,
+            self.initial_guess(P, V),
+            newton_dtype=newton_dtype,
+            num_iter=self.newton_iterations,
+        )
+
+    def vertex_extent_bounds(self) -> Tensor:
+        "X bounds of a surface that is monotonic from its vertex to its extent"
+        extent = self.extent_x().detach()
+        zero = torch.zeros_like(extent)
+        return torch.stack((torch.minimum(zero, extent), torch.maximum(zero, extent)))
+
+    def in_domain(self, points: Tensor) -> Tensor:
+        """
+        Mask of points within the domain of the implicit function
+
+        Surfaces that are not defined everywhere continue F outside of their
+        domain so that it stays finite, and collisions there are rejected.
+        """
+        return torch.ones(points.shape[0], dtype=torch.bool, device=points.device)
+
+    def initial_guess(self, P: Tensor, V: Tensor) -> Tensor:
+        "Initial t for Newton's method, default is the intersection with X=0"
+        return -P[:, 0] / V[:, 0]
+
     def f(self, points: Tensor) -> Tensor:
         raise NotImplementedError
 
@@ -177,6 +267,14 @@ class ImplicitSurface(LocalSurface):
         """
         raise NotImplementedError
 
+    def f_and_grad(self, points: Tensor) -> tuple[Tensor, Tensor]:
+        "f and f_grad together, surfaces can override it to share computations"
+        return self.f(points), self.f_grad(points)
+
+    def F_and_grad(self, points: Tensor) -> tuple[Tensor, Tensor]:
+        "F and F_grad together, surfaces can override it to share computations"
+        return self.F(points), self.F_grad(points)
+
 
 class Parabola(ImplicitSurface):
     def __init__(
@@ -203,7 +301,7 @@ class Parabola(ImplicitSurface):
         Generate N sample points located on the shape's curve with r >= 0
         """
 
-        r = torch.linspace(0, self.outline.max_radius(), N)
+        r = torch.linspace(0, self.outline.max_radius(), N, dtype=self.dtype)
         x = self.a * r**2
         return torch.stack((x, r), dim=-1)
 
@@ -211,6 +309,9 @@ class Parabola(ImplicitSurface):
         r = self.outline.max_radius()
         return torch.as_tensor(self.a * r**2, dtype=self.dtype)
 
+    def bounds_x(self) -> Optional[Tensor]:
+        return self.vertex_extent_bounds()
+
     def f(self, points: Tensor) -> Tensor:
         x, r = points[:, 0], points[:, 1]
         return torch.mul(self.a, torch.pow(r, 2)) - x
@@ -262,17 +363,40 @@ class Sphere(ImplicitSurface):
         "Utility function because parameter is stored internally as curvature"
         return torch.div(1.0, self.K)
 
-    def extent_x(self) -> Tensor:
-        r2 = self.outline.max_radius() ** 2
+    def sag(self, r2: Tensor) -> tuple[Tensor, Tensor]:
+        """
+        Sag X and its derivative with respect to r^2, as functions of r^2
+
+        Beyond the sphere's domain (r > |R|), the sag is continued by K r^2,
+        its value on the domain boundary, so that values and gradients stay
+        finite if Newton's method or the optimizer go there. Collision points
+        are rejected there, see in_domain().
+        """
+
         K = self.K
-        return torch.div(K * r2, 1 + torch.sqrt(1 - r2 * K**2))
+        s, inside = safe_sqrt(1 - r2 * K**2)
+        sag = torch.div(K * r2, 1 + s)
+        dsag = torch.where(inside, K / (2 * torch.where(inside, s, 1.0)), K)
+        return sag, dsag
+
+    def in_domain(self, points: Tensor) -> Tensor:
+        r2 = torch.sum(points[:, 1:] ** 2, dim=1)
+        return r2 * self.K**2 < 1
+
+    def extent_x(self) -> Tensor:
+        r2 = torch.as_tensor(self.outline.max_radius() ** 2, dtype=self.dtype)
+        return self.sag(r2)[0]
+
+    def bounds_x(self) -> Optional[Tensor]:
+        return self.vertex_extent_bounds()
 
     def samples2D(self, N: int) -> Tensor:
         # Use the angular parameterization of the circle so that samples are
         # smoother, especially for high curvature circles.
         R = 1 / self.K
-        theta_max = torch.arcsin(self.outline.max_radius() / torch.abs(R))
-        theta = torch.linspace(0.0, theta_max, N)
+        ratio = torch.clamp(self.outline.max_radius() / torch.abs(R), max=1.0)
+        theta_max = torch.arcsin(ratio)
+        theta = torch.linspace(0.0, theta_max, N, dtype=self.dtype)
 
         if R > 0:
             theta = theta + torch.pi
@@ -284,32 +408,503 @@ class Sphere(ImplicitSurface):
 
     def f(self, points: Tensor) -> Tensor:
         x, r = points[:, 0], points[:, 1]
-        r2 = torch.pow(r, 2)
-        K = self.K
-        return torch.div(K * r2, 1 + torch.sqrt(1 - r2 * K**2)) - x
+        return self.sag(r**2)[0] - x
 
     def f_grad(self, points: Tensor) -> Tensor:
         x, r = points[:, 0], points[:, 1]
-        r2 = torch.pow(r, 2)
-        K = self.K
-        denom = torch.sqrt(1 - r2 * K**2)
-        return torch.stack((-torch.ones_like(x), (K * r) / denom), dim=-1)
+        _, dsag = self.sag(r**2)
+        return torch.stack((-torch.ones_like(x), 2 * r * dsag), dim=-1)
 
     def F(self, points: Tensor) -> Tensor:
         x, y, z = points[:, 0], points[:, 1], points[:, 2]
-        K = self.K
-        r2 = y**2 + z**2
-        return torch.div(K * r2, 1 + torch.sqrt(1 - r2 * K**2)) - x
+        return self.sag(y**2 + z**2)[0] - x
 
     def F_grad(self, points: Tensor) -> Tensor:
         x, y, z = points[:, 0], points[:, 1], points[:, 2]
-        K = self.K
-        r2 = y**2 + z**2
-        denom = torch.sqrt(1 - r2 * K**2)
-        return torch.stack(
-            (-torch.ones_like(x), (K * y) / denom, (K * z) / denom), dim=-1
+        _, dsag = self.sag(y**2 + z**2)
+        return torch.stack((-torch.ones_like(x), 2 * y * dsag, 2 * z * dsag), dim=-1)
+
+
+class Asphere(ImplicitSurface):
+    """
+    Conic surface with even polynomial aspheric terms
+
+    X = C r^2 / (1 + sqrt(1 - (1+K) C^2 r^2)) + A4 r^4 + A6 r^6 + ...
+
+    where C = 1/R is the curvature and K the conic constant. All coefficients
+    are stored in a single vector (C, K, A4, A6, ...), so that they are
+    optimized as one parameter. If some of R, K, A are nn.Parameter, the
+    vector is a parameter, and the gradient of the other coefficients is
+    masked so that they stay fixed.
+
+    Newton's method is initialized with the closed form intersection of rays
+    with the base conic, so that it only has to correct for the aspheric
+    terms and needs few iterations.
+    """
+
+    newton_iterations: int = 6
+
+    def __init__(
+        self,
+        diameter: float,
+        R: int | float | nn.Parameter,
+        K: int | float | nn.Parameter = 0.0,
+        A: Sequence[float] | Tensor | nn.Parameter = (),
+        dtype: torch.dtype = torch.float64,
+    ):
+        super().__init__(CircularOutline(diameter), dtype)
+        self.diameter = diameter
+
+        C = 1.0 / torch.as_tensor(R, dtype=dtype).detach()
+        values = torch.cat(
+            (
+                C.reshape(1),
+                torch.as_tensor(K, dtype=dtype).detach().reshape(1),
+                torch.as_tensor(A, dtype=dtype).detach().reshape(-1),
+            )
+        )
+
+        # Mask of trainable coefficients
+        trainable = [isinstance(R, nn.Parameter), isinstance(K, nn.Parameter)] + [
+            isinstance(A, nn.Parameter)
+        ] * (values.shape[0] - 2)
+        self.mask = torch.tensor(trainable, dtype=dtype)
+
+        self.coefficients: Tensor
+        if any(trainable):
+            self.coefficients = nn.Parameter(values)
+            if not all(trainable):
+                mask = self.mask
+                self.coefficients.register_hook(lambda grad: grad * mask)
+        else:
+            self.coefficients = values
+
+    def parameters(self) -> dict[str, nn.Parameter]:
+        if isinstance(self.coefficients, nn.Parameter):
+            return {"coefficients": self.coefficients}
+        else:
+            return {}
+
+    def sag(self, r2: Tensor) -> tuple[Tensor, Tensor]:
+        """
+        Sag X and its derivative with respect to r^2, as functions of r^2
+
+        Args:
+            r2: tensor of squared distances to the X axis
+
+        Returns:
+            sag: X coordinate of the surface
+            dsag: derivative of sag with respect to r^2
+        """
+
+        C, K, A = self.coefficients[0], self.coefficients[1], self.coefficients[2:]
+
+        # Base conic, sharing the square root between sag and derivative,
+        # continued by C r^2 outside of its domain (see Sphere.sag())
+        s, inside = safe_sqrt(1 - (1 + K) * C**2 * r2)
+        sag = C * r2 / (1 + s)
+        dsag = torch.where(inside, C / (2 * torch.where(inside, s, 1.0)), C)
+
+        # Aspheric polynomial sum(A_i r2^(i+2)) and its derivative, with
+        # Horner's scheme in r2
+        if A.shape[0] > 0:
+            value = A[-1].expand_as(r2)
+            deriv = torch.zeros_like(r2)
+            for a in reversed(torch.unbind(A[:-1])):
+                deriv = deriv * r2 + value
+                value = value * r2 + a
+            for _ in range(2):
+                deriv = deriv * r2 + value
+                value = value * r2
+
+            sag = sag + value
+            dsag = dsag + deriv
+
+        return sag, dsag
+
+    def in_domain(self, points: Tensor) -> Tensor:
+        C, K = self.coefficients[0], self.coefficients[1]
+        r2 = torch.sum(points[:, 1:] ** 2, dim=1)
+        return (1 + K) * C**2 * r2 < 1
+
+    def samples2D(self, N: int) -> Tensor:
+        r = torch.linspace(0, self.outline.max_radius(), N, dtype=self.dtype)
+        x, _ = self.sag(r**2)
+        return torch.stack((x, r), dim=-1)
+
+    def extent_x(self) -> Tensor:
+        r2 = torch.as_tensor(self.outline.max_radius() ** 2, dtype=self.dtype)
+        return self.sag(r2)[0]
+
+    def bounds_x(self) -> Optional[Tensor]:
+        # Only the base conic is known to be monotonic
+        if self.coefficients.shape[0] > 2:
+            return None
+        return self.vertex_extent_bounds()
+
+    def initial_guess(self, P: Tensor, V: Tensor) -> Tensor:
+        """
+        Intersection of rays with the base conic, falling back to the X=0
+        plane for rays that miss it
+
+        The conic is the quadric C(1+K) x^2 - 2x + C r^2 = 0. Solving for P+tV
+        gives a t^2 + 2h t + c = 0, with roots c / q and q / a where
+        q = -(h + sign(h) sqrt(h^2 - ac)), which are stable as C -> 0.
+
+        Ellipsoids and hyperboloids have a second sheet, where the sag formula
+        doesn't apply. Only roots on the vertex sheet, where
+        1 - C(1+K) x >= 0, are used, preferring the smallest positive one.
+        """
+
+        C, K = self.coefficients[0].to(P.dtype), self.coefficients[1].to(P.dtype)
+
+        Px, Pr, Vx, Vr = P[:, 0], P[:, 1:], V[:, 0], V[:, 1:]
+        a = C * ((1 + K) * Vx**2 + torch.sum(Vr * Vr, dim=1))
+        h = C * ((1 + K) * Px * Vx + torch.sum(Pr * Vr, dim=1)) - Vx
+        c = C * ((1 + K) * Px**2 + torch.sum(Pr * Pr, dim=1)) - 2 * Px
+
+        disc = h**2 - a * c
+        sign = torch.where(h >= 0, 1.0, -1.0)
+        q = -(h + sign * torch.sqrt(torch.clamp(disc, min=0.0)))
+
+        near = c / torch.where(q != 0, q, 1.0)
+        far = q / torch.where(a != 0, a, 1.0)
+        near_ok = (disc >= 0) & (q != 0) & (1 - C * (1 + K) * (Px + near * Vx) >= 0)
+        far_ok = (disc >= 0) & (a != 0) & (1 - C * (1 + K) * (Px + far * Vx) >= 0)
+
+        # Smallest positive root on the vertex sheet, or any root on it
+        inf = torch.full_like(Px, float("inf"))
+        t = torch.minimum(
+            torch.where(near_ok & (near > 0), near, inf),
+            torch.where(far_ok & (far > 0), far, inf),
+        )
+        plane_t = -Px / Vx
+        fallback = torch.where(near_ok, near, torch.where(far_ok, far, plane_t))
+        return torch.where(torch.isfinite(t), t, fallback)
+
+    def f(self, points: Tensor) -> Tensor:
+        x, r = points[:, 0], points[:, 1]
+        return self.sag(r**2)[0] - x
+
+    def f_grad(self, points: Tensor) -> Tensor:
+        x, r = points[:, 0], points[:, 1]
+        _, dsag = self.sag(r**2)
+        return torch.stack((-torch.ones_like(x), 2 * r * dsag), dim=-1)
+
+    def F(self, points: Tensor) -> Tensor:
+        x, y, z = points[:, 0], points[:, 1], points[:, 2]
+        return self.sag(y**2 + z**2)[0] - x
+
+    def F_grad(self, points: Tensor) -> Tensor:
+        x, y, z = points[:, 0], points[:, 1], points[:, 2]
+        _, dsag = self.sag(y**2 + z**2)
+        return torch.stack((-torch.ones_like(x), 2 * y * dsag, 2 * z * dsag), dim=-1)
+
+
+class ZernikeSurface(Asphere):
+    """
+    Freeform surface: an Asphere plus Zernike polynomial terms
+
+    X = asphere(r^2) + sum_j c_j Z_j(y / r0, z / r0)
+
+    where r0 is the semi diameter and Z_j are Noll normalized Zernike
+    polynomials, in Noll order unless terms are given. In 2D, the surface is
+    its Z=0 section.
+
+    All terms and their gradients are evaluated in one pass (see ZernikeBasis)
+    and Newton's method evaluates F and its gradient together. On the fixed
+    sample grids of samples2D() and grid_samples(), the basis does not depend
+    on the coefficients, so it is cached and reused as they change.
+    """
+
+    newton_iterations: int = 8
+
+    def __init__(
+        self,
+        diameter: float,
+        R: int | float | nn.Parameter,
+        K: int | float | nn.Parameter = 0.0,
+        A: Sequence[float] | Tensor | nn.Parameter = (),
+        zernike: Sequence[float] | Tensor | nn.Parameter = (),
+        terms: Optional[Sequence[tuple[int, int]]] = None,
+        dtype: torch.dtype = torch.float64,
+    ):
+        """
+        Args:
+            diameter, R, K, A: see Asphere
+            zernike: Zernike coefficients, in units of length
+            terms: optional (n, m) orders of the coefficients, negative m are
+                sine terms. Default is Noll order, starting at piston.
+        """
+
+        super().__init__(diameter, R, K, A, dtype)
+        self.norm_radius = diameter / 2
+
+        self.zernike: Tensor
+        if isinstance(zernike, nn.Parameter):
+            self.zernike = zernike
+        else:
+            self.zernike = torch.as_tensor(zernike, dtype=dtype).reshape(-1)
+
+        if terms is None:
+            terms = [noll_to_nm(j) for j in range(1, self.zernike.shape[0] + 1)]
+        assert len(terms) == self.zernike.shape[0]
+        self.basis = ZernikeBasis(terms)
+
+        # Fixed sample grids and the basis on them, see grid()
+        self._grid_cache: dict[
+            tuple[str, int], tuple[Tensor, Tensor, tuple[Tensor, Tensor, Tensor]]
+        ] = {}
+
+    def parameters(self) -> dict[str, nn.Parameter]:
+        params = super().parameters()
+        if isinstance(self.zernike, nn.Parameter):
+            params["zernike"] = self.zernike
+        return params
+
+    def freeform_sag(
+        self,
+        y: Tensor,
+        z: Tensor,
+        basis: Optional[tuple[Tensor, Tensor, Tensor]] = None,
+    ) -> tuple[Tensor, Tensor, Tensor]:
+        """
+        Sag X and its partial derivatives with respect to y and z
+
+        Args:
+            y, z: transverse coordinates, tensors of shape (N,)
+            basis: optional precomputed basis at (y, z), see grid()
+
+        Returns:
+            sag, dsag/dy, dsag/dz: tensors of shape (N,)
+        """
+
+        sag, dsag = self.sag(y**2 + z**2)
+
+        if basis is None:
+            basis = self.basis(y / self.norm_radius, z / self.norm_radius)
+        Z, dZ_du, dZ_dv = basis
+
+        c = self.zernike.to(y.dtype)
+        return (
+            sag + Z @ c,
+            2 * y * dsag + (dZ_du @ c) / self.norm_radius,
+            2 * z * dsag + (dZ_dv @ c) / self.norm_radius,
+        )
+
+    def grid(
+        self, kind: str, N: int
+    ) -> tuple[Tensor, Tensor, tuple[Tensor, Tensor, Tensor]]:
+        """
+        Coordinates (y, z) of a fixed sample grid and the basis on it, cached
+
+        Args:
+            kind: 'profile' for N samples along the +Y axis, or 'grid' for a
+                N x N grid clipped to the outline
+            N: number of samples along one axis
+        """
+
+        key = (kind, N)
+        if key not in self._grid_cache:
+            r0 = self.norm_radius
+            if kind == "profile":
+                y = torch.linspace(0, r0, N, dtype=self.dtype)
+                z = torch.zeros_like(y)
+            elif kind == "grid":
+                R = torch.linspace(-r0, r0, N, dtype=self.dtype)
+                yz = torch.cartesian_prod(R, R).reshape(-1, 2)
+                yz = yz[torch.hypot(yz[:, 0], yz[:, 1]) <= r0]
+                y, z = yz[:, 0], yz[:, 1]
+            else:
+                raise ValueError(f"Unknown sample grid kind {repr(kind)}")
+
+            self._grid_cache[key] = (y, z, self.basis(y / r0, z / r0))
+
+        return self._grid_cache[key]
+
+    def samples2D(self, N: int) -> Tensor:
+        "N samples of the Z=0 section with r >= 0"
+        y, z, basis = self.grid("profile", N)
+        x, _, _ = self.freeform_sag(y, z, basis)
+        return torch.stack((x, y), dim=-1)
+
+    def grid_samples(self, N: int) -> Tensor:
+        """
+        Points of the surface on a N x N grid clipped to the outline, for
+        rendering or regularization of the freeform shape
+
+        Returns:
+            tensor of shape (M, 3)
+        """
+
+        y, z, basis = self.grid("grid", N)
+        x, _, _ = self.freeform_sag(y, z, basis)
+        return torch.stack((x, y, z), dim=-1)
+
+    def bounds_x(self) -> Optional[Tensor]:
+        return None
+
+    def extent_x(self) -> Tensor:
+        "X coordinate at the edge of the surface on the +Y axis, as samples2D()"
+        y = torch.full((1,), self.norm_radius, dtype=self.dtype)
+        return self.freeform_sag(y, torch.zeros_like(y))[0][0]
+
+    def f(self, points: Tensor) -> Tensor:
+        return self.f_and_grad(points)[0]
+
+    def f_grad(self, points: Tensor) -> Tensor:
+        return self.f_and_grad(points)[1]
+
+    def f_and_grad(self, points: Tensor) -> tuple[Tensor, Tensor]:
+        x, r = points[:, 0], points[:, 1]
+        sag, dsag_dr, _ = self.freeform_sag(r, torch.zeros_like(r))
+        return sag - x, torch.stack((-torch.ones_like(x), dsag_dr), dim=-1)
+
+    def F(self, points: Tensor) -> Tensor:
+        return self.F_and_grad(points)[0]
+
+    def F_grad(self, points: Tensor) -> Tensor:
+        return self.F_and_grad(points)[1]
+
+    def F_and_grad(self, points: Tensor) -> tuple[Tensor, Tensor]:
+        x, y, z = points[:, 0], points[:, 1], points[:, 2]
+        sag, dsag_dy, dsag_dz = self.freeform_sag(y, z)
+        return sag - x, torch.stack((-torch.ones_like(x), dsag_dy, dsag_dz), dim=-1)
+
+
+class TabulatedSag(ImplicitSurface):
+    """
+    Surface of revolution defined by a table of sag values, e.g. a measured
+    surface profile
+
+    The sag is interpolated by a C2 cubic spline with zero slope on the axis.
+    Samples must be on a uniform radial grid starting at r = 0, so that the
+    spline segment of a point is computed directly rather than searched, see
+    interp_cubic_uniform(). Spline coefficients are computed once, the table
+    is not a parameter.
+
+    Collision detection brackets the root of each ray between the planes
+    X = min sag and X = max sag, and runs Newton's method safeguarded by
+    bisection, so it converges for any ray crossing the surface.
+    """
+
+    newton_iterations: int = 12
+
+    def __init__(
+        self,
+        r: Sequence[float] | Tensor,
+        sag: Sequence[float] | Tensor,
+        dtype: torch.dtype = torch.float64,
+    ):
+        r = torch.as_tensor(r, dtype=dtype)
+        sag = torch.as_tensor(sag, dtype=dtype)
+        N = r.shape[0]
+
+        assert r.dim() == 1 and r.shape == sag.shape and N >= 2
+        assert r[0] == 0, "Sag table must start on the axis (r = 0)"
+
+        self.step = r[-1].item() / (N - 1)
+        assert torch.allclose(
+            torch.diff(r), torch.full((N - 1,), self.step, dtype=dtype)
+        ), "Sag table must be on a uniform radial grid"
+
+        super().__init__(CircularOutline(2 * r[-1].item()), dtype)
+        self.diameter = 2 * r[-1].item()
+        self.r, self.table = r, sag
+        self.coefficients = cubic_spline_coefficients(sag, self.step)
+
+        # Bounds of the surface along X. The spline can overshoot the table
+        # between samples, so use a denser sampling and a margin.
+        dense = self.sag(torch.linspace(0, r[-1].item(), 8 * N, dtype=dtype))[0]
+        margin = 0.01 * (dense.max() - dense.min()).item() + 1e-9
+        self.sag_min = dense.min().item() - margin
+        self.sag_max = dense.max().item() + margin
+
+    def parameters(self) -> dict[str, nn.Parameter]:
+        return {}
+
+    def sag(self, r: Tensor) -> tuple[Tensor, Tensor]:
+        "Sag and its derivative with respect to r, for r >= 0"
+        return interp_cubic_uniform(0.0, self.step, self.coefficients.to(r.dtype), r)
+
+    def samples2D(self, N: int) -> Tensor:
+        r = torch.linspace(0, self.outline.max_radius(), N, dtype=self.dtype)
+        return torch.stack((self.sag(r)[0], r), dim=-1)
+
+    def extent_x(self) -> Tensor:
+        r = torch.full((1,), self.outline.max_radius(), dtype=self.dtype)
+        return self.sag(r)[0][0]
+
+    def bounds_x(self) -> Optional[Tensor]:
+        return torch.tensor([self.sag_min, self.sag_max], dtype=self.dtype)
+
+    def solve(
+        self, P: Tensor, V: Tensor, newton_dtype: Optional[torch.dtype] = None
+    ) -> Tensor:
+        "Bracketed Newton's method, newton_dtype is ignored"
+
+        with torch.no_grad():
+            Pd, Vd = P.detach(), V.detach()
+            Vx = Vd[:, 0]
+            safe_Vx = torch.where(Vx != 0, Vx, 1.0)
+
+            # F = sag - x is >= 0 on the X = sag_min plane, and <= 0 on the
+            # X = sag_max plane. Bracket ends are not ordered, the root is
+            # between them.
+            lo = (self.sag_min - Pd[:, 0]) / safe_Vx
+            hi = (self.sag_max - Pd[:, 0]) / safe_Vx
+            t = (lo + hi) / 2
+
+            for _ in range(self.newton_iterations):
+                points = Pd + t.unsqueeze(1) * Vd
+                F, F_grad = (
+                    self.f_and_grad(points)
+                    if Pd.shape[1] == 2
+                    else self.F_and_grad(points)
+                )
+
+                positive = F >= 0
+                lo = torch.where(positive, t, lo)
+                hi = torch.where(positive, hi, t)
+
+                # Newton step if it stays in the bracket, else bisection
+                newton = t - F / torch.sum(F_grad * Vd, dim=1)
+                inside = (newton - lo) * (newton - hi) <= 0
+                t = torch.where(inside, newton, (lo + hi) / 2)
+
+        profiling.count("newton_iterations", self.newton_iterations + 1)
+
+        # One newton iteration for backwards pass
+        return t - newton_delta(self, P, V, t)
+
+    def f(self, points: Tensor) -> Tensor:
+        return self.f_and_grad(points)[0]
+
+    def f_grad(self, points: Tensor) -> Tensor:
+        return self.f_and_grad(points)[1]
+
+    def f_and_grad(self, points: Tensor) -> tuple[Tensor, Tensor]:
+        x, r = points[:, 0], points[:, 1]
+        sag, dsag = self.sag(torch.abs(r))
+        return sag - x, torch.stack(
+            (-torch.ones_like(x), dsag * torch.sign(r)), dim=-1
         )
 
+    def F(self, points: Tensor) -> Tensor:
+        return self.F_and_grad(points)[0]
+
+    def F_grad(self, points: Tensor) -> Tensor:
+        return self.F_and_grad(points)[1]
+
+    def F_and_grad(self, points: Tensor) -> tuple[Tensor, Tensor]:
+        x, y, z = points[:, 0], points[:, 1], points[:, 2]
+        r = torch.hypot(y, z)
+        sag, dsag = self.sag(r)
+
+        # dsag/dr is zero on the axis
+        ratio = dsag / torch.where(r > 0, r, 1.0)
+        return sag - x, torch.stack((-torch.ones_like(x), ratio * y, ratio * z), dim=-1)
+
 
 def newton_delta(surface: ImplicitSurface, P: Tensor, V: Tensor, t: Tensor) -> Tensor:
     "Compute the delta for one step of Newton's method"
@@ -318,11 +913,9 @@ def newton_delta(surface: ImplicitSurface, P: Tensor, V: Tensor, t: Tensor) -> T
     points = P + t.unsqueeze(1).expand_as(V) * V
 
     if dim == 2:
-        F = surface.f(points)
-        F_grad = surface.f_grad(points)
+        F, F_grad = surface.f_and_grad(points)
     else:
-        F = surface.F(points)
-        F_grad = surface.F_grad(points)
+        F, F_grad = surface.F_and_grad(points)
 
     # Denominator will be zero if F_grad and V are orthogonal
     denom = torch.sum(F_grad * V, dim=1)
@@ -331,7 +924,13 @@ def newton_delta(surface: ImplicitSurface, P: Tensor, V: Tensor, t: Tensor) -> T
 
 
 def intersect_newton(
-    surface: ImplicitSurface, P: Tensor, V: Tensor, init_t: Tensor
+    surface: ImplicitSurface,
+    P: Tensor,
+    V: Tensor,
+    init_t: Tensor,
+    newton_dtype: Optional[torch.dtype] = None,
+    refine_iter: int = 1,
+    num_iter: int = 20,
 ) -> Tensor:
     """
     Collision detection of parametric rays with implicit surface using Newton's
@@ -340,10 +939,21 @@ def intersect_newton(
     Rays are defined by P + tV where P are origin points, and V and unit length
     direction vectors.
 
+    Mixed precision: if newton_dtype is given and differs from the rays dtype,
+    the non differentiable iterations run in newton_dtype (typically float32,
+    for speed), followed by refine_iter iterations and the differentiable
+    iteration in the rays dtype (typically float64, for accuracy). Newton's
+    method converges quadratically, so a single refinement step from a float32
+    solution recovers float64 accuracy.
+
     Args:
         P: tensor (N, 2|3), rays origin points
         V: tensor (N, 2|3), rays unit vectors
         init_t: tensor (N,), initial value for t
+        newton_dtype: optional dtype of the bulk of the iterations
+        refine_iter: number of non differentiable iterations in the rays dtype
+            after the newton_dtype iterations, in mixed precision mode
+        num_iter: number of non differentiable iterations
 
     Returns:
         t: tensor (N,), t values after Newton iterations
@@ -358,14 +968,46 @@ def intersect_newton(
     # Initialize solutions t
     t = init_t
 
+    # Rays used for non differentiable iterations
+    mixed = newton_dtype is not None and newton_dtype != P.dtype
+    Pi, Vi = (
+        (P.detach().to(newton_dtype), V.detach().to(newton_dtype))
+        if mixed
+        else (P, V)
+    )
+
+    # Per ray number of iterations until convergence, only for diagnostics
+    diagnostics = active_diagnostics()
+    iterations = (
+        torch.zeros(t.shape, dtype=torch.int64, device=t.device)
+        if diagnostics is not None
+        else None
+    )
+
     with torch.no_grad():
-        for _ in range(20):  # TODO parameters for newton iterations
+        t = t.to(Pi.dtype)
+        for _ in range(num_iter):
             # TODO warning if stopping due to max iter (didn't converge)
-            delta = newton_delta(surface, P, V, t)
+            delta = newton_delta(surface, Pi, Vi, t)
             # TODO early stop if delta is small enough
+            if diagnostics is not None and iterations is not None:
+                iterations += ~diagnostics.converged(t, delta)
             t = t - delta
 
+        # Refine in the rays dtype
+        if mixed:
+            t = t.to(P.dtype)
+            for _ in range(refine_iter):
+                t = t - newton_delta(surface, P, V, t)
+
+    if diagnostics is not None and iterations is not None:
+        diagnostics.record_iterations(iterations, num_iter)
+
     # One newton iteration for backwards pass
     t = t - newton_delta(surface, P, V, t)
 
+    profiling.count(
+        "newton_iterations", num_iter + 1 + (refine_iter if mixed else 0)
+    )
+
     return t
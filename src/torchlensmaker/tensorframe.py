@@ -1,44 +1,124 @@
 from __future__ import annotations
 
 import torch
-from typing import Dict
+from typing import Dict, Optional
 import numbers
+import functools
+
+
+def as_column(value: float | torch.Tensor, N: int) -> torch.Tensor:
+    "Convert a column value to a tensor of shape (N,), broadcasting if needed"
+
+    if isinstance(value, torch.Tensor) and value.dim() == 0:
+        column = value.unsqueeze(0).expand((N,))
+    elif isinstance(value, torch.Tensor) and value.shape == (1,):
+        column = value.expand((N,))
+    elif isinstance(value, torch.Tensor):
+        column = value
+    elif isinstance(value, numbers.Number):
+        column = torch.full((N,), value)
+    else:
+        raise TypeError(
+            "Unsupported type in TensorFrame.update(): " + type(value).__name__
+        )
+
+    assert column.shape == (N,)
+    return column
 
 
 class TensorFrame:
-    "A 2D tensor with named columns"
+    """
+    A 2D tensor with named columns
 
-    data: torch.Tensor
-    columns: list[str]
+    Data is stored column major: each column is a contiguous 1D view into a
+    single buffer of shape (num_columns, capacity). The buffer can have more
+    rows than the frame, so that append() has amortized constant cost.
+    """
+
+    _buffer: torch.Tensor
+    _size: int
+    _index: dict[str, int]
 
     def __init__(self, data: torch.Tensor, columns: list[str]):
-        self.data = data
-        self.columns = list(columns)
+        assert data.dim() == 2
         assert len(columns) == data.shape[1]
+        self._init_buffer(data.T.contiguous(), data.shape[0], columns)
+
+    def _init_buffer(
+        self, buffer: torch.Tensor, size: int, columns: list[str]
+    ) -> None:
+        self._buffer = buffer
+        self._size = size
+        self._index = {name: i for i, name in enumerate(columns)}
+        assert len(self._index) == len(columns), "Duplicate TensorFrame columns"
+
+    @classmethod
+    def from_buffer(
+        cls, buffer: torch.Tensor, columns: list[str], size: Optional[int] = None
+    ) -> TensorFrame:
+        "New TensorFrame using a column major buffer without copying it"
+
+        tf = cls.__new__(cls)
+        tf._init_buffer(buffer, buffer.shape[1] if size is None else size, columns)
+        return tf
+
+    @classmethod
+    def from_columns(cls, **columns: torch.Tensor) -> TensorFrame:
+        "New TensorFrame from 1D tensors of identical length"
+
+        buffer = torch.stack(tuple(columns.values()), dim=0)
+        return cls.from_buffer(buffer, list(columns))
 
     def __repr__(self) -> str:
         return f"TensorFrame:\ndata:\n{repr(self.data)}\ncolumns:\n{self.columns}"
 
+    @property
+    def columns(self) -> list[str]:
+        return list(self._index)
+
+    @property
+    def data(self) -> torch.Tensor:
+        "(N, C) view of the frame data"
+        return self._buffer[:, : self._size].T
+
     @property
     def shape(self) -> tuple[int, ...]:
-        return self.data.shape
+        return (self._size, len(self._index))
+
+    @property
+    def capacity(self) -> int:
+        return self._buffer.shape[1]
 
     def numel(self) -> int:
-        return self.data.numel()
+        return self._size * len(self._index)
 
     def get(self, names: str | list[str]) -> torch.Tensor:
         try:
-            idx: int | list[int]
             if isinstance(names, str):
-                idx = self.columns.index(names)
+                return self._buffer[self._index[names], : self._size]
             else:
-                idx = [self.columns.index(n) for n in names]
-            return self.data[:, idx]
-        except:
+                idx = [self._index[n] for n in names]
+                return self._buffer[idx, : self._size].T
+        except KeyError:
             raise KeyError(f"TensorFrame doesn't have column(s): {names}")
 
+    def set(self, name: str, value: float | torch.Tensor) -> None:
+        """
+        Replace the values of an existing column, in place
+
+        Tensors previously returned by get() for this column are views
+        and will see the new values.
+        """
+
+        if name not in self._index:
+            raise KeyError(f"TensorFrame doesn't have column(s): {name}")
+
+        self._buffer[self._index[name], : self._size] = as_column(value, self._size)
+
     def masked(self, mask: torch.Tensor) -> TensorFrame:
-        return TensorFrame(self.data[mask], self.columns)
+        return TensorFrame.from_buffer(
+            self._buffer[:, : self._size][:, mask], self.columns
+        )
 
     def stack(self, other: TensorFrame) -> TensorFrame:
         """
@@ -52,43 +132,66 @@ class TensorFrame:
             return self
         else:
             assert self.columns == other.columns
-            return TensorFrame(torch.cat((self.data, other.data), dim=0), self.columns)
+            return TensorFrame.from_buffer(
+                torch.cat(
+                    (self._buffer[:, : self._size], other._buffer[:, : other._size]),
+                    dim=1,
+                ),
+                self.columns,
+            )
+
+    def append(self, other: TensorFrame) -> None:
+        """
+        Append the rows of other to self, in place
+        Both columns must be identical, unless self is empty
+
+        Storage grows geometrically, so repeated appends have amortized cost
+        proportional to the number of appended rows.
+        """
+
+        if other.numel() == 0:
+            return
+
+        if self.numel() == 0 and self.columns != other.columns:
+            buffer = other._buffer[:, : other._size].clone()
+            self._init_buffer(buffer, other._size, other.columns)
+            return
+
+        assert self.columns == other.columns
+
+        size = self._size + other._size
+        if size > self.capacity:
+            capacity = max(size, 2 * self.capacity)
+            buffer = self._buffer.new_empty((len(self._index), capacity))
+            buffer[:, : self._size] = self._buffer[:, : self._size]
+            self._buffer = buffer
+
+        self._buffer[:, self._size : size] = other._buffer[:, : other._size]
+        self._size = size
 
     def update(self, **kwargs: float | torch.Tensor) -> TensorFrame:
         "Return a new TensorFrame with updated or inserted columns"
 
-        N = self.data.shape[0]
-        new_cols = kwargs.keys() - set(self.columns)
-        merged_cols = list(self.columns) + list(new_cols)
+        N = self._size
+        new_cols = [k for k in kwargs.keys() if k not in self._index]
+        merged_cols = self.columns + new_cols
+        merged_index = {name: i for i, name in enumerate(merged_cols)}
 
         # convert all values to tensor of shape (N,)
-        kwargs_tensor: Dict[str, torch.Tensor] = {}
-        for k, v in kwargs.items():
-            if isinstance(v, torch.Tensor) and v.dim() == 0:
-                kwargs_tensor[k] = v.unsqueeze(0).expand((N,))
-            elif isinstance(v, torch.Tensor) and v.shape == (1,):
-                kwargs_tensor[k] = v.expand((N,))
-            elif isinstance(v, torch.Tensor):
-                kwargs_tensor[k] = v
-            elif isinstance(v, numbers.Number):
-                kwargs_tensor[k] = torch.full((N,), v)
-            else:
-                raise TypeError(
-                    "Unsupported type in TensorFrame.update(): " + type(v).__name__
-                )
-
-            assert kwargs_tensor[k].shape == (N,)
-
-        new_data = torch.stack(
-            tuple(
-                (
-                    kwargs_tensor[col]
-                    if col in kwargs_tensor
-                    else self.data[:, self.columns.index(col)]
-                )
-                for col in merged_cols
-            ),
-            dim=1,
+        kwargs_tensor: Dict[str, torch.Tensor] = {
+            k: as_column(v, N) for k, v in kwargs.items()
+        }
+
+        dtype = functools.reduce(
+            torch.promote_types,
+            [t.dtype for t in kwargs_tensor.values()],
+            self._buffer.dtype,
         )
 
-        return TensorFrame(new_data, merged_cols)
+        # copy existing columns in one block, then write updated columns
+        new_buffer = self._buffer.new_empty((len(merged_cols), N), dtype=dtype)
+        new_buffer[: len(self._index)] = self._buffer[:, :N]
+        for k, v in kwargs_tensor.items():
+            new_buffer[merged_index[k]] = v
+
+        return TensorFrame.from_buffer(new_buffer, merged_cols)
@@ -55,9 +55,7 @@ def basic_transform(
         else:
             Mr = euler_angles_to_matrix(
                 torch.deg2rad(torch.as_tensor(thetas, dtype=dtype)), "XYZ"
-            ).to(
-                dtype=dtype
-            )  # TODO need to support dtype in euler_angles_to_matrix
+            )
 
         transforms.append(LinearTransform(Mr, Mr.T))
 
@@ -0,0 +1,99 @@
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+
+
+def make_rays(
+    N: int, dim: int, radius: float, dtype: torch.dtype = torch.float64
+) -> tuple[torch.Tensor, torch.Tensor]:
+    "N rays parallel to the X axis, starting at X=-10, within radius of the axis"
+
+    P = torch.empty((N, dim), dtype=dtype)
+    P[:, 0] = -10.0
+    P[:, 1:] = (torch.rand((N, dim - 1), dtype=dtype) * 2 - 1) * radius / dim**0.5
+
+    V = torch.zeros((N, dim), dtype=dtype)
+    V[:, 0] = 1.0
+
+    return P, V
+
+
+def base_sampling(num_rays: int, dim: int) -> int:
+    """
+    Base sampling giving approximately num_rays rays in dimension dim
+    In 3D, light sources sample the base dimension twice
+    """
+
+    return num_rays if dim == 2 else int(round(num_rays**0.5))
+
+
+# Representative optical stacks from test_notebooks
+
+
+def biconvex() -> nn.Module:
+    surface = tlm.Parabola(diameter=15, a=tlm.parameter(0.02))
+    lens = tlm.BiLens(surface, n=(1.0, 1.5), outer_thickness=1.0)
+
+    return nn.Sequential(
+        tlm.PointSourceAtInfinity(beam_diameter=18.5),
+        tlm.Gap(10),
+        lens,
+        tlm.Gap(50),
+        tlm.FocalPoint(),
+    )
+
+
+def triple_biconvex() -> nn.Module:
+    lens_diameter = 15.0
+    surface = tlm.Parabola(lens_diameter, a=tlm.parameter(-0.005))
+    lens = tlm.BiLens(surface, (1.0, 1.5), outer_thickness=0.5)
+
+    return nn.Sequential(
+        tlm.PointSourceAtInfinity(0.9 * lens_diameter),
+        tlm.Gap(15),
+        lens,
+        tlm.Gap(5),
+        lens,
+        tlm.Gap(5),
+        lens,
+        tlm.Gap(80),
+        tlm.FocalPoint(),
+    )
+
+
+def reflecting_telescope() -> nn.Module:
+    primary = tlm.Parabola(35.0, a=tlm.parameter(-0.0001))
+    secondary = tlm.Sphere(35.0, r=nn.Parameter(torch.tensor(450.0)))
+
+    return nn.Sequential(
+        tlm.Gap(-100),
+        tlm.PointSourceAtInfinity(beam_diameter=30),
+        tlm.Gap(100),
+        tlm.ReflectiveSurface(primary),
+        tlm.Gap(-80),
+        tlm.ReflectiveSurface(secondary),
+        tlm.Gap(100),
+        tlm.FocalPoint(),
+    )
+
+
+def landscape_singlet() -> nn.Module:
+    surface = tlm.Parabola(diameter=15, a=tlm.parameter(0.02))
+    lens = tlm.BiLens(surface, n=(1.0, 1.5), outer_thickness=1.0)
+
+    return nn.Sequential(
+        tlm.ObjectAtInfinity(beam_diameter=10, angular_size=10),
+        tlm.Gap(10),
+        lens,
+        tlm.Gap(50),
+        tlm.ImagePlane(),
+    )
+
+
+stacks = {
+    "biconvex": biconvex,
+    "triple_biconvex": triple_biconvex,
+    "reflecting_telescope": reflecting_telescope,
+    "landscape_singlet": landscape_singlet,
+}
@@ -0,0 +1,29 @@
+import torch
+
+
+def tilted_rays(
+    N: int, dim: int, radius: float, spread: float = 0.05
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    N rays at a slight random angle to the X axis, starting at X=-10
+
+    Origins are within radius / dim of the axis along each coordinate, and
+    spread is the standard deviation of the transverse components of the unit
+    direction before normalization. The random generator is seeded, so rays
+    are the same at every call.
+    """
+
+    torch.manual_seed(0)
+    P = torch.empty((N, dim), dtype=torch.float64)
+    P[:, 0] = -10.0
+    P[:, 1:] = (torch.rand((N, dim - 1), dtype=torch.float64) * 2 - 1) * radius / dim
+    V = torch.nn.functional.normalize(
+        torch.column_stack(
+            (
+                torch.ones(N, dtype=torch.float64),
+                spread * torch.randn((N, dim - 1), dtype=torch.float64),
+            )
+        ),
+        dim=1,
+    )
+    return P, V
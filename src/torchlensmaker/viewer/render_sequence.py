@@ -126,6 +126,7 @@ class JointArtist:
 artists_dict: Dict[type, type] = {
     tlm.OpticalSurface: SurfaceArtist,
     tlm.FocalPoint: FocalPointArtist,
+    tlm.ImagePlane: FocalPointArtist,
     # tlm.Aperture: ApertureArtist,
 }
 
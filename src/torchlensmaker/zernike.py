@@ -0,0 +1,142 @@
+import torch
+import math
+
+from typing import Sequence
+
+Tensor = torch.Tensor
+
+
+def noll_to_nm(j: int) -> tuple[int, int]:
+    """
+    Radial and azimuthal orders (n, m) of the Zernike polynomial with Noll
+    index j >= 1. Negative m are sine terms.
+    """
+
+    assert j >= 1
+    n = (math.isqrt(8 * (j - 1) + 1) - 1) // 2
+    p = j - n * (n + 1) // 2
+    m = 2 * ((p + n % 2) // 2) - n % 2
+    return n, -m if (m != 0 and j % 2 == 1) else m
+
+
+def noll_normalization(n: int, m: int) -> float:
+    "Normalization so that each term has unit RMS over the unit disk"
+    return math.sqrt(n + 1) if m == 0 else math.sqrt(2 * (n + 1))
+
+
+class ZernikeBasis:
+    """
+    Evaluation of a set of Zernike polynomials and their gradients
+
+    Each term is written as a polynomial in the cartesian coordinates u, v:
+
+        Z_n^m(u, v) = N_n^m Q_n^|m|(u^2 + v^2) Re[(u + iv)^|m|]     (m >= 0)
+        Z_n^m(u, v) = N_n^m Q_n^|m|(u^2 + v^2) Im[(u + iv)^|m|]     (m < 0)
+
+    where Q_n^m = R_n^m / rho^m is the radial polynomial divided by rho^m, which
+    is a polynomial in rho^2. There is no atan2() and no division by rho, so
+    values and gradients are smooth at the origin.
+
+    The angular factors are computed with the recurrence of complex powers, and
+    the radial factors with Kintner's three term recurrence in n. All terms and
+    gradients share these intermediate values and are computed in one pass
+    over the batch.
+    """
+
+    def __init__(self, terms: Sequence[tuple[int, int]]):
+        """
+        Args:
+            terms: list of (n, m) orders, with |m| <= n and n - |m| even
+        """
+
+        for n, m in terms:
+            assert n >= 0 and abs(m) <= n and (n - abs(m)) % 2 == 0, (n, m)
+
+        self.terms = list(terms)
+        self.normalization = [noll_normalization(n, m) for n, m in self.terms]
+
+        # Highest radial order needed for each azimuthal order
+        self.max_n: dict[int, int] = {}
+        for n, m in self.terms:
+            self.max_n[abs(m)] = max(n, self.max_n.get(abs(m), 0))
+        self.max_m = max(self.max_n.keys(), default=0)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def radial(self, x: Tensor) -> dict[tuple[int, int], tuple[Tensor, Tensor]]:
+        "Q_n^m(x) and dQ_n^m/dx for all needed orders, with x = rho^2"
+
+        radial = {}
+        for m, max_n in self.max_n.items():
+            q0, d0 = torch.ones_like(x), torch.zeros_like(x)
+            radial[(m, m)] = (q0, d0)
+            if max_n < m + 2:
+                continue
+
+            q1, d1 = (m + 2) * x - (m + 1), torch.full_like(x, m + 2)
+            radial[(m + 2, m)] = (q1, d1)
+
+            for p in range(m + 4, max_n + 1, 2):
+                k1 = (p + m) * (p - m) * (p - 2) / 2
+                k2 = 2 * p * (p - 1) * (p - 2)
+                k3 = -(m**2) * (p - 1) - p * (p - 1) * (p - 2)
+                k4 = -p * (p + m - 2) * (p - m - 2) / 2
+
+                a = k2 * x + k3
+                q0, q1, d0, d1 = (
+                    q1,
+                    (a * q1 + k4 * q0) / k1,
+                    d1,
+                    (k2 * q1 + a * d1 + k4 * d0) / k1,
+                )
+                radial[(p, m)] = (q1, d1)
+
+        return radial
+
+    def __call__(self, u: Tensor, v: Tensor) -> tuple[Tensor, Tensor, Tensor]:
+        """
+        Evaluate all terms and their partial derivatives
+
+        Args:
+            u, v: normalized coordinates, tensors of shape (N,)
+
+        Returns:
+            Z, dZ/du, dZ/dv: tensors of shape (N, J), one column per term
+        """
+
+        if len(self.terms) == 0:
+            empty = torch.zeros((u.shape[0], 0), dtype=u.dtype, device=u.device)
+            return empty, empty, empty
+
+        # Real and imaginary parts of (u + iv)^m
+        C, S = [torch.ones_like(u)], [torch.zeros_like(u)]
+        for _ in range(self.max_m):
+            C, S = C + [u * C[-1] - v * S[-1]], S + [u * S[-1] + v * C[-1]]
+
+        radial = self.radial(u * u + v * v)
+        zeros = torch.zeros_like(u)
+
+        values, grad_u, grad_v = [], [], []
+        for (n, m), norm in zip(self.terms, self.normalization):
+            a = abs(m)
+            q, dq = radial[(n, a)]
+
+            # Angular factor and its partial derivatives, using
+            # d(u + iv)^a/du = a (u + iv)^(a-1) and d/dv = i a (u + iv)^(a-1)
+            if a == 0:
+                A, dA_du, dA_dv = C[0], zeros, zeros
+            elif m > 0:
+                A, dA_du, dA_dv = C[a], a * C[a - 1], -a * S[a - 1]
+            else:
+                A, dA_du, dA_dv = S[a], a * S[a - 1], a * C[a - 1]
+
+            values.append(norm * q * A)
+            grad_u.append(norm * (2 * u * dq * A + q * dA_du))
+            grad_v.append(norm * (2 * v * dq * A + q * dA_dv))
+
+        return (
+            torch.stack(values, dim=1),
+            torch.stack(grad_u, dim=1),
+            torch.stack(grad_v, dim=1),
+        )
@@ -0,0 +1,123 @@
+import pytest
+import typing
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+from torchlensmaker.testing.rays import tilted_rays
+from torchlensmaker.surfaces import intersect_newton
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def random_points(N: int, dim: int, radius: float) -> torch.Tensor:
+    torch.manual_seed(1)
+    return (torch.rand((N, dim), dtype=torch.float64) * 2 - 1) * radius / dim
+
+
+def implicit(surface: tlm.ImplicitSurface, dim: int) -> tuple[typing.Any, typing.Any]:
+    return (surface.f, surface.f_grad) if dim == 2 else (surface.F, surface.F_grad)
+
+
+def test_sphere_equivalence(dim: int) -> None:
+    asphere = tlm.Asphere(10.0, R=15.0)
+    sphere = tlm.Sphere(10.0, 15.0)
+    points = random_points(100, dim, 5.0)
+
+    for f1, f2 in zip(implicit(asphere, dim), implicit(sphere, dim)):
+        assert torch.allclose(f1(points), f2(points))
+
+    assert torch.allclose(asphere.extent_x(), sphere.extent_x())
+
+
+def test_parabola_equivalence(dim: int) -> None:
+    asphere = tlm.Asphere(10.0, R=25.0, K=-1.0)
+    parabola = tlm.Parabola(10.0, a=1 / 50.0)
+    points = random_points(100, dim, 5.0)
+
+    for f1, f2 in zip(implicit(asphere, dim), implicit(parabola, dim)):
+        assert torch.allclose(f1(points), f2(points))
+
+
+def test_sag_derivative() -> None:
+    asphere = tlm.Asphere(10.0, R=20.0, K=-0.5, A=[1e-4, -2e-6, 3e-8])
+    r2 = torch.linspace(0.0, 25.0, 50, dtype=torch.float64, requires_grad=True)
+
+    sag, dsag = asphere.sag(r2)
+    (expected,) = torch.autograd.grad(sag.sum(), r2)
+    assert torch.allclose(dsag, expected)
+
+    # Horner evaluation against the direct polynomial
+    C, K = 1 / 20.0, -0.5
+    r2 = r2.detach()
+    direct = C * r2 / (1 + torch.sqrt(1 - (1 + K) * C**2 * r2))
+    direct = direct + 1e-4 * r2**2 - 2e-6 * r2**3 + 3e-8 * r2**4
+    assert torch.allclose(asphere.sag(r2)[0], direct)
+
+
+@pytest.mark.parametrize("K", [-1.0, -0.5, 0.0, 0.8])
+def test_conic_initial_guess(dim: int, K: float) -> None:
+    asphere = tlm.Asphere(10.0, R=-12.0, K=K)
+    P, V = tilted_rays(100, dim, 5.0)
+
+    # The initial guess is the exact intersection with a pure conic
+    t = asphere.initial_guess(P, V)
+    points = P + t.unsqueeze(1) * V
+    f, _ = implicit(asphere, dim)
+    assert torch.allclose(f(points), torch.zeros(100, dtype=torch.float64), atol=1e-10)
+
+
+def test_newton_few_iterations(dim: int) -> None:
+    asphere = tlm.Asphere(10.0, R=15.0, K=-0.7, A=[2e-4, -1e-6])
+    P, V = tilted_rays(200, dim, 5.0)
+
+    t = intersect_newton(
+        asphere,
+        P,
+        V,
+        asphere.initial_guess(P, V),
+        num_iter=asphere.newton_iterations,
+    )
+    points = P + t.unsqueeze(1) * V
+    f, _ = implicit(asphere, dim)
+    assert torch.all(torch.abs(f(points)) < 1e-10)
+
+
+def test_coefficients_mask() -> None:
+    asphere = tlm.Asphere(
+        10.0, R=tlm.parameter(15.0), K=-0.5, A=nn.Parameter(torch.zeros(2))
+    )
+    params = asphere.parameters()
+    assert list(params.keys()) == ["coefficients"]
+    assert params["coefficients"].shape == (4,)
+
+    points = random_points(50, 3, 5.0)
+    asphere.F(points).sum().backward()
+
+    grad = params["coefficients"].grad
+    assert grad is not None
+    assert grad[1] == 0.0
+    assert grad[0] != 0.0 and torch.all(grad[2:] != 0.0)
+
+
+def test_asphere_stack(dim: int) -> None:
+    # In 3D the beam is a square grid, its corners must be within the lens
+    surface = tlm.Asphere(15.0, R=tlm.parameter(30.0), K=-1.2, A=[1e-5])
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(10.0),
+        tlm.Gap(10.0),
+        tlm.BiLens(surface, (1.0, 1.5), outer_thickness=1.0),
+        tlm.Gap(40.0),
+        tlm.FocalPoint(),
+    )
+
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 7}
+    outputs = optics(tlm.default_input(sampling))
+    assert outputs.P.shape[0] == 7 ** (dim - 1)
+
+    outputs.loss.backward()
+    (param,) = list(optics.parameters())
+    assert param.grad is not None and torch.all(torch.isfinite(param.grad))
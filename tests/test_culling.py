@@ -0,0 +1,129 @@
+import pytest
+import typing
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+from torchlensmaker.intersect import bounding_cylinder, intersect
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def random_rays(N: int, dim: int, spread: float) -> tuple[torch.Tensor, torch.Tensor]:
+    "Rays around the origin, in all directions"
+
+    torch.manual_seed(0)
+    P = (torch.rand((N, dim), dtype=torch.float64) * 2 - 1) * spread
+    V = torch.nn.functional.normalize(
+        torch.randn((N, dim), dtype=torch.float64), dim=1
+    )
+    return P, V
+
+
+surfaces = [
+    tlm.Plane(tlm.CircularOutline(10.0), torch.float64),
+    tlm.Parabola(10.0, a=0.05),
+    tlm.Sphere(10.0, 12.0),
+    tlm.Sphere(10.0, -8.0),
+    tlm.Asphere(10.0, R=-15.0, K=-1.2),
+    tlm.PiecewiseLine(10.0, [0.2, -0.1, 0.5]),
+    tlm.BezierSpline.from_parabola(10.0, -0.04, 3),
+    tlm.TabulatedSag([0.0, 1.25, 2.5, 3.75, 5.0], [0.0, 0.1, 0.3, 0.5, 0.8]),
+]
+
+
+@pytest.mark.parametrize("surface", surfaces, ids=lambda s: type(s).__name__)
+def test_same_as_unculled(surface: tlm.LocalSurface, dim: int) -> None:
+    P, V = random_rays(2000, dim, 15.0)
+    transform = tlm.IdentityTransform(dim, torch.float64)
+
+    points, normals, valid = intersect(surface, P, V, transform)
+    t, local_normals, expected_valid = surface.local_collide(P, V)
+
+    assert torch.all(valid == expected_valid)
+    assert torch.allclose(points, (P + t.unsqueeze(1) * V)[valid])
+
+    # intersect() orients normals against the rays
+    expected = torch.nn.functional.normalize(local_normals[valid], dim=1)
+    flip = torch.sum(expected * V[valid], dim=1, keepdim=True) > 0
+    expected = torch.where(flip, -expected, expected)
+    assert torch.allclose(torch.nn.functional.normalize(normals, dim=1), expected)
+
+    # Some rays are culled, none of the colliding ones
+    candidates = bounding_cylinder(surface, P, V)
+    assert candidates is not None
+    assert not torch.all(candidates)
+    assert torch.all(candidates[expected_valid])
+
+
+def test_cylinder_miss(dim: int) -> None:
+    surface = tlm.Sphere(10.0, 12.0)
+    P = torch.zeros((4, dim), dtype=torch.float64)
+    V = torch.zeros((4, dim), dtype=torch.float64)
+
+    # Axial ray, ray parallel to the axis outside of the radius, ray
+    # perpendicular to the axis outside of the slab, and one crossing the slab
+    P[:, 0] = torch.tensor([-5.0, -5.0, 20.0, 0.5], dtype=torch.float64)
+    P[:, 1] = torch.tensor([0.0, 5.5, 0.0, 0.0], dtype=torch.float64)
+    V[:, 0] = torch.tensor([1.0, 1.0, 0.0, 0.0], dtype=torch.float64)
+    V[:, 1] = torch.tensor([0.0, 0.0, 1.0, 1.0], dtype=torch.float64)
+
+    candidates = bounding_cylinder(surface, P, V)
+    assert candidates is not None
+    assert candidates.tolist() == [True, False, False, True]
+
+
+def test_unknown_bounds(dim: int) -> None:
+    surface = tlm.Asphere(10.0, R=20.0, K=-0.5, A=[1e-4])
+    assert surface.bounds_x() is None
+
+    P, V = random_rays(10, dim, 15.0)
+    assert bounding_cylinder(surface, P, V) is None
+
+
+def test_vignetted_stack(dim: int) -> None:
+    # Beam wider than the lens: outer rays are culled by the first surface
+    surface = tlm.Sphere(10.0, tlm.parameter(25.0))
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(30.0),
+        tlm.Gap(5.0),
+        tlm.RefractiveSurface(surface, (1.0, 1.5)),
+        tlm.Gap(40.0),
+        tlm.FocalPoint(),
+    )
+
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 9}
+    outputs = optics(tlm.default_input(sampling))
+    assert 0 < outputs.P.shape[0] < 9 ** (dim - 1)
+
+    outputs.loss.backward()
+    assert surface.K.grad is not None and torch.isfinite(surface.K.grad)
+
+
+def test_nothing_culled(dim: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    surface = tlm.Sphere(10.0, 12.0)
+    transform = tlm.IdentityTransform(dim, torch.float64)
+
+    # Axial rays within the lens radius are all candidates
+    P = torch.zeros((5, dim), dtype=torch.float64)
+    P[:, 0] = -5.0
+    P[:, 1] = torch.linspace(-4.0, 4.0, 5, dtype=torch.float64)
+    V = torch.zeros((5, dim), dtype=torch.float64)
+    V[:, 0] = 1.0
+
+    calls = []
+    local_collide = surface.local_collide
+
+    def spy(P: torch.Tensor, V: torch.Tensor, *args: typing.Any) -> typing.Any:
+        calls.append(P)
+        return local_collide(P, V, *args)
+
+    monkeypatch.setattr(surface, "local_collide", spy)
+    _, _, valid = intersect(surface, P, V, transform)
+    assert torch.all(valid)
+
+    # Collision detection runs on the full batch, without indexing it
+    assert len(calls) == 1 and calls[0] is P
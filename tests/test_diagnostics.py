@@ -0,0 +1,62 @@
+import torch
+import torchlensmaker as tlm
+
+
+def make_rays(Y: list[float]) -> tuple[torch.Tensor, torch.Tensor]:
+    "Rays parallel to the X axis at the given heights"
+
+    N = len(Y)
+    X = torch.full((N,), -10.0, dtype=torch.float64)
+    P = torch.column_stack((X, torch.tensor(Y, dtype=torch.float64)))
+    V = torch.tile(torch.tensor([1.0, 0.0], dtype=torch.float64), (N, 1))
+    return P, V
+
+
+def test_newton_diagnostics() -> None:
+    surface = tlm.Parabola(10.0, 0.05)
+
+    # two rays inside the outline, one outside
+    P, V = make_rays([0.0, 2.0, 8.0])
+
+    with tlm.newton_diagnostics() as diag:
+        _, _, valid = surface.local_collide(P, V)
+
+    summary = diag.summary()
+
+    assert valid.tolist() == [True, True, False]
+    assert summary["calls"] == 1
+    assert summary["rays"] == 3
+    assert summary["failed"] == 0
+    assert summary["missed"] == 1
+    assert sum(summary["iterations_histogram"]) == 3
+    assert sum(summary["residuals_histogram"]) == 3
+
+    # converges well before the maximum number of iterations
+    assert summary["mean_iterations"] < 10
+
+
+def test_newton_diagnostics_failed() -> None:
+    # rays above the sphere don't intersect it
+    surface = tlm.Sphere(10.0, 6.0)
+    P, V = make_rays([0.0, 8.0])
+
+    with tlm.newton_diagnostics() as diag:
+        _, _, valid = surface.local_collide(P, V)
+        _, _, valid = surface.local_collide(P, V)
+
+    summary = diag.summary()
+
+    assert valid.tolist() == [True, False]
+    assert summary["calls"] == 2
+    assert summary["failed"] == 2
+    assert summary["missed"] == 0
+
+
+def test_disabled() -> None:
+    surface = tlm.Parabola(10.0, 0.05)
+    P, V = make_rays([0.0, 2.0])
+
+    diag = tlm.NewtonDiagnostics()
+    surface.local_collide(P, V)
+
+    assert diag.summary()["calls"] == 0
@@ -0,0 +1,64 @@
+import pytest
+import typing
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+from torchlensmaker.testing.benchmarks import stacks
+
+
+@pytest.fixture(params=[torch.float32, torch.float64], ids=["float32", "float64"])
+def dtype(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def aperture_stack() -> nn.Module:
+    return nn.Sequential(
+        tlm.PointSourceAtInfinity(10.0, angle1=2.0, angle2=1.0),
+        tlm.Gap(5.0),
+        tlm.Aperture(8.0),
+        tlm.Gap(5.0),
+        tlm.PlanoLens(tlm.Sphere(10.0, 20.0), (1.0, 1.5), outer_thickness=1.0),
+        tlm.Gap(20.0),
+        tlm.FocalPoint(),
+    )
+
+
+all_stacks = {**stacks, "aperture": aperture_stack}
+
+
+@pytest.mark.parametrize("name", list(all_stacks.keys()))
+def test_stack_dtype(name: str, dtype: torch.dtype, dim: int) -> None:
+    optics = all_stacks[name]()
+    sampling = {"dim": dim, "dtype": dtype, "base": 5}
+    execute_list, outputs = tlm.full_forward(optics, tlm.default_input(sampling))
+
+    for module, _, out in execute_list:
+        assert out.P.dtype == dtype, module
+        assert out.V.dtype == dtype, module
+        assert out.loss.dtype == dtype, module
+        assert all(t.dtype == dtype for t in out.transforms), module
+
+    assert outputs.P.shape[0] > 0
+    assert torch.isfinite(outputs.loss)
+
+    if outputs.loss.requires_grad:
+        outputs.loss.backward()
+
+
+def test_refraction_dtype(dtype: torch.dtype, dim: int) -> None:
+    rays = torch.nn.functional.normalize(torch.rand((10, dim), dtype=dtype), dim=1)
+    normals = -rays
+
+    assert tlm.refraction(rays, normals, 1.0, 1.5).dtype == dtype
+    assert tlm.reflection(rays, normals).dtype == dtype
+
+
+def test_parameter_dtype(dtype: torch.dtype) -> None:
+    assert tlm.parameter(1.0, dtype=dtype).dtype == dtype
+    assert tlm.parameter(1.0).dtype == torch.float64
@@ -0,0 +1,102 @@
+import pytest
+import os
+import typing
+import torch.nn as nn
+
+import torchlensmaker as tlm
+
+pytest.importorskip("build123d")
+
+from torchlensmaker.export_build123d import (
+    export_all_step,
+    export_assembly,
+    lens_cache_key,
+)
+
+
+def biconvex(R: float) -> tlm.Lens:
+    return tlm.Lens(
+        tlm.Sphere(15.0, R), tlm.Sphere(15.0, -R), (1.0, 1.5), inner_thickness=4.0
+    )
+
+
+def test_cache_key() -> None:
+    assert lens_cache_key(biconvex(30.0)) == lens_cache_key(biconvex(30.0))
+    assert lens_cache_key(biconvex(30.0)) != lens_cache_key(biconvex(25.0))
+
+    # Parameters are hashed by value
+    lens = biconvex(30.0)
+    lens.surface1.surface.K = tlm.parameter(lens.surface1.surface.K)
+    assert lens_cache_key(lens) == lens_cache_key(biconvex(30.0))
+
+
+def test_cache_key_zernike() -> None:
+    def zernike_lens(coefficients: list[float]) -> tlm.Lens:
+        surface = tlm.ZernikeSurface(15.0, R=30.0, zernike=coefficients)
+        plane = tlm.CircularPlane(15.0)
+        return tlm.Lens(surface, plane, (1.0, 1.5), inner_thickness=4.0)
+
+    # Basis object and sample grid cache are not JSON serializable
+    lens = zernike_lens([0.0, 0.0, 0.0, 0.01])
+    lens.surface1.surface.samples2D(10)
+    assert lens_cache_key(lens) == lens_cache_key(zernike_lens([0.0, 0.0, 0.0, 0.01]))
+    assert lens_cache_key(lens) != lens_cache_key(zernike_lens([0.0, 0.0, 0.0, 0.02]))
+
+
+def test_export_all_step(tmp_path: str) -> None:
+    optics = nn.Sequential(
+        biconvex(30.0),
+        tlm.Gap(10.0),
+        biconvex(30.0),
+        tlm.Gap(10.0),
+        biconvex(25.0),
+    )
+
+    output, cache = os.path.join(tmp_path, "output"), os.path.join(tmp_path, "cache")
+    os.makedirs(output)
+    export_all_step(optics, output, cache_dir=cache, max_workers=1)
+
+    assert sorted(os.listdir(output)) == ["lens0.step", "lens2.step", "lens4.step"]
+
+    # Identical lenses are built once
+    assert sorted(os.listdir(cache)) == sorted(
+        {f"{lens_cache_key(optics[j])}.step" for j in (0, 4)}
+    )
+
+    # Cached lenses are not rebuilt
+    mtimes = {f: os.path.getmtime(os.path.join(cache, f)) for f in os.listdir(cache)}
+    export_all_step(optics, output, cache_dir=cache, max_workers=1)
+    assert mtimes == {
+        f: os.path.getmtime(os.path.join(cache, f)) for f in os.listdir(cache)
+    }
+
+
+def test_export_assembly(tmp_path: str) -> None:
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(8.0),
+        tlm.Gap(5.0),
+        biconvex(30.0),
+        tlm.Gap(10.0),
+        tlm.Aperture(8.0),
+        tlm.Gap(20.0),
+        tlm.ReflectiveSurface(tlm.Parabola(20.0, a=-0.025)),
+    )
+
+    path = os.path.join(tmp_path, "stack.step")
+    assembly = export_assembly(optics, path)
+    assert os.path.getsize(path) > 0
+
+    lens, aperture, mirror = assembly.children
+    assert [c.label for c in assembly.children] == ["lens0", "aperture1", "mirror2"]
+
+    # Elements are placed at their absolute position along the optical axis
+    def extent(part: typing.Any) -> tuple[float, float]:
+        box = part.bounding_box()
+        return box.min.X, box.max.X
+
+    assert extent(lens) == pytest.approx((5.0, 9.0), abs=1e-3)
+    assert extent(aperture) == pytest.approx((19.0, 19.0), abs=1e-3)
+    assert extent(mirror) == pytest.approx((36.5, 39.0), abs=1e-3)
+
+    with pytest.raises(ValueError):
+        export_assembly(optics, os.path.join(tmp_path, "stack.obj"))
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+
+
+def run_python(code: str) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+def test_import_core_is_fast() -> None:
+    # Import torch first because it's a hard dependency, we only time tlm itself
+    code = """
+import time
+import torch
+start = time.perf_counter()
+import torchlensmaker
+print(time.perf_counter() - start)
+"""
+
+    elapsed = float(run_python(code))
+    assert elapsed < 0.5, f"import torchlensmaker took {elapsed:.3f}s"
+
+
+def test_heavy_dependencies_not_imported() -> None:
+    code = """
+import sys
+import torchlensmaker
+print(",".join(m for m in ["build123d", "IPython", "matplotlib"] if m in sys.modules))
+"""
+
+    assert run_python(code) == ""
+
+
+def test_lazy_attributes() -> None:
+    code = """
+import torchlensmaker as tlm
+print(callable(tlm.optimize), callable(tlm.show), "export" in dir(tlm))
+"""
+
+    assert run_python(code) == "True True True"
+
+
+def test_optimize_after_submodule_import() -> None:
+    # Importing the optimize submodule must not shadow the optimize function
+    code = """
+import torchlensmaker as tlm
+import torchlensmaker.optimize
+from torchlensmaker.optimize import OptimizationRecord
+print(callable(tlm.optimize))
+"""
+
+    assert run_python(code) == "True"
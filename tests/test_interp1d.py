@@ -1,6 +1,13 @@
+import pytest
 import numpy as np
 import torch
-from torchlensmaker.interp1d import interp1d
+import torchlensmaker.interp1d
+from torchlensmaker.interp1d import (
+    Interp1D,
+    interp1d,
+    cubic_spline_coefficients,
+    interp_cubic_uniform,
+)
 
 
 def test_grad() -> None:
@@ -27,3 +34,128 @@ def test_equals_numpy() -> None:
     newY_numpy = np.interp(newX, X, Y)
 
     assert np.allclose(newY_numpy, newY.numpy())
+
+
+def test_cubic_spline_uniform() -> None:
+    h = 0.1
+    X = torch.arange(21, dtype=torch.float64) * h
+    Y = torch.cos(X)
+    coefficients = cubic_spline_coefficients(Y, h)
+
+    # Interpolates the samples, with zero slope at the start
+    values, derivatives = interp_cubic_uniform(0.0, h, coefficients, X)
+    assert torch.allclose(values, Y)
+    assert torch.allclose(derivatives[0], torch.zeros_like(derivatives[0]), atol=1e-12)
+
+    # C1 continuity at the samples
+    eps = 1e-9
+    before, d_before = interp_cubic_uniform(0.0, h, coefficients, X[1:-1] - eps)
+    after, d_after = interp_cubic_uniform(0.0, h, coefficients, X[1:-1] + eps)
+    assert torch.allclose(before, after)
+    assert torch.allclose(d_before, d_after, atol=1e-6)
+
+    # Close to the function in the interior, derivative matches autograd
+    newX = torch.linspace(0.0, 1.5, 101, dtype=torch.float64, requires_grad=True)
+    values, derivatives = interp_cubic_uniform(0.0, h, coefficients, newX)
+    assert torch.allclose(values, torch.cos(newX), atol=1e-5)
+    (grad,) = torch.autograd.grad(values.sum(), newX)
+    assert torch.allclose(derivatives, grad)
+
+
+@pytest.mark.parametrize("N", [2, 3, 50])
+def test_cubic_spline_dense_solve(N: int) -> None:
+    torch.manual_seed(0)
+    h = 0.5
+    Y = torch.rand(N, dtype=torch.float64, requires_grad=True)
+
+    # Reference coefficients from the dense tridiagonal system
+    A = torch.zeros((N, N), dtype=torch.float64)
+    A[0, :2] = torch.tensor([2.0, 1.0], dtype=torch.float64)
+    for i in range(1, N - 1):
+        A[i, i - 1 : i + 2] = torch.tensor([1.0, 4.0, 1.0], dtype=torch.float64)
+    A[N - 1, N - 1] = 1.0
+    b = torch.cat(
+        (
+            (6 * (Y[1] - Y[0]) / h**2).reshape(1),
+            6 * (Y[:-2] - 2 * Y[1:-1] + Y[2:]) / h**2,
+            torch.zeros(1, dtype=torch.float64),
+        )
+    )
+    M = torch.linalg.solve(A, b)
+    expected = torch.stack(
+        (
+            Y[:-1],
+            torch.diff(Y) - h**2 / 6 * (2 * M[:-1] + M[1:]),
+            h**2 / 2 * M[:-1],
+            h**2 / 6 * torch.diff(M),
+        ),
+        dim=1,
+    )
+
+    coefficients = cubic_spline_coefficients(Y, h)
+    assert torch.allclose(coefficients, expected)
+
+    # Same gradients with respect to the samples
+    weights = torch.rand(coefficients.shape, dtype=torch.float64)
+    (grad,) = torch.autograd.grad((coefficients * weights).sum(), Y)
+    (expected_grad,) = torch.autograd.grad((expected * weights).sum(), Y)
+    assert torch.allclose(grad, expected_grad)
+
+
+def test_cubic_spline_large() -> None:
+    # Linear time and memory in the number of samples, a dense solve would
+    # need terabytes
+    N, h = 1_000_001, 1e-3
+    X = torch.arange(N, dtype=torch.float64) * h
+    Y = torch.cos(X)
+    coefficients = cubic_spline_coefficients(Y, h)
+
+    # Second derivatives at the samples solve the tridiagonal system
+    M = torch.cat((2 * coefficients[:, 2] / h**2, torch.zeros(1, dtype=X.dtype)))
+    b = 6 * (Y[:-2] - 2 * Y[1:-1] + Y[2:]) / h**2
+    assert torch.allclose(M[:-2] + 4 * M[1:-1] + M[2:], b)
+    assert torch.allclose(2 * M[0] + M[1], 6 * (Y[1] - Y[0]) / h**2)
+
+    # and approximate the second derivative of cos, away from the natural end
+    assert torch.allclose(M[:-10], -torch.cos(X[:-10]), atol=1e-4)
+
+
+def test_interp1d_batched() -> None:
+    X = torch.tensor([0.0, 1.0, 3.0, 4.0], dtype=torch.float64)
+    Y = torch.rand((5, 4), dtype=torch.float64)
+    newX = torch.linspace(0.0, 4.0, 17, dtype=torch.float64)
+
+    interp = Interp1D(X, Y)
+    assert not interp.uniform
+
+    values = interp(newX)
+    assert values.shape == (5, 17)
+    for curve, expected in zip(Y, values):
+        assert np.allclose(np.interp(newX, X, curve), expected.numpy())
+
+
+def test_interp1d_uniform() -> None:
+    X = torch.linspace(-2.0, 3.0, 11, dtype=torch.float64)
+    Y = torch.rand((3, 11), dtype=torch.float64)
+    newX = torch.cat((X, torch.rand(50, dtype=torch.float64) * 5 - 2))
+
+    uniform = Interp1D(X, Y)
+    assert uniform.uniform
+    searched = Interp1D(X, Y, uniform=False)
+
+    assert torch.equal(uniform.indices(newX), searched.indices(newX))
+    assert torch.allclose(uniform(newX), searched(newX))
+    assert torch.allclose(uniform(X), Y)
+
+
+def test_interp1d_bounds(monkeypatch: pytest.MonkeyPatch) -> None:
+    X = torch.tensor([0.0, 10.0, 20.0])
+    Y = torch.tensor([0.0, -2.0, -3.0])
+    outside = torch.tensor([-10.0, 30.0])
+
+    # Linear extrapolation by default
+    assert torch.allclose(Interp1D(X, Y)(outside), torch.tensor([2.0, -4.0]))
+
+    monkeypatch.setattr(torchlensmaker.interp1d, "debug", True)
+    with pytest.raises(AssertionError):
+        Interp1D(X, Y)(outside)
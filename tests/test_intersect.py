@@ -0,0 +1,70 @@
+import pytest
+import typing
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+from torchlensmaker.testing.rays import tilted_rays
+from torchlensmaker.surfaces import intersect_newton
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def test_mixed_precision_newton(dim: int) -> None:
+    torch.manual_seed(0)
+
+    # high curvature sphere
+    K = nn.Parameter(torch.tensor(1 / 6.0, dtype=torch.float64))
+    surface = tlm.Sphere(10.0, 6.0)
+    surface.K = K
+
+    P, V = tilted_rays(1000, dim, 4.0)
+    init_t = -P[:, 0] / V[:, 0]
+
+    t64 = intersect_newton(surface, P, V, init_t)
+    (grad64,) = torch.autograd.grad(t64.sum(), K)
+
+    tmixed = intersect_newton(surface, P, V, init_t, newton_dtype=torch.float32)
+    (grad_mixed,) = torch.autograd.grad(tmixed.sum(), K)
+
+    assert tmixed.dtype == torch.float64
+    assert torch.allclose(tmixed, t64, rtol=0.0, atol=1e-10)
+    assert torch.allclose(grad_mixed, grad64, rtol=1e-8)
+
+
+def test_mixed_precision_stack(dim: int) -> None:
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(9.0),
+        tlm.Gap(5.0),
+        tlm.BiLens(tlm.Sphere(10.0, 6.0), (1.0, 1.5), outer_thickness=0.5),
+        tlm.Gap(10.0),
+        tlm.FocalPoint(),
+    )
+
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 10}
+    outputs64 = optics(tlm.default_input(sampling))
+    outputs_mixed = optics(
+        tlm.default_input({**sampling, "newton_dtype": torch.float32})
+    )
+
+    assert outputs_mixed.P.dtype == torch.float64
+    assert torch.allclose(outputs_mixed.P, outputs64.P, rtol=0.0, atol=1e-10)
+    assert torch.allclose(outputs_mixed.V, outputs64.V, rtol=0.0, atol=1e-10)
+    assert torch.allclose(outputs_mixed.loss, outputs64.loss, rtol=1e-10)
+
+
+def test_unit_normals(dim: int) -> None:
+    P, V = tilted_rays(100, dim, 8.0)
+    transform = tlm.IdentityTransform(dim, torch.float64)
+
+    for surface in (
+        tlm.Parabola(10.0, a=0.05),
+        tlm.Sphere(10.0, 15.0),
+    ):
+        _, normals, valid = tlm.intersect(surface, P, V, transform)
+        assert torch.all(valid)
+        norms = torch.linalg.vector_norm(normals, dim=1)
+        assert torch.allclose(norms, torch.ones_like(norms))
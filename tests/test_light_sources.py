@@ -0,0 +1,150 @@
+import pytest
+import typing
+import math
+from dataclasses import replace
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def sampling(dim: int, **kwargs: typing.Any) -> dict[str, typing.Any]:
+    return {"dim": dim, "dtype": torch.float64, "base": 5, **kwargs}
+
+
+def test_object_at_infinity_batch(dim: int) -> None:
+    source = tlm.ObjectAtInfinity(beam_diameter=10.0, angular_size=20.0)
+    outputs = source(tlm.default_input(sampling(dim, object=4)))
+
+    num_pupil = 5 ** (dim - 1)
+    num_field = 4 ** (dim - 1)
+    N = num_field * num_pupil
+
+    assert outputs.P.shape == outputs.V.shape == (N, dim)
+    assert outputs.coord_object.shape == (N, dim - 1)
+    assert torch.allclose(
+        torch.linalg.vector_norm(outputs.V, dim=1), torch.ones(N, dtype=torch.float64)
+    )
+
+    # Rays of each field point are parallel, with the field angle
+    V = outputs.V.reshape(num_field, num_pupil, dim)
+    assert torch.allclose(V, V[:, :1, :].expand_as(V))
+
+    coord = outputs.coord_object.reshape(num_field, num_pupil, dim - 1)
+    tangent = V[:, 0, 1:] / V[:, 0, :1]
+    assert torch.allclose(tangent, math.tan(math.radians(10.0)) * coord[:, 0, :])
+
+
+def test_point_source_at_infinity_is_object_center(dim: int) -> None:
+    source = tlm.PointSourceAtInfinity(10.0, angle1=5.0, angle2=3.0)
+    obj = tlm.ObjectAtInfinity(10.0, 0.0, angle1=5.0, angle2=3.0)
+
+    A = source(tlm.default_input(sampling(dim)))
+    B = obj(tlm.default_input(sampling(dim, object=1)))
+
+    assert torch.allclose(A.P, B.P)
+    assert torch.allclose(A.V, B.V)
+    assert torch.all(A.coord_object == 0)
+
+
+def test_object(dim: int) -> None:
+    source = tlm.Object(beam_angle=30.0, diameter=4.0, height=1.0)
+    outputs = source(tlm.default_input(sampling(dim, object=3)))
+
+    num_pupil = 5 ** (dim - 1)
+    N = 3 ** (dim - 1) * num_pupil
+    assert outputs.P.shape == (N, dim)
+
+    # Each field point emits all its rays from the same origin
+    P = outputs.P.reshape(-1, num_pupil, dim)
+    assert torch.allclose(P, P[:, :1, :].expand_as(P))
+
+    # Origins are at the object coordinates
+    expected = 2.0 * outputs.coord_object
+    expected[:, 0] += 1.0
+    assert torch.allclose(outputs.P[:, 1:], expected)
+
+    # Rays stay within the beam cone
+    angle = torch.acos(outputs.V[:, 0])
+    assert torch.all(angle <= math.radians(15.0) * math.sqrt(2) + 1e-9)
+
+
+def test_point_source(dim: int) -> None:
+    source = tlm.PointSource(beam_angle=20.0, height=2.0)
+    outputs = source(tlm.default_input(sampling(dim)))
+
+    assert outputs.P.shape[0] == 5 ** (dim - 1)
+    assert torch.all(outputs.P[:, 1] == 2.0)
+    assert torch.all(outputs.coord_object == 0)
+
+
+def test_sources_concatenate(dim: int) -> None:
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(10.0),
+        tlm.ObjectAtInfinity(10.0, 5.0),
+    )
+    outputs = optics(tlm.default_input(sampling(dim, object=2)))
+
+    N = 5 ** (dim - 1) + 2 ** (dim - 1) * 5 ** (dim - 1)
+    assert outputs.P.shape[0] == outputs.coord_object.shape[0] == N
+
+
+def test_coord_object_follows_valid_rays(dim: int) -> None:
+    optics = nn.Sequential(
+        tlm.ObjectAtInfinity(20.0, 10.0),
+        tlm.Gap(5.0),
+        tlm.Aperture(8.0),
+    )
+    outputs = optics(tlm.default_input(sampling(dim, object=3)))
+
+    assert outputs.blocked is not None
+    assert torch.any(outputs.blocked)
+    assert outputs.coord_object.shape[0] == outputs.P.shape[0]
+
+
+def test_image_plane_magnification(dim: int) -> None:
+    # Rays from a finite object propagated to a plane without any lens form
+    # a perfect image only through a pinhole
+    optics = nn.Sequential(
+        tlm.Object(beam_angle=0.0, diameter=4.0),
+        tlm.Gap(10.0),
+        tlm.ImagePlane(),
+    )
+    outputs = optics(tlm.default_input(sampling(dim, object=3)))
+    assert outputs.loss.item() == pytest.approx(0.0, abs=1e-12)
+
+    optics[-1] = tlm.ImagePlane(magnification=1.0)
+    outputs = optics(tlm.default_input(sampling(dim, object=3)))
+    assert outputs.loss.item() > 0.0
+
+
+def test_image_plane_rotated_frame(dim: int) -> None:
+    # Chain target at (5, 5) rotated by 90 degrees, so that the image plane
+    # is perpendicular to the global Y axis and its local Y axis is -X
+    T = torch.zeros((dim,), dtype=torch.float64)
+    T[:2] = 5.0
+    A = torch.eye(dim, dtype=torch.float64)
+    A[:2, :2] = torch.tensor([[0.0, -1.0], [1.0, 0.0]], dtype=torch.float64)
+
+    coords = torch.tensor([[-2.0, 0.5], [0.0, 0.0], [1.0, -3.0]], dtype=torch.float64)
+    coords = coords[:, : dim - 1]
+    P = torch.zeros((3, dim), dtype=torch.float64)
+    P[:, 0] = 5.0 - coords[:, 0]
+    P[:, 2:] = coords[:, 1:]
+    V = torch.zeros((3, dim), dtype=torch.float64)
+    V[:, :2] = torch.tensor([0.0, 1.0], dtype=torch.float64)
+
+    inputs = tlm.default_input(sampling(dim))
+    inputs = replace(
+        inputs,
+        transforms=inputs.transforms
+        + [tlm.TranslateTransform(T), tlm.LinearTransform(A, A.T)],
+        P=P,
+        V=V,
+    )
+    assert torch.allclose(tlm.ImagePlane().image_coordinates(inputs), coords)
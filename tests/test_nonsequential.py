@@ -0,0 +1,226 @@
+import pytest
+import typing
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+from torchlensmaker.nonsequential import BVH, ray_box
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def translate(x: float, dim: int) -> tlm.TranslateTransform:
+    T = torch.zeros((dim,), dtype=torch.float64)
+    T[0] = x
+    return tlm.TranslateTransform(T)
+
+
+def singlet(surface: tlm.LocalSurface) -> nn.Sequential:
+    return nn.Sequential(
+        tlm.PointSourceAtInfinity(10.0),
+        tlm.Gap(5.0),
+        tlm.RefractiveSurface(surface, (1.0, 1.5)),
+        tlm.Gap(3.0),
+        tlm.RefractiveSurface(tlm.Sphere(15.0, -30.0), (1.5, 1.0)),
+        tlm.Gap(40.0),
+        tlm.FocalPoint(),
+    )
+
+
+def test_bvh_candidates(dim: int) -> None:
+    torch.manual_seed(0)
+    M, N = 13, 500
+    lower = torch.rand((M, dim), dtype=torch.float64) * 20 - 10
+    upper = lower + torch.rand((M, dim), dtype=torch.float64) * 5
+    lower[3] = -torch.inf
+    upper[3] = torch.inf
+
+    P = torch.rand((N, dim), dtype=torch.float64) * 30 - 15
+    V = torch.nn.functional.normalize(torch.randn((N, dim), dtype=torch.float64))
+    V[:10, 1:] = 0.0
+
+    rays, boxes = BVH(lower, upper).candidates(P, V)
+
+    # Same pairs as testing all boxes
+    R, B = torch.meshgrid(torch.arange(N), torch.arange(M), indexing="ij")
+    R, B = R.flatten(), B.flatten()
+    hit = ray_box(P[R], V[R], lower[B], upper[B])
+    assert sorted(zip(rays.tolist(), boxes.tolist())) == sorted(
+        zip(R[hit].tolist(), B[hit].tolist())
+    )
+
+
+def test_singlet_matches_sequential(dim: int) -> None:
+    optics = singlet(tlm.Sphere(15.0, 30.0))
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 7}
+
+    inputs = optics[0](tlm.default_input(sampling))
+    outputs = optics(tlm.default_input(sampling))
+
+    scene = tlm.Scene.from_sequential(optics, sampling)
+    assert len(scene) == 2
+
+    segments = scene.trace(inputs.P, inputs.V, max_bounces=5)
+    assert [s.surface.tolist() for s in segments] == [
+        [0] * inputs.P.shape[0],
+        [1] * inputs.P.shape[0],
+        [-1] * inputs.P.shape[0],
+    ]
+
+    # Refraction at the first surface uses the unit normals of the sphere, of
+    # center X=35 and radius 30
+    center = torch.zeros((dim,), dtype=torch.float64)
+    center[0] = 35.0
+    normals = (segments[1].P - center) / 30.0
+    expected = tlm.refraction(inputs.V, normals, 1.0, 1.5)
+    assert torch.allclose(segments[1].V, expected)
+
+    escaped = segments[-1]
+    assert torch.equal(escaped.source, torch.arange(inputs.P.shape[0]))
+    assert torch.allclose(escaped.P, outputs.P)
+    assert torch.allclose(escaped.V, outputs.V)
+
+
+def test_parabolic_mirror(dim: int) -> None:
+    # Concave mirror facing the source, with its focus at the origin. In 3D
+    # the beam is a square grid, its corners must be within the mirror.
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(10.0),
+        tlm.Gap(10.0),
+        tlm.ReflectiveSurface(tlm.Parabola(20.0, a=-0.025)),
+    )
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 9}
+    inputs = optics[0](tlm.default_input(sampling))
+
+    scene = tlm.Scene.from_sequential(optics, sampling)
+    segments = scene.trace(inputs.P, inputs.V, max_bounces=3)
+
+    # Reflected rays don't hit the mirror again
+    assert len(segments) == 2
+    assert torch.all(segments[0].surface == 0)
+    assert torch.all(segments[1].escaped())
+
+    P, V = segments[1].P, segments[1].V
+    t = -torch.sum(P * V, dim=1)
+    closest = P + t.unsqueeze(1) * V
+    assert torch.allclose(closest, torch.zeros_like(closest), atol=1e-9)
+
+
+def test_parallel_mirrors(dim: int) -> None:
+    mirrors = [tlm.ReflectiveSurface(tlm.CircularPlane(100.0)) for _ in range(2)]
+    scene = tlm.Scene(mirrors, [translate(0.0, dim), translate(10.0, dim)])
+
+    P = torch.zeros((1, dim), dtype=torch.float64)
+    P[0, 0] = 5.0
+    V = torch.zeros((1, dim), dtype=torch.float64)
+    V[0, :2] = torch.tensor([0.8, 0.6], dtype=torch.float64)
+
+    segments = scene.trace(P, V, max_bounces=4)
+    assert [s.surface.item() for s in segments] == [1, 0, 1, 0, 1]
+    assert torch.allclose(segments[0].t, torch.tensor([6.25], dtype=torch.float64))
+    for s in segments[1:]:
+        assert torch.allclose(s.t, torch.tensor([12.5], dtype=torch.float64))
+
+    # Ray climbs up by 7.5 between mirrors
+    Y = torch.cat([s.P[:, 1] for s in segments[1:]])
+    assert torch.allclose(torch.diff(Y), torch.full((3,), 7.5, dtype=torch.float64))
+
+
+def test_escape(dim: int) -> None:
+    optics = singlet(tlm.Sphere(15.0, 30.0))
+    scene = tlm.Scene.from_sequential(optics, {"dim": dim, "dtype": torch.float64})
+
+    # Rays going away from the lens
+    P = torch.zeros((5, dim), dtype=torch.float64)
+    V = torch.zeros((5, dim), dtype=torch.float64)
+    V[:, 0] = -1.0
+
+    segments = scene.trace(P, V, max_bounces=3)
+    assert len(segments) == 1
+    assert torch.all(segments[0].escaped())
+    assert torch.all(torch.isinf(segments[0].t))
+
+
+def test_gradient(dim: int) -> None:
+    surface = tlm.Sphere(15.0, tlm.parameter(30.0))
+    optics = singlet(surface)
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+    inputs = optics[0](tlm.default_input(sampling))
+
+    scene = tlm.Scene.from_sequential(optics, sampling)
+    escaped = scene.trace(inputs.P, inputs.V, max_bounces=2)[-1]
+
+    loss = torch.sum(escaped.V[:, 1:] ** 2)
+    loss.backward()
+    assert surface.K.grad is not None
+    assert torch.isfinite(surface.K.grad) and surface.K.grad != 0
+
+
+def test_split_energy(dim: int) -> None:
+    optics = singlet(tlm.Sphere(15.0, 30.0))
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+    inputs = optics[0](tlm.default_input(sampling))
+    N = inputs.P.shape[0]
+
+    scene = tlm.Scene.from_sequential(optics, sampling)
+    segments = scene.trace(inputs.P, inputs.V, max_bounces=6, split=True, threshold=0)
+
+    # Without pruning, energy of escaped and truncated rays is conserved
+    escaped = sum(torch.sum(s.weight[s.escaped()]) for s in segments)
+    truncated = torch.sum(segments[-1].weight[~segments[-1].escaped()])
+    assert torch.allclose(escaped + truncated, torch.tensor(N, dtype=torch.float64))
+
+    # Primary path is weighted by the transmittance of both surfaces, about
+    # 0.96 each near normal incidence
+    primary = segments[2]
+    mask = primary.escaped() & (primary.reflections == 0)
+    assert torch.equal(primary.source[mask], torch.arange(N))
+    assert torch.allclose(primary.P[mask], scene.trace(inputs.P, inputs.V, 2)[2].P)
+    assert torch.all((primary.weight[mask] > 0.9) & (primary.weight[mask] < 0.93))
+
+    # Ghosts of second order leave the lens forward
+    ghosts = [s for s in segments if torch.any(s.escaped() & (s.reflections == 2))]
+    assert len(ghosts) > 0
+    for s in ghosts:
+        assert torch.all(s.V[s.escaped() & (s.reflections == 2), 0] > 0)
+
+
+def test_split_pruning(dim: int) -> None:
+    optics = singlet(tlm.Sphere(15.0, 30.0))
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+
+    # Narrow beam: ghosts of the full beam corners in 3D hit the front surface
+    # past the critical angle, and total internal reflection keeps their weight
+    inputs = tlm.PointSourceAtInfinity(6.0)(tlm.default_input(sampling))
+    N = inputs.P.shape[0]
+
+    scene = tlm.Scene.from_sequential(optics, sampling)
+
+    # Second order ghosts have a weight of about 0.04^2
+    segments = scene.trace(
+        inputs.P, inputs.V, max_bounces=10, split=True, threshold=1e-2
+    )
+    assert all(torch.all(s.reflections <= 1) for s in segments)
+    assert all(torch.all(s.weight > 1e-2) for s in segments)
+    assert all(s.P.shape[0] <= 2 * N for s in segments)
+    assert torch.all(segments[-1].escaped())
+
+
+def test_split_gradient(dim: int) -> None:
+    surface = tlm.Sphere(15.0, tlm.parameter(30.0))
+    optics = singlet(surface)
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+    inputs = optics[0](tlm.default_input(sampling))
+
+    scene = tlm.Scene.from_sequential(optics, sampling)
+    segments = scene.trace(inputs.P, inputs.V, max_bounces=4, split=True)
+
+    # Energy of the ghost reflected back by the first surface
+    first = segments[1]
+    loss = torch.sum(first.weight[first.escaped() & (first.reflections == 1)])
+    loss.backward()
+    assert surface.K.grad is not None
+    assert torch.isfinite(surface.K.grad) and surface.K.grad != 0
@@ -0,0 +1,65 @@
+import torch
+import torch.nn as nn
+import torchlensmaker as tlm
+
+from torchlensmaker.tensorframe import TensorFrame
+from torchlensmaker.persistence import (
+    save_tensorframe,
+    load_tensorframe,
+    save_trace,
+    load_trace,
+)
+
+
+def test_tensorframe_roundtrip(tmp_path) -> None:  # type: ignore
+    tf = TensorFrame(torch.rand((100, 3), dtype=torch.float64), ["a", "b", "c"])
+    save_tensorframe(tf, str(tmp_path / "tf"))
+
+    loaded = load_tensorframe(str(tmp_path / "tf"))
+
+    assert loaded.columns == tf.columns
+    assert loaded.shape == tf.shape
+    assert loaded.data.dtype == torch.float64
+    assert torch.equal(loaded.data, tf.data)
+    assert torch.equal(loaded.get("b"), tf.get("b"))
+
+
+def test_tensorframe_empty(tmp_path) -> None:  # type: ignore
+    tf = TensorFrame(torch.empty((0, 2)), ["a", "b"])
+    save_tensorframe(tf, str(tmp_path / "tf"))
+
+    loaded = load_tensorframe(str(tmp_path / "tf"))
+    assert loaded.shape == (0, 2)
+
+
+def test_trace_roundtrip(tmp_path) -> None:  # type: ignore
+    optics = nn.Sequential(
+        tlm.ObjectAtInfinity(10.0, 5.0),
+        tlm.Gap(5.0),
+        tlm.Aperture(6.0),
+        tlm.Gap(5.0),
+        tlm.RefractiveSurface(tlm.Sphere(15.0, 30.0), (1.0, 1.5)),
+        tlm.Gap(10.0),
+        tlm.FocalPoint(),
+    )
+
+    sampling = {"dim": 2, "dtype": torch.float64, "base": 10}
+    execute_list, _ = tlm.full_forward(optics, tlm.default_input(sampling))
+
+    save_trace(optics, execute_list, str(tmp_path / "trace"))
+    steps = load_trace(str(tmp_path / "trace"))
+
+    assert len(steps) == len(execute_list)
+    for step, context in zip(steps, execute_list):
+        assert step.module_type == type(context.module).__name__
+        assert torch.equal(step.rays.get(["PX", "PY"]), context.outputs.P)
+        assert torch.equal(step.rays.get(["VX", "VY"]), context.outputs.V)
+        assert torch.equal(step.rays.get(["OY"]), context.outputs.coord_object)
+        if context.outputs.blocked is None:
+            assert step.blocked is None
+        else:
+            assert step.blocked is not None
+            assert torch.equal(step.blocked, context.outputs.blocked)
+
+    assert steps[2].name == "2"
+    assert steps[-1].name == ""
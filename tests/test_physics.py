@@ -0,0 +1,195 @@
+import pytest
+import typing
+import torch
+from torch.nn.functional import normalize
+
+import torchlensmaker as tlm
+from torchlensmaker.testing.physics_reference import (
+    reference_reflection,
+    reference_refraction,
+)
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def make_rays_normals(N: int, dim: int) -> tuple[torch.Tensor, torch.Tensor]:
+    "Random unit incident rays, and unit normals facing against them"
+
+    torch.manual_seed(0)
+    rays = normalize(torch.rand((N, dim), dtype=torch.float64) + 0.5, dim=1)
+    normals = -normalize(
+        rays + 0.8 * torch.randn((N, dim), dtype=torch.float64), dim=1
+    )
+
+    # Keep normals facing against the rays
+    flip = torch.sum(rays * normals, dim=1) > 0
+    normals[flip] = -normals[flip]
+    return rays, normals
+
+
+def values_and_grads(
+    function: typing.Callable[..., torch.Tensor], *args: torch.Tensor
+) -> tuple[torch.Tensor, list[typing.Optional[torch.Tensor]]]:
+    inputs = [a.clone().requires_grad_(True) for a in args]
+    output = function(*inputs)
+    weights = torch.linspace(-1.0, 2.0, output.numel(), dtype=output.dtype)
+    (output * weights.reshape(output.shape)).sum().backward()
+    return output.detach(), [i.grad for i in inputs]
+
+
+def test_reflection(dim: int) -> None:
+    rays, normals = make_rays_normals(100, dim)
+
+    value, grads = values_and_grads(tlm.reflection, rays, normals)
+    ref_value, ref_grads = values_and_grads(reference_reflection, rays, normals)
+
+    assert torch.allclose(value, ref_value)
+    for g, ref in zip(grads, ref_grads):
+        assert torch.allclose(g, ref)
+
+
+@pytest.mark.parametrize("critical_angle", ["nan", "clamp", "drop", "reflect"])
+def test_refraction(dim: int, critical_angle: str) -> None:
+    rays, normals = make_rays_normals(100, dim)
+
+    # Tensor indices, to also check their gradient
+    n1 = torch.full((100,), 1.5, dtype=torch.float64)
+    n2 = torch.tensor(1.0, dtype=torch.float64)
+
+    def refraction(*args: torch.Tensor) -> torch.Tensor:
+        return tlm.refraction(*args, critical_angle=critical_angle)
+
+    def reference(*args: torch.Tensor) -> torch.Tensor:
+        return reference_refraction(*args, critical_angle=critical_angle)
+
+    value, grads = values_and_grads(refraction, rays, normals, n1, n2)
+    ref_value, ref_grads = values_and_grads(reference, rays, normals, n1, n2)
+
+    # Some rays must be beyond the critical angle for this test to be useful
+    valid = 1 - 1.5**2 * (1 - torch.sum(rays * normals, dim=1) ** 2) >= 0
+    assert not torch.all(valid)
+
+    assert value.shape == ref_value.shape
+    assert torch.allclose(value, ref_value, equal_nan=True)
+
+    if critical_angle == "nan":
+        # Gradients beyond the critical angle are nan, compare the others
+        for g, ref in zip(grads[:2], ref_grads[:2]):
+            assert torch.allclose(g[valid], ref[valid])
+    elif critical_angle == "reflect":
+        # The reference has nan gradients beyond the critical angle
+        for g, ref in zip(grads[:2], ref_grads[:2]):
+            assert torch.allclose(g[valid], ref[valid])
+            assert torch.all(torch.isfinite(g))
+    else:
+        for g, ref in zip(grads, ref_grads):
+            assert torch.allclose(g, ref)
+
+
+def test_refraction_float_indices(dim: int) -> None:
+    rays, normals = make_rays_normals(50, dim)
+    A = tlm.refraction(rays, normals, 1.0, 1.5, critical_angle="clamp")
+    B = reference_refraction(rays, normals, 1.0, 1.5, critical_angle="clamp")
+    assert torch.allclose(A, B)
+
+
+def test_gradcheck(dim: int) -> None:
+    rays, normals = make_rays_normals(10, dim)
+    rays.requires_grad_(True)
+    normals.requires_grad_(True)
+    n1 = torch.full((10,), 0.9, dtype=torch.float64, requires_grad=True)
+
+    assert torch.autograd.gradcheck(tlm.reflection, (rays, normals))
+    for mode in ("clamp", "reflect"):
+        assert torch.autograd.gradcheck(
+            lambda r, n, n1: tlm.refraction(r, n, n1, 1.0, critical_angle=mode),
+            (rays, normals, n1),
+        )
+
+
+def test_invalid_mode() -> None:
+    rays, normals = make_rays_normals(10, 2)
+    with pytest.raises(ValueError):
+        tlm.refraction(rays, normals, 1.0, 1.5, critical_angle="nope")  # type: ignore
+
+
+def test_refraction_alive(dim: int) -> None:
+    rays, normals = make_rays_normals(100, dim)
+
+    R, alive = tlm.refraction_alive(rays, normals, 1.5, 1.0)
+    assert R.shape == rays.shape
+    assert alive.shape == (100,)
+    assert not torch.all(alive)
+
+    dropped = tlm.refraction(rays, normals, 1.5, 1.0, critical_angle="drop")
+    assert torch.allclose(R[alive], dropped)
+
+
+@pytest.mark.parametrize("critical_angle", ["drop", "clamp"])
+def test_refractive_surface_critical_angle(dim: int, critical_angle: str) -> None:
+    # Rays inside glass, half of them beyond the critical angle (41.8 degrees)
+    optics = torch.nn.Sequential(
+        tlm.PointSourceAtInfinity(10.0, angle1=30.0),
+        tlm.PointSourceAtInfinity(10.0, angle1=60.0),
+        tlm.Gap(5.0),
+        tlm.RefractiveSurface(
+            tlm.CircularPlane(40.0), (1.5, 1.0), critical_angle=critical_angle
+        ),
+    )
+
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+    outputs = optics(tlm.default_input(sampling))
+    N = 5 ** (dim - 1)
+
+    assert outputs.blocked is not None
+    assert outputs.P.shape[0] == outputs.V.shape[0] == outputs.coord_object.shape[0]
+
+    if critical_angle == "drop":
+        expected = torch.cat((torch.zeros(N), torch.ones(N))).bool()
+        assert torch.equal(outputs.blocked, expected)
+        assert outputs.P.shape[0] == N
+    else:
+        assert not torch.any(outputs.blocked)
+        assert outputs.P.shape[0] == 2 * N
+
+
+def test_fresnel_reflectance(dim: int) -> None:
+    rays, normals = make_rays_normals(100, dim)
+
+    # Normal incidence
+    R0 = tlm.fresnel_reflectance(-normals, normals, 1.0, 1.5)
+    assert torch.allclose(R0, torch.full((100,), 0.04, dtype=torch.float64))
+
+    # Reflectance is the same for the reverse path of the refracted ray
+    R = tlm.fresnel_reflectance(rays, normals, 1.0, 1.5)
+    refracted = tlm.refraction(rays, normals, 1.0, 1.5)
+    R_reverse = tlm.fresnel_reflectance(-refracted, -normals, 1.5, 1.0)
+    assert torch.all((R >= 0.0) & (R <= 1.0))
+    assert torch.allclose(R, R_reverse)
+
+    # Total internal reflection beyond the critical angle
+    _, alive = tlm.refraction_alive(rays, normals, 1.5, 1.0)
+    R_inside = tlm.fresnel_reflectance(rays, normals, 1.5, 1.0)
+    assert torch.all(R_inside[~alive] == 1.0)
+    assert torch.all(R_inside[alive] < 1.0)
+
+
+@pytest.mark.parametrize(
+    "angle, expected",
+    [(45.0, 0.0502399), (56.309932, 0.0739645)],
+    ids=["45deg", "brewster"],
+)
+def test_fresnel_reflectance_oblique(dim: int, angle: float, expected: float) -> None:
+    # Air to glass, Rs and Rp are 0.0920 and 0.0085 at 45 degrees, and Rp is
+    # zero at Brewster's angle atan(1.5)
+    theta = torch.deg2rad(torch.tensor(angle, dtype=torch.float64))
+    rays = torch.zeros((1, dim), dtype=torch.float64)
+    rays[0, 0], rays[0, 1] = torch.cos(theta), torch.sin(theta)
+    normals = torch.zeros((1, dim), dtype=torch.float64)
+    normals[0, 0] = -1.0
+
+    R = tlm.fresnel_reflectance(rays, normals, 1.0, 1.5)
+    assert torch.allclose(R, torch.tensor([expected], dtype=torch.float64), atol=1e-6)
@@ -0,0 +1,58 @@
+import json
+import torch
+import torchlensmaker as tlm
+
+from torchlensmaker.testing.benchmarks import biconvex
+
+
+def test_profile_stack(tmp_path) -> None:  # type: ignore
+    optics = biconvex()
+    inputs = tlm.default_input({"dim": 2, "dtype": torch.float64, "base": 10})
+
+    with tlm.profile(optics) as prof:
+        outputs = optics(inputs)
+        outputs.loss.backward()
+
+    # one event per module evaluation
+    assert len(prof.events) == len(list(optics.modules()))
+
+    summary = {row["name"]: row for row in prof.summary()}
+
+    # light source
+    assert summary["0"]["rays_in"] == 0
+    assert summary["0"]["rays_out"] == 10
+
+    # lens has two refractive surfaces
+    assert summary["2"]["counters"]["newton_iterations"] > 0
+    assert summary["2.surface1"]["counters"]["newton_iterations"] > 0
+    assert summary[""]["counters"]["newton_iterations"] == (
+        summary["2.surface1"]["counters"]["newton_iterations"]
+        + summary["2.surface2"]["counters"]["newton_iterations"]
+    )
+
+    # gradient flows through the lens
+    assert summary["2"]["backward"] > 0.0
+    assert all(row["forward"] >= 0.0 for row in summary.values())
+
+    assert "surface1" in prof.table()
+
+    path = str(tmp_path / "trace.json")
+    prof.export_chrome_trace(path)
+    with open(path) as f:
+        trace = json.load(f)
+    assert any(e["cat"] == "backward" for e in trace["traceEvents"])
+
+
+def test_profile_disabled() -> None:
+    optics = biconvex()
+    inputs = tlm.default_input({"dim": 2, "dtype": torch.float64, "base": 10})
+
+    with tlm.profile(optics) as prof:
+        optics(inputs)
+
+    num_events = len(prof.events)
+    optics(inputs)
+
+    # hooks are removed when the context exits
+    assert len(prof.events) == num_events
+    assert all(len(m._forward_hooks) == 0 for m in optics.modules())
@@ -0,0 +1,106 @@
+import pytest
+import typing
+import torch
+import torch.nn as nn
+from dataclasses import replace
+
+import torchlensmaker as tlm
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def make_optics() -> nn.Sequential:
+    surface = tlm.Parabola(diameter=15, a=tlm.parameter(0.02))
+    lens = tlm.BiLens(surface, n=(1.0, 1.5), outer_thickness=1.0)
+
+    return nn.Sequential(
+        tlm.ObjectAtInfinity(beam_diameter=20.0, angular_size=20.0),
+        tlm.Gap(10),
+        lens,
+        tlm.Gap(5),
+        tlm.Aperture(4.0),
+        tlm.Gap(30),
+        tlm.ImagePlane(),
+    )
+
+
+def num_rays_at_stop(optics: nn.Sequential, sampling: dict[str, typing.Any]) -> int:
+    execute_list, _ = tlm.full_forward(optics, tlm.default_input(sampling))
+    stop = [c for c in execute_list if isinstance(c.module, tlm.Aperture)][0]
+    return stop.outputs.P.shape[0]
+
+
+def test_ray_aiming_fills_stop(dim: int) -> None:
+    optics = make_optics()
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 7, "object": 3}
+
+    outputs = optics(tlm.default_input(sampling))
+    total = 7 ** (dim - 1) * 3 ** (dim - 1)
+    assert num_rays_at_stop(optics, sampling) < total
+
+    aiming = tlm.RayAiming(optics)
+    aiming.update(sampling)
+
+    # All aimed rays go through the stop and reach the image
+    assert num_rays_at_stop(optics, sampling) == total
+    outputs = optics(tlm.default_input(sampling))
+    assert outputs.P.shape[0] == total
+    assert torch.isfinite(outputs.loss)
+
+    # Aiming can be removed
+    aiming.clear()
+    assert num_rays_at_stop(optics, sampling) < total
+
+
+def test_ray_aiming_warm_start(dim: int) -> None:
+    optics = make_optics()
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5, "object": 3}
+
+    aiming = tlm.RayAiming(optics, iterations=4)
+    aiming.update(sampling)
+    center, matrix = aiming.solutions[optics[0].sampling_key(sampling)]
+
+    # Updating again starts from the converged solution and stays there
+    aiming.update(sampling)
+    center2, matrix2 = aiming.solutions[optics[0].sampling_key(sampling)]
+    assert torch.allclose(center, center2, atol=1e-6)
+    assert torch.allclose(matrix, matrix2, atol=1e-6)
+
+
+def test_ray_aiming_differentiable(dim: int) -> None:
+    optics = make_optics()
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5, "object": 3}
+
+    aiming = tlm.RayAiming(optics)
+    aiming.update(sampling)
+
+    outputs = optics(tlm.default_input(sampling))
+    outputs.loss.backward()
+    grads = [p.grad for p in optics.parameters()]
+    assert all(g is not None and torch.all(torch.isfinite(g)) for g in grads)
+
+
+class ClearObjectCoordinates(nn.Module):
+    "Element that rewrites the object coordinates of rays"
+
+    def forward(self, inputs: tlm.OpticalData) -> tlm.OpticalData:
+        return replace(inputs, coord_object=torch.zeros_like(inputs.coord_object))
+
+
+def test_ray_aiming_coord_object_rewritten(dim: int) -> None:
+    optics = make_optics()
+    optics.insert(1, ClearObjectCoordinates())
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5, "object": 3}
+
+    aiming = tlm.RayAiming(optics)
+    aiming.update(sampling)
+    assert num_rays_at_stop(optics, sampling) == 5 ** (dim - 1) * 3 ** (dim - 1)
+
+
+def test_ray_aiming_requires_stop() -> None:
+    optics = nn.Sequential(tlm.PointSourceAtInfinity(10.0), tlm.Gap(10))
+    with pytest.raises(ValueError):
+        tlm.RayAiming(optics)
@@ -0,0 +1,129 @@
+import pytest
+import typing
+import math
+import torch
+
+import torchlensmaker as tlm
+from torchlensmaker.sampling import sample_line, sample_disk, SamplingStrategy
+
+
+strategies = list(typing.get_args(SamplingStrategy))
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+@pytest.mark.parametrize("strategy", strategies)
+def test_sample_line(strategy: str) -> None:
+    for dtype in (torch.float32, torch.float64):
+        samples = sample_line(strategy, 17, dtype)
+        assert samples.shape == (17,)
+        assert samples.dtype == dtype
+        assert torch.all(torch.abs(samples) <= 1.0)
+
+    assert sample_line(strategy, 0, torch.float64).shape == (0,)
+
+
+@pytest.mark.parametrize("strategy", strategies)
+def test_sample_disk(strategy: str) -> None:
+    base = 20
+    samples = sample_disk(strategy, base, torch.float64)
+    assert samples.dim() == 2 and samples.shape[1] == 2
+    assert samples.dtype == torch.float64
+    assert torch.all(torch.isfinite(samples))
+
+    if strategy == "grid":
+        assert samples.shape[0] == base**2
+    else:
+        # Only samples inside the disk, with about the same density as the grid
+        assert torch.all(torch.hypot(samples[:, 0], samples[:, 1]) <= 1.0 + 1e-9)
+        expected = math.pi / 4 * base**2
+        assert 0.8 * expected <= samples.shape[0] <= 1.2 * expected
+
+    assert sample_disk(strategy, 0, torch.float64).shape == (0, 2)
+
+
+def test_sample_disk_low_discrepancy_deterministic() -> None:
+    for strategy in ("sobol", "halton", "hexagonal", "polar"):
+        A = sample_disk(strategy, 10, torch.float64)
+        B = sample_disk(strategy, 10, torch.float64)
+        assert torch.equal(A, B)
+
+
+def test_unknown_strategy() -> None:
+    with pytest.raises(ValueError):
+        sample_disk("nope", 10, torch.float64)
+
+
+@pytest.mark.parametrize("strategy", strategies)
+def test_point_source_strategy(strategy: str, dim: int) -> None:
+    beam_diameter = 10.0
+    source = tlm.PointSourceAtInfinity(beam_diameter)
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 10, "strategy": strategy}
+    outputs = source(tlm.default_input(sampling))
+
+    assert outputs.P.shape == outputs.V.shape
+    assert outputs.P.shape[1] == dim
+    assert outputs.P.shape[0] > 0
+
+    radius = torch.linalg.vector_norm(outputs.P[:, 1:], dim=1)
+    if strategy == "grid" and dim == 3:
+        # corners of the square grid
+        assert torch.all(radius <= math.sqrt(2) * beam_diameter / 2)
+    else:
+        assert torch.all(radius <= beam_diameter / 2 + 1e-9)
+
+
+def test_point_source_default_grid(dim: int) -> None:
+    source = tlm.PointSourceAtInfinity(10.0)
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+    outputs = source(tlm.default_input(sampling))
+    assert outputs.P.shape[0] == 5 ** (dim - 1)
+
+
+def test_point_source_cache(dim: int) -> None:
+    source = tlm.PointSourceAtInfinity(10.0, angle1=5.0, angle2=2.0)
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5, "strategy": "sobol"}
+
+    first = source(tlm.default_input(sampling))
+    second = source(tlm.default_input(sampling))
+    assert len(source._cache) == 1
+    assert torch.equal(first.P, second.P)
+    assert torch.equal(first.V, second.V)
+
+    # Cached rays are equal to freshly generated ones
+    P, V, _ = source.local_rays(dim, torch.float64, 5, "sobol", 1)
+    assert torch.allclose(first.P, P)
+    assert torch.allclose(first.V, V)
+
+    # Each sampling configuration gets its own entry
+    source(tlm.default_input({**sampling, "dtype": torch.float32}))
+    source(tlm.default_input({**sampling, "base": 7}))
+    assert len(source._cache) == 3
+
+    # Random samples are never cached
+    source(tlm.default_input({**sampling, "strategy": "random"}))
+    assert len(source._cache) == 3
+
+
+def test_point_source_cache_attributes(dim: int) -> None:
+    source = tlm.PointSourceAtInfinity(10.0)
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+
+    # Changing the beam diameter invalidates the cache
+    first = source(tlm.default_input(sampling))
+    source.beam_diameter = torch.tensor(20.0, dtype=torch.float64)
+    second = source(tlm.default_input(sampling))
+    assert len(source._cache) == 1
+    assert torch.allclose(second.P, first.P * (9.9 / 4.9))
+
+    # Rays of a trainable source are not cached, each forward has its graph
+    source.beam_diameter = tlm.parameter(10.0)
+    source._cache.clear()
+    for _ in range(2):
+        outputs = source(tlm.default_input(sampling))
+        torch.sum(outputs.P[:, 1:] ** 2).backward()
+    assert len(source._cache) == 0
+    assert source.beam_diameter.grad is not None
@@ -0,0 +1,128 @@
+import pytest
+import typing
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+from torchlensmaker.testing.rays import tilted_rays
+from torchlensmaker.interp1d import interp1d
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def test_piecewise_line_on_profile(dim: int) -> None:
+    X = [0.1, -0.2, 0.3, 0.8, 1.5]
+    surface = tlm.PiecewiseLine(10.0, X)
+    P, V = tilted_rays(1000, dim, 5.0)
+
+    t, normals, valid = surface.local_collide(P, V)
+    assert torch.all(valid)
+
+    # Collision points are on the revolved profile
+    points = P + t.unsqueeze(1) * V
+    rho = torch.linalg.vector_norm(points[:, 1:], dim=1)
+    knots = surface.knots()
+    expected = interp1d(knots[:, 1], knots[:, 0], rho)
+    assert torch.allclose(points[:, 0], expected, atol=1e-10)
+
+    # Unit normals, perpendicular to the profile segments
+    assert torch.allclose(
+        torch.linalg.vector_norm(normals, dim=1), torch.ones_like(t)
+    )
+    index = torch.searchsorted(knots[:, 1], rho) - 1
+    slope = (knots[1:, 0] - knots[:-1, 0]) / (knots[1:, 1] - knots[:-1, 1])
+    radial = torch.sum(normals[:, 1:] * points[:, 1:], dim=1) / rho
+    assert torch.allclose(radial / -normals[:, 0], slope[index], atol=1e-9)
+
+
+def test_piecewise_line_many_segments(dim: int) -> None:
+    # Fine piecewise approximation of a parabola
+    M = 300
+    r = torch.linspace(0.0, 5.0, M + 1, dtype=torch.float64)
+    surface = tlm.PiecewiseLine(10.0, 0.02 * r[1:] ** 2)
+    P, V = tilted_rays(10000, dim, 3.0)
+
+    t, _, valid = surface.local_collide(P, V)
+    assert torch.all(valid)
+
+    parabola = tlm.Parabola(10.0, a=0.02)
+    t_parabola, _, _ = parabola.local_collide(P, V)
+    assert torch.allclose(t, t_parabola, atol=1e-3)
+
+
+def test_piecewise_line_miss(dim: int) -> None:
+    surface = tlm.PiecewiseLine(10.0, [0.5, 1.0])
+
+    # Rays outside of the outline
+    P, V = tilted_rays(100, dim, 5.0, spread=0.0)
+    P[:, 1] = P[:, 1] + 20.0
+    _, _, valid = surface.local_collide(P, V)
+    assert not torch.any(valid)
+
+
+def test_bezier_from_parabola(dim: int) -> None:
+    spline = tlm.BezierSpline.from_parabola(10.0, 0.03, 4)
+    parabola = tlm.Parabola(10.0, a=0.03)
+    P, V = tilted_rays(1000, dim, 5.0, spread=0.2)
+
+    t1, normals1, valid1 = spline.local_collide(P, V)
+    t2, normals2, valid2 = parabola.local_collide(P, V)
+
+    assert torch.all(valid1 == valid2)
+    assert torch.allclose(t1[valid1], t2[valid2], atol=1e-9)
+
+    normals2 = torch.nn.functional.normalize(normals2, dim=1)
+    assert torch.allclose(normals1[valid1], normals2[valid2], atol=1e-9)
+
+    assert torch.allclose(spline.extent_x(), parabola.extent_x())
+    samples = spline.samples2D(40)
+    assert torch.allclose(samples[:, 0], 0.03 * samples[:, 1] ** 2)
+
+
+def test_piecewise_line_gradient(dim: int) -> None:
+    P, V = tilted_rays(20, dim, 5.0)
+
+    def collide(X: torch.Tensor) -> torch.Tensor:
+        return tlm.PiecewiseLine(10.0, X).local_collide(P, V)[0]
+
+    X = torch.tensor([0.1, 0.3, 0.2], dtype=torch.float64, requires_grad=True)
+    assert torch.autograd.gradcheck(collide, (X,))
+
+
+def test_bezier_gradient(dim: int) -> None:
+    P, V = tilted_rays(20, dim, 5.0)
+    spline = tlm.BezierSpline.from_parabola(10.0, 0.03, 3)
+
+    def collide(X: torch.Tensor, CX: torch.Tensor, CY: torch.Tensor) -> torch.Tensor:
+        return tlm.BezierSpline(10.0, X, CX, CY).local_collide(P, V)[0]
+
+    inputs = tuple(
+        p.detach().clone().requires_grad_(True)
+        for p in (spline.X, spline.CX, spline.CY)
+    )
+    assert torch.autograd.gradcheck(collide, inputs)
+
+
+def test_spline_stack(dim: int) -> None:
+    surface = tlm.PiecewiseLine(
+        15.0, nn.Parameter(torch.tensor([-0.1, -0.3, -0.6], dtype=torch.float64))
+    )
+
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(10.0),
+        tlm.Gap(5.0),
+        tlm.RefractiveSurface(surface, (1.0, 1.5)),
+        tlm.Gap(40.0),
+        tlm.FocalPoint(),
+    )
+
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+    outputs = optics(tlm.default_input(sampling))
+    assert outputs.P.shape[0] == 5 ** (dim - 1)
+
+    outputs.loss.backward()
+    assert surface.X.grad is not None
+    assert torch.all(torch.isfinite(surface.X.grad))
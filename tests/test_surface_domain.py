@@ -0,0 +1,109 @@
+import pytest
+import typing
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def implicit(surface: tlm.ImplicitSurface, dim: int) -> tuple[typing.Any, typing.Any]:
+    return (surface.f, surface.f_grad) if dim == 2 else (surface.F, surface.F_grad)
+
+
+def grid_points(dim: int, radius: float) -> torch.Tensor:
+    r = torch.linspace(-radius, radius, 21, dtype=torch.float64)
+    points = torch.cartesian_prod(*[r] * dim).reshape(-1, dim)
+    return points
+
+
+@pytest.mark.parametrize(
+    "surface",
+    [tlm.Sphere(10.0, 8.0), tlm.Asphere(10.0, R=-8.0, K=0.5, A=[1e-4])],
+    ids=["sphere", "asphere"],
+)
+def test_finite_outside_domain(surface: tlm.ImplicitSurface, dim: int) -> None:
+    # Points up to twice the radius of curvature away from the axis
+    points = grid_points(dim, 16.0)
+    F, F_grad = implicit(surface, dim)
+
+    assert torch.all(torch.isfinite(F(points)))
+    assert torch.all(torch.isfinite(F_grad(points)))
+
+    inside = surface.in_domain(points)
+    assert torch.any(inside) and not torch.all(inside)
+
+
+def test_sphere_unchanged_inside(dim: int) -> None:
+    sphere = tlm.Sphere(10.0, -12.0)
+    points = grid_points(dim, 5.0 / dim)
+    F, F_grad = implicit(sphere, dim)
+
+    K = sphere.K
+    r2 = torch.sum(points[:, 1:] ** 2, dim=1)
+    root = torch.sqrt(1 - r2 * K**2)
+    expected = K * r2 / (1 + root) - points[:, 0]
+    expected_grad = torch.cat(
+        (-torch.ones_like(r2).unsqueeze(1), K * points[:, 1:] / root.unsqueeze(1)),
+        dim=1,
+    )
+
+    assert torch.all(sphere.in_domain(points))
+    assert torch.allclose(F(points), expected)
+    assert torch.allclose(F_grad(points), expected_grad)
+
+
+def test_sphere_parameter_beyond_domain(dim: int) -> None:
+    # Curvature pushed beyond the outline by the optimizer: the sphere radius
+    # is now smaller than the surface radius
+    sphere = tlm.Sphere(10.0, tlm.parameter(20.0))
+    with torch.no_grad():
+        sphere.K.fill_(1 / 4.0)
+
+    assert torch.isfinite(sphere.extent_x())
+    assert torch.all(torch.isfinite(sphere.samples2D(10)))
+
+    N = 50
+    P = torch.zeros((N, dim), dtype=torch.float64)
+    P[:, 0] = -10.0
+    P[:, 1] = torch.linspace(-4.9, 4.9, N, dtype=torch.float64)
+    V = torch.zeros((N, dim), dtype=torch.float64)
+    V[:, 0] = 1.0
+
+    t, normals, valid = sphere.local_collide(P, V)
+    assert torch.all(torch.isfinite(t))
+    assert torch.all(torch.isfinite(normals))
+
+    # Rays beyond the sphere radius don't collide
+    assert torch.all(valid == (torch.abs(P[:, 1]) < 4.0))
+
+    # Gradients are finite, including through rays outside the domain
+    t.sum().backward()
+    assert sphere.K.grad is not None and torch.isfinite(sphere.K.grad)
+
+
+def test_stack_beyond_domain(dim: int) -> None:
+    surface = tlm.Sphere(15.0, tlm.parameter(30.0))
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(14.0),
+        tlm.Gap(5.0),
+        tlm.RefractiveSurface(surface, (1.0, 1.5)),
+        tlm.Gap(40.0),
+        tlm.FocalPoint(),
+    )
+
+    with torch.no_grad():
+        surface.K.fill_(1 / 5.0)
+
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 9}
+    outputs = optics(tlm.default_input(sampling))
+
+    # Outer rays are blocked instead of producing nan
+    assert 0 < outputs.P.shape[0] < 9 ** (dim - 1)
+
+    outputs.loss.backward()
+    assert surface.K.grad is not None and torch.isfinite(surface.K.grad)
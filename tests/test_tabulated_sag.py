@@ -0,0 +1,75 @@
+import pytest
+import typing
+import math
+import torch
+
+import torchlensmaker as tlm
+from torchlensmaker.testing.rays import tilted_rays
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def sphere_table(R: float, radius: float, N: int) -> tuple[torch.Tensor, torch.Tensor]:
+    r = torch.linspace(0.0, radius, N, dtype=torch.float64)
+    return r, r**2 / (R * (1 + torch.sqrt(1 - r**2 / R**2)))
+
+
+def test_table_validation() -> None:
+    with pytest.raises(AssertionError):
+        tlm.TabulatedSag([0.0, 1.0, 3.0], [0.0, 0.1, 0.2])
+    with pytest.raises(AssertionError):
+        tlm.TabulatedSag([1.0, 2.0, 3.0], [0.0, 0.1, 0.2])
+
+
+def test_sphere_table(dim: int) -> None:
+    surface = tlm.TabulatedSag(*sphere_table(20.0, 5.0, 200))
+    sphere = tlm.Sphere(10.0, 20.0)
+    P, V = tilted_rays(500, dim, 4.0)
+
+    t1, normals1, valid1 = surface.local_collide(P, V)
+    t2, normals2, valid2 = sphere.local_collide(P, V)
+
+    assert torch.all(valid1) and torch.all(valid2)
+    assert torch.allclose(t1, t2, atol=1e-4)
+    assert torch.allclose(normals1, normals2, atol=1e-3)
+    assert torch.allclose(surface.extent_x(), sphere.extent_x(), atol=1e-4)
+
+
+def test_wavy_table(dim: int) -> None:
+    # Profile with several extrema, the root is bracketed for every ray
+    r = torch.linspace(0.0, 5.0, 51, dtype=torch.float64)
+    surface = tlm.TabulatedSag(r, 0.3 * torch.cos(2 * math.pi * r / 2.5) - 0.3)
+    P, V = tilted_rays(1000, dim, 4.0)
+
+    t, _, valid = surface.local_collide(P, V)
+    assert torch.all(valid)
+
+    points = P + t.unsqueeze(1) * V
+    F = surface.f(points) if dim == 2 else surface.F(points)
+    assert torch.all(torch.abs(F) < 1e-10)
+
+
+def test_implicit_gradient(dim: int) -> None:
+    surface = tlm.TabulatedSag(*sphere_table(-15.0, 5.0, 30))
+
+    torch.manual_seed(0)
+    points = (torch.rand((50, dim), dtype=torch.float64) * 2 - 1) * 5.0 / dim
+    points.requires_grad_(True)
+
+    F, F_grad = surface.f_and_grad(points) if dim == 2 else surface.F_and_grad(points)
+    (expected,) = torch.autograd.grad(F.sum(), points)
+    assert torch.allclose(F_grad, expected)
+
+
+def test_rays_gradient(dim: int) -> None:
+    surface = tlm.TabulatedSag(*sphere_table(25.0, 5.0, 30))
+    P, V = tilted_rays(20, dim, 4.0)
+    P.requires_grad_(True)
+
+    def collide(P: torch.Tensor) -> torch.Tensor:
+        return surface.local_collide(P, V)[0]
+
+    assert torch.autograd.gradcheck(collide, (P,))
@@ -1,3 +1,4 @@
+import pytest
 import torch
 from torchlensmaker.tensorframe import TensorFrame
 
@@ -87,3 +88,41 @@ def test_stack() -> None:
 
     assert torch.all(tf3.data == torch.tensor([[1, 2], [1, 2], [3, 4], [3, 4]]))
     assert tf3.columns == tf1.columns == tf2.columns
+
+
+def test_set() -> None:
+    N = 3
+    tf = TensorFrame(torch.zeros((N, 2)), ["a", "b"])
+    a = tf.get("a")
+
+    tf.set("a", torch.tensor([1.0, 2.0, 3.0]))
+    tf.set("b", 5.0)
+
+    # columns are views into the frame storage
+    assert torch.all(a == torch.tensor([1.0, 2.0, 3.0]))
+    assert torch.all(tf.data == torch.tensor([[1.0, 5.0], [2.0, 5.0], [3.0, 5.0]]))
+
+    with pytest.raises(KeyError):
+        tf.set("c", 0.0)
+
+
+def test_append() -> None:
+    tf = TensorFrame(torch.empty((0, 2)), ["a", "b"])
+
+    for i in range(10):
+        tf.append(TensorFrame(torch.full((i, 2), float(i)), ["a", "b"]))
+
+    assert tf.shape == (45, 2)
+    assert tf.capacity >= 45
+    assert torch.all(tf.get("a") == tf.get("b"))
+    assert torch.all(tf.get("a")[-9:] == 9.0)
+    assert torch.all(tf.get("a")[:1] == 1.0)
+
+
+def test_from_columns() -> None:
+    tf = TensorFrame.from_columns(a=torch.tensor([1, 2]), b=torch.tensor([3, 4]))
+
+    assert tf.columns == ["a", "b"]
+    assert torch.all(tf.data == torch.tensor([[1, 3], [2, 4]]))
+    assert torch.all(tf.get(["b", "a"]) == torch.tensor([[3, 1], [4, 2]]))
+    assert torch.all(tf.masked(torch.tensor([False, True])).data == torch.tensor([[2, 4]]))
@@ -0,0 +1,195 @@
+import pytest
+import typing
+import math
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+from torchlensmaker.zernike import ZernikeBasis, noll_to_nm
+
+
+@pytest.fixture(params=[2, 3], ids=["2D", "3D"])
+def dim(request: pytest.FixtureRequest) -> typing.Any:
+    return request.param
+
+
+def radial_reference(n: int, m: int, rho: torch.Tensor) -> torch.Tensor:
+    "Explicit sum formula of the radial polynomial R_n^m"
+    return sum(
+        (-1) ** k
+        * math.factorial(n - k)
+        / (
+            math.factorial(k)
+            * math.factorial((n + m) // 2 - k)
+            * math.factorial((n - m) // 2 - k)
+        )
+        * rho ** (n - 2 * k)
+        for k in range((n - m) // 2 + 1)
+    )
+
+
+def disk_points(N: int) -> tuple[torch.Tensor, torch.Tensor]:
+    torch.manual_seed(0)
+    rho = torch.sqrt(torch.rand(N, dtype=torch.float64))
+    theta = 2 * math.pi * torch.rand(N, dtype=torch.float64)
+    return rho * torch.cos(theta), rho * torch.sin(theta)
+
+
+def test_noll_indices() -> None:
+    expected = [
+        (0, 0),
+        (1, 1),
+        (1, -1),
+        (2, 0),
+        (2, -2),
+        (2, 2),
+        (3, -1),
+        (3, 1),
+        (3, -3),
+        (3, 3),
+        (4, 0),
+    ]
+    assert [noll_to_nm(j) for j in range(1, 12)] == expected
+
+
+def test_basis_reference() -> None:
+    terms = [(n, m) for n in range(11) for m in range(-n, n + 1, 2)]
+    basis = ZernikeBasis(terms)
+    u, v = disk_points(200)
+    Z, _, _ = basis(u, v)
+    assert Z.shape == (200, len(terms))
+
+    rho, theta = torch.hypot(u, v), torch.atan2(v, u)
+    for j, (n, m) in enumerate(terms):
+        norm = math.sqrt(n + 1) if m == 0 else math.sqrt(2 * (n + 1))
+        angular = torch.cos(m * theta) if m >= 0 else torch.sin(-m * theta)
+        expected = norm * radial_reference(n, abs(m), rho) * angular
+        assert torch.allclose(Z[:, j], expected, atol=1e-9), (n, m)
+
+
+def test_basis_gradient() -> None:
+    basis = ZernikeBasis([noll_to_nm(j) for j in range(1, 37)])
+    u, v = disk_points(50)
+    u.requires_grad_(True)
+    v.requires_grad_(True)
+
+    Z, dZ_du, dZ_dv = basis(u, v)
+
+    for j in range(Z.shape[1]):
+        gu, gv = torch.autograd.grad(Z[:, j].sum(), (u, v), retain_graph=True)
+        assert torch.allclose(dZ_du[:, j], gu)
+        assert torch.allclose(dZ_dv[:, j], gv)
+
+
+def test_basis_unit_rms() -> None:
+    # Noll normalization: each term has unit RMS over the unit disk
+    basis = ZernikeBasis([noll_to_nm(j) for j in range(2, 16)])
+    u, v = disk_points(200000)
+    Z, _, _ = basis(u, v)
+    rms = torch.sqrt(torch.mean(Z**2, dim=0))
+    assert torch.allclose(rms, torch.ones_like(rms), atol=0.02)
+
+
+def test_basis_empty() -> None:
+    Z, dZ_du, dZ_dv = ZernikeBasis([])(*disk_points(10))
+    assert Z.shape == dZ_du.shape == dZ_dv.shape == (10, 0)
+
+
+def test_zero_coefficients_is_asphere(dim: int) -> None:
+    asphere = tlm.Asphere(10.0, R=20.0, K=-0.5, A=[1e-4])
+    zernike = tlm.ZernikeSurface(10.0, R=20.0, K=-0.5, A=[1e-4], zernike=[0.0] * 10)
+
+    torch.manual_seed(0)
+    points = (torch.rand((100, dim), dtype=torch.float64) * 2 - 1) * 5.0 / dim
+
+    if dim == 2:
+        assert torch.allclose(zernike.f(points), asphere.f(points))
+        assert torch.allclose(zernike.f_grad(points), asphere.f_grad(points))
+    else:
+        assert torch.allclose(zernike.F(points), asphere.F(points))
+        assert torch.allclose(zernike.F_grad(points), asphere.F_grad(points))
+
+    assert torch.allclose(zernike.extent_x(), asphere.extent_x())
+    assert torch.allclose(zernike.samples2D(20), asphere.samples2D(20))
+
+
+def test_implicit_gradient(dim: int) -> None:
+    surface = tlm.ZernikeSurface(
+        10.0, R=30.0, zernike=[0.0, 0.01, -0.02, 0.03, 0.01, 0.02, 0.005, 0.01]
+    )
+
+    torch.manual_seed(0)
+    points = (torch.rand((50, dim), dtype=torch.float64) * 2 - 1) * 5.0 / dim
+    points.requires_grad_(True)
+
+    F, F_grad = surface.f_and_grad(points) if dim == 2 else surface.F_and_grad(points)
+    (expected,) = torch.autograd.grad(F.sum(), points)
+    assert torch.allclose(F_grad, expected)
+
+
+def test_collide(dim: int) -> None:
+    surface = tlm.ZernikeSurface(
+        10.0, R=-25.0, K=-0.8, zernike=[0.0, 0.02, 0.01, 0.05, 0.02, -0.03, 0.01]
+    )
+
+    N = 100
+    torch.manual_seed(0)
+    P = torch.zeros((N, dim), dtype=torch.float64)
+    P[:, 0] = -10.0
+    P[:, 1:] = (torch.rand((N, dim - 1), dtype=torch.float64) * 2 - 1) * 5.0 / dim
+    V = torch.zeros((N, dim), dtype=torch.float64)
+    V[:, 0] = 1.0
+
+    t, normals, valid = surface.local_collide(P, V)
+    assert torch.all(valid)
+
+    points = P + t.unsqueeze(1) * V
+    F = surface.f(points) if dim == 2 else surface.F(points)
+    assert torch.all(torch.abs(F) < 1e-9)
+
+
+def test_grid_cache() -> None:
+    zernike = nn.Parameter(torch.tensor([0.0, 0.1, 0.0, 0.2], dtype=torch.float64))
+    surface = tlm.ZernikeSurface(10.0, R=40.0, zernike=zernike)
+
+    first = surface.grid_samples(11)
+    assert first.shape[1] == 3
+    assert torch.all(torch.hypot(first[:, 1], first[:, 2]) <= 5.0)
+    surface.samples2D(11)
+    assert len(surface._grid_cache) == 2
+
+    # Cached basis follows changes of the coefficients
+    with torch.no_grad():
+        zernike[1] = 0.3
+    second = surface.grid_samples(11)
+    assert len(surface._grid_cache) == 2
+    assert not torch.allclose(first[:, 0], second[:, 0])
+    assert torch.equal(first[:, 1:], second[:, 1:])
+
+    # Gradient flows through the cached basis
+    surface.grid_samples(11)[:, 0].pow(2).sum().backward()
+    assert zernike.grad is not None and torch.any(zernike.grad != 0)
+
+
+def test_stack(dim: int) -> None:
+    surface = tlm.ZernikeSurface(
+        15.0,
+        R=-40.0,
+        zernike=nn.Parameter(torch.zeros(6, dtype=torch.float64)),
+    )
+
+    optics = nn.Sequential(
+        tlm.PointSourceAtInfinity(10.0),
+        tlm.Gap(5.0),
+        tlm.RefractiveSurface(surface, (1.0, 1.5)),
+        tlm.Gap(40.0),
+        tlm.FocalPoint(),
+    )
+
+    sampling = {"dim": dim, "dtype": torch.float64, "base": 5}
+    outputs = optics(tlm.default_input(sampling))
+    assert outputs.P.shape[0] > 0
+
+    outputs.loss.backward()
+    assert surface.zernike.grad is not None
+    assert torch.all(torch.isfinite(surface.zernike.grad))